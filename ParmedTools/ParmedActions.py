@@ -18,8 +18,10 @@ from ParmedTools.argumentlist import ArgumentList
 from ParmedTools.parmlist import ParmList, ChamberParm
 from chemistry.amber.mask import AmberMask
 from chemistry.amber.readparm import AmberFormat
+from chemistry.amber.termarrays import term_rows
 from chemistry.amber.topologyobjects import (Bond, BondType, Angle, AngleType,
-                                             Dihedral, DihedralType)
+                                             Dihedral, DihedralType, TrackedList,
+                                             TermIndex)
 from chemistry.exceptions import ChemError, CharmmFileError
 from chemistry.periodic_table import Element as _Element
 from compat24 import any
@@ -833,7 +835,6 @@ class changeljsingletype(Action):
         )
 
     def execute(self):
-        from math import sqrt
         from ParmedTools.exceptions import LJ_TypeError
         # If this is an empty mask do nothing
         if self.orig_radius is None: return
@@ -852,16 +853,9 @@ class changeljsingletype(Action):
         self.parm.fill_LJ()
         self.parm.LJ_radius[attype-1] = self.radius
         self.parm.LJ_depth[attype-1] = self.depth
-
-        for i in range(self.parm.ptr('ntypes')):
-            lj_index = self.parm.parm_data['NONBONDED_PARM_INDEX'][
-                                    self.parm.ptr('ntypes')*i+attype-1] - 1
-            rij = self.parm.LJ_radius[i] + self.radius
-            wij = sqrt(self.parm.LJ_depth[i] * self.depth)
-            acoef = wij * rij ** 12
-            bcoef = 2 * wij * rij ** 6
-            self.parm.parm_data['LENNARD_JONES_ACOEF'][lj_index] = acoef
-            self.parm.parm_data['LENNARD_JONES_BCOEF'][lj_index] = bcoef
+        # Recompute every pair with this type
+        self.parm.lj_matrix().set_types([attype-1], self.parm.LJ_radius,
+                                        self.parm.LJ_depth)
 
 #+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
 
@@ -1244,21 +1238,17 @@ class addexclusions(Action):
     def execute(self):
         sel1 = self.mask1.Selection()
         sel2 = self.mask2.Selection()
+        atoms1 = [self.parm.atom_list[i] for i, val in enumerate(sel1) if val]
+        atoms2 = [self.parm.atom_list[i] for i, val in enumerate(sel2) if val]
         # Loop through both selections and add each selected atom in sel2 to
         # the exclusion list for selected atoms in sel1 (and vice-versa).
-        for i in range(len(sel1)):
-            if sel1[i]:
-                for j in range(len(sel2)):
-                    if sel2[j]:
-                        # Make sure that this atom isn't already in the
-                        # exclusion list by virtue of being a bonded partner.
-                        atm1 = self.parm.atom_list[i]
-                        atm2 = self.parm.atom_list[j]
-                        # Skip over atm1 == atm2
-                        if atm1 is atm2: continue
-                        # Add each other to each other's exclusion lists.
-                        atm1.exclude(atm2)
-                        self.parm.atom_list.changed = True
+        for atm1 in atoms1:
+            for atm2 in atoms2:
+                # Skip over atm1 == atm2
+                if atm1 is atm2: continue
+                # Add each other to each other's exclusion lists.
+                atm1.exclude(atm2)
+                self.parm.atom_list.changed = True
 
 #+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
 
@@ -1275,27 +1265,21 @@ class printbonds(Action):
                                     'Atom 1', 'Atom 2', 'R eq', 'Frc Cnst')
         # Loop through all of the bonds without and inc hydrogen
         atomsel = self.mask.Selection()
-        for bond in self.parm.bonds_without_h:
-            idx1 = bond.atom1.starting_index
-            idx2 = bond.atom2.starting_index
-            if not (atomsel[idx1] or atomsel[idx2]): continue
-
+        for idx1, idx2, bond_type in term_rows(self.parm.bonds_without_h,
+                                               atomsel):
             atm1 = self.parm.atom_list[idx1]
             atm2 = self.parm.atom_list[idx2]
             retstr += '%7d %4s (%4s) %7d %4s (%4s) %10.4f %10.4f\n' % (
                     idx1+1, atm1.atname, atm1.attype, idx2+1, atm2.atname,
-                    atm2.attype, bond.bond_type.req, bond.bond_type.k)
-
-        for bond in self.parm.bonds_inc_h:
-            idx1 = bond.atom1.starting_index
-            idx2 = bond.atom2.starting_index
-            if not (atomsel[idx1] or atomsel[idx2]): continue
+                    atm2.attype, bond_type.req, bond_type.k)
 
+        for idx1, idx2, bond_type in term_rows(self.parm.bonds_inc_h,
+                                               atomsel):
             atm1 = self.parm.atom_list[idx1]
             atm2 = self.parm.atom_list[idx2]
             retstr += '%7d %4s (%4s)  %7d %4s (%4s) %10.4f %10.4f\n' % (
                         idx1+1, atm1.atname, atm1.attype, idx2+1, atm2.atname,
-                        atm2.attype, bond.bond_type.req, bond.bond_type.k)
+                        atm2.attype, bond_type.req, bond_type.k)
 
         return retstr
 
@@ -1314,36 +1298,28 @@ class printangles(Action):
                         'Atom 1', 'Atom 2', 'Atom 3', 'Frc Cnst', 'Theta eq')
         # Loop through all of the bonds without and inc hydrogen
         atomsel = self.mask.Selection()
-        for angle in self.parm.angles_without_h:
-            idx1 = angle.atom1.starting_index
-            idx2 = angle.atom2.starting_index
-            idx3 = angle.atom3.starting_index
-            if not (atomsel[idx1] or atomsel[idx2] or atomsel[idx3]): continue
-
+        for idx1, idx2, idx3, angle_type in term_rows(
+                                    self.parm.angles_without_h, atomsel):
             atm1 = self.parm.atom_list[idx1]
             atm2 = self.parm.atom_list[idx2]
             atm3 = self.parm.atom_list[idx3]
             retstr += ('%7d %4s (%4s)  %7d %4s (%4s)  %7d %4s (%4s) '
                        '%10.4f %10.4f\n' % (idx1+1, atm1.atname, atm1.attype,
                        idx2+1, atm2.atname, atm2.attype, idx3+1, atm3.atname,
-                       atm3.attype, angle.angle_type.k,
-                       angle.angle_type.theteq*180/math.pi)
+                       atm3.attype, angle_type.k,
+                       angle_type.theteq*180/math.pi)
             )
 
-        for angle in self.parm.angles_inc_h:
-            idx1 = angle.atom1.starting_index
-            idx2 = angle.atom2.starting_index
-            idx3 = angle.atom3.starting_index
-            if not (atomsel[idx1] or atomsel[idx2] or atomsel[idx3]): continue
-
+        for idx1, idx2, idx3, angle_type in term_rows(
+                                    self.parm.angles_inc_h, atomsel):
             atm1 = self.parm.atom_list[idx1]
             atm2 = self.parm.atom_list[idx2]
             atm3 = self.parm.atom_list[idx3]
             retstr += ('%7d %4s (%4s)  %7d %4s (%4s)  %7d %4s (%4s) '
                        '%10.4f %10.4f\n' % (idx1+1, atm1.atname, atm1.attype,
                        idx2+1, atm2.atname, atm2.attype, idx3+1, atm3.atname,
-                       atm3.attype, angle.angle_type.k,
-                       angle.angle_type.theteq*180/math.pi)
+                       atm3.attype, angle_type.k,
+                       angle_type.theteq*180/math.pi)
             )
       
         return retstr
@@ -1364,23 +1340,16 @@ class printdihedrals(Action):
                 'Phase', 'EEL Scale', 'VDW Scale')
         # Loop through all of the bonds without and inc hydrogen
         atomsel = self.mask.Selection()
-        for dihedral in self.parm.dihedrals_without_h:
-            idx1 = dihedral.atom1.starting_index
-            idx2 = dihedral.atom2.starting_index
-            idx3 = dihedral.atom3.starting_index
-            idx4 = dihedral.atom4.starting_index
-            if not (atomsel[idx1] or atomsel[idx2] or atomsel[idx3] or 
-                    atomsel[idx4]):
-                continue
-
+        for idx1, idx2, idx3, idx4, dihed_type, signs in term_rows(
+                                    self.parm.dihedrals_without_h, atomsel):
             atm1 = self.parm.atom_list[idx1]
             atm2 = self.parm.atom_list[idx2]
             atm3 = self.parm.atom_list[idx3]
             atm4 = self.parm.atom_list[idx4]
             # Determine if it's an Improper, Multiterm, or neither
-            if dihedral.signs[1] < 0:
+            if signs[1] < 0:
                 char = 'I'
-            elif dihedral.signs[0] < 0:
+            elif signs[0] < 0:
                 char = 'M'
             else:
                 char = ' '
@@ -1389,27 +1358,20 @@ class printdihedrals(Action):
                        (char, idx1+1, atm1.atname, atm1.attype, idx2+1,
                         atm2.atname, atm2.attype, idx3+1, atm3.atname,
                         atm3.attype, idx4+1, atm4.atname, atm4.attype,
-                        dihedral.dihed_type.phi_k, dihedral.dihed_type.per,
-                        dihedral.dihed_type.phase*180/math.pi,
-                        dihedral.dihed_type.scee, dihedral.dihed_type.scnb)
+                        dihed_type.phi_k, dihed_type.per,
+                        dihed_type.phase*180/math.pi,
+                        dihed_type.scee, dihed_type.scnb)
             )
 
-        for dihedral in self.parm.dihedrals_inc_h:
-            idx1 = dihedral.atom1.starting_index
-            idx2 = dihedral.atom2.starting_index
-            idx3 = dihedral.atom3.starting_index
-            idx4 = dihedral.atom4.starting_index
-            if not (atomsel[idx1] or atomsel[idx2] or atomsel[idx3] or 
-                    atomsel[idx4]):
-                continue
-
+        for idx1, idx2, idx3, idx4, dihed_type, signs in term_rows(
+                                    self.parm.dihedrals_inc_h, atomsel):
             atm1 = self.parm.atom_list[idx1]
             atm2 = self.parm.atom_list[idx2]
             atm3 = self.parm.atom_list[idx3]
             atm4 = self.parm.atom_list[idx4]
-            if dihedral.signs[1] < 0:
+            if signs[1] < 0:
                 char = 'I'
-            elif dihedral.signs[0] < 0:
+            elif signs[0] < 0:
                 char = 'M'
             else:
                 char = ' '
@@ -1418,9 +1380,9 @@ class printdihedrals(Action):
                       (char, idx1+1, atm1.atname, atm1.attype, idx2+1,
                        atm2.atname, atm2.attype, idx3+1, atm3.atname,
                        atm3.attype, idx4+1, atm4.atname, atm4.attype,
-                       dihedral.dihed_type.phi_k, dihedral.dihed_type.per,
-                       dihedral.dihed_type.phase*180/math.pi,
-                       dihedral.dihed_type.scee, dihedral.dihed_type.scnb)
+                       dihed_type.phi_k, dihed_type.per,
+                       dihed_type.phase*180/math.pi,
+                       dihed_type.scee, dihed_type.scnb)
             )
 
         return retstr
@@ -1473,6 +1435,9 @@ class setbond(Action):
         if not exists:
             self.parm.bond_type_list.append(new_bnd_typ)
 
+        # Look up the existing bonds of each pair in an index rather than
+        # searching the bond lists every time
+        index = TermIndex(self.parm.bonds_inc_h, self.parm.bonds_without_h)
         atnum1, atnum2 = -1, -1
         # Loop through all of the selected atoms
         for it in range(sum(sel1)):
@@ -1484,15 +1449,17 @@ class setbond(Action):
 
             # See if any atom is Hydrogen (allow for deuteriums)
             if atm1.element == 1 or atm2.element == 1:
-                bond_list = self.parm.bonds_inc_h
+                which = 0
             else:
-                bond_list = self.parm.bonds_without_h
+                which = 1
+            bond_list = index.term_lists[which]
    
             # See if the bond exists in the first place, and if so, replace its
             # bond type with our new bond type (new_bnd)
-            if atm2 in atm1.bond_partners or atm1 in atm2.bond_partners:
-                for bnd in bond_list:
-                    if atm1 in bnd and atm2 in bnd:
+            existing = index.find_term(atm1, atm2)
+            if existing:
+                for found, i, bnd in existing:
+                    if found == which:
                         bnd.bond_type = new_bnd_typ
                         bond_list.changed = True
                         break
@@ -1500,6 +1467,7 @@ class setbond(Action):
             # Otherwise, it doesn't exist, so we just create a new one
             else:
                 bond_list.append(Bond(atm1, atm2, new_bnd_typ))
+                index.add(bond_list[-1], which)
 
 #+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
 
@@ -1550,6 +1518,9 @@ class setangle(Action):
         if not exists:
             self.parm.angle_type_list.append(new_ang_typ)
 
+        # Look up the existing angles of each triplet in an index rather than
+        # searching the angle lists every time
+        index = TermIndex(self.parm.angles_inc_h, self.parm.angles_without_h)
         atnum1, atnum2, atnum3 = -1, -1, -1
 
         # Loop through all of the selections
@@ -1563,16 +1534,17 @@ class setangle(Action):
             atm3 = self.parm.atom_list[atnum3]
             # See if any atom is Hydrogen (allow for deuteriums)
             if atm1.element == 1 or atm2.element == 1 or atm3.element == 1:
-                angle_list = self.parm.angles_inc_h
+                which = 0
             else:
-                angle_list = self.parm.angles_without_h
+                which = 1
+            angle_list = index.term_lists[which]
    
             # See if the angle exists in the first place, and if so, replace its
             # angle type with our new angle type (new_ang)
-            if ((atm1 in atm2.bond_partners and atm1 in atm3.angle_partners) and
-                (atm2 in atm3.bond_partners)):
-                for ang in angle_list:
-                    if atm1 in ang and atm2 in ang and atm3 in ang:
+            existing = index.find_term(atm1, atm2, atm3)
+            if existing:
+                for found, i, ang in existing:
+                    if found == which:
                         ang.angle_type = new_ang_typ
                         angle_list.changed = True
                         break
@@ -1580,6 +1552,7 @@ class setangle(Action):
             # Otherwise, it doesn't exist, so we just create a new one
             else:
                 angle_list.append(Angle(atm1, atm2, atm3, new_ang_typ))
+                index.add(angle_list[-1], which)
    
 #+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
 
@@ -1774,6 +1747,10 @@ class deletedihedral(Action):
         # Keep track of the dihedrals we want to delete from each
         # dihedral list (dihedrals_inc_h, dihedrals_without_h)
         deleting_dihedrals = [[],[]]
+        # Look up the dihedrals of each quartet in an index rather than
+        # searching the dihedral lists every time
+        index = TermIndex(self.parm.dihedrals_inc_h,
+                          self.parm.dihedrals_without_h)
         # We have already checked that they are the same number of atoms
         # Now, loop through the atoms and see if any dihedrals match that spec
         atnum1 = atnum2 = atnum3 = atnum4 = -1
@@ -1803,16 +1780,15 @@ class deletedihedral(Action):
             # dihedral list we have to search...)
             if (atm1.element == 1 or atm2.element == 1 or
                 atm3.element == 1 or atm4.element == 1):
-                dihed_list = self.parm.dihedrals_inc_h
                 dihed_list_idx = 0
             else:
-                dihed_list = self.parm.dihedrals_without_h
                 dihed_list_idx = 1
-            # Now search through our dihedral list to see which indexes (if any)
-            # we have to remove. Keep tabs of them so we can pop them in reverse
-            # order (so we don't have to re-figure indices) afterwards
+            # Now look up which indexes (if any) in our dihedral list we have to
+            # remove. Keep tabs of them so we can pop them in reverse order (so
+            # we don't have to re-figure indices) afterwards
             proposed_dihedral = (atnum1, atnum2, atnum3, atnum4)
-            for j, dihed in enumerate(dihed_list):
+            for which, j, dihed in index.find(atm1, atm2, atm3, atm4):
+                if which != dihed_list_idx: continue
                 if dihed == proposed_dihedral:
                     if not found_this_dihedral:
                         print 'Matched dihedral number %d' % j
@@ -1889,22 +1865,15 @@ class printljmatrix(Action):
                     'Atom Type 1', 'Atom Type 2', 'A coefficient',
                     'B coefficient', 'R i,j', 'Eps i,j')
         ret_str += '\n' + '-'*len(ret_str) + '\n'
+        lj = self.parm.lj_matrix()
+        rmin, eps = lj.pair_parameters()
         for ty in sel_types:
             for ty2 in range(1,ntypes+1):
-                type1, type2 = min(ty, ty2), max(ty, ty2)
-                idx = self.parm.parm_data['NONBONDED_PARM_INDEX'][
-                            ntypes*(type1-1)+type2-1]
-                acoef = self.parm.parm_data['LENNARD_JONES_ACOEF'][idx-1]
-                bcoef = self.parm.parm_data['LENNARD_JONES_BCOEF'][idx-1]
-                if bcoef == 0 or acoef == 0:
-                    rij = eij = 0.0
-                else:
-                    rij = (2 * acoef / bcoef) ** (1 / 6)
-                    eij = (bcoef * bcoef / (4 * acoef))
+                i, j = min(ty, ty2) - 1, max(ty, ty2) - 1
                 ret_str += ('%%%ds %%%ds %%15.6f %%15.6f %%10.6f %%10.6f\n' %
                             (maxlen, maxlen) %
-                            (typenames[type1-1], typenames[type2-1],
-                             acoef, bcoef, rij, eij)
+                            (typenames[i], typenames[j], lj.acoef[i][j],
+                             lj.bcoef[i][j], rmin[i][j], eps[i][j])
                 )
 
         return ret_str
@@ -2665,6 +2634,7 @@ class lmod(Action):
     def execute(self):
         for i, val in enumerate(self.parm.parm_data['LENNARD_JONES_ACOEF']):
             self.parm.parm_data['LENNARD_JONES_ACOEF'][i] = val or 1000.0
+        self.parm.lj_changed()
 
 #+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
 
@@ -2892,25 +2862,26 @@ class hmassrepartition(Action):
     def execute(self):
         # Back up the masses in case something goes wrong
         original_masses = self.parm.parm_data['MASS'][:]
-        for i, atom in enumerate(self.parm.atom_list):
-            if atom.atomic_number != 1: continue
-            if not self.changewater and atom.residue.resname in ('WAT', 'HOH'):
-                continue
-            heteroatom = None
-            heteroidx = 0
-            bondeds = list(atom.bond_partners)
-            while heteroidx < len(bondeds):
-                if bondeds[heteroidx].atomic_number != 1:
-                    heteroatom = bondeds[heteroidx]
-                    break
-                heteroidx += 1
-            if heteroatom is None:
+        atoms = self.parm.atom_list
+        hydrogens = [int(atom.atomic_number == 1 and (self.changewater or
+                         atom.residue.resname not in ('WAT', 'HOH')))
+                     for atom in atoms]
+        # Look up the bonded partners of all of the hydrogens at once and take
+        # the first one that is not a hydrogen itself
+        index = atoms.partner_index()
+        heteroatoms = {}
+        for i, j in zip(*index.pairs(hydrogens, index.BOND)):
+            if i not in heteroatoms and atoms[j].atomic_number != 1:
+                heteroatoms[i] = j
+        for i, is_hydrogen in enumerate(hydrogens):
+            if not is_hydrogen: continue
+            if i not in heteroatoms:
                 # Only bonded to other hydrogens. Weird, but do not repartition
                 warnings.warn('H atom detected not bound to heteroatom. '
                               'Ignoring.', ParmWarning)
                 continue
             transfermass = self.new_h_mass - self.parm.parm_data['MASS'][i]
-            oi = heteroatom.starting_index
+            oi = heteroatoms[i]
             self.parm.parm_data['MASS'][i] = self.new_h_mass
             self.parm.parm_data['MASS'][oi] -= transfermass
 
@@ -3059,28 +3030,27 @@ class deletebond(Action):
         self.del_h_bonds = set()
         self.del_noh_bonds = set()
         deleted_bond_list = set()
+        # Find the bonds through an index of the bond lists. Going through the
+        # bonds of each atom in mask1 (rather than every atom in mask2) only
+        # looks at atoms that are actually bonded to it
+        index = TermIndex(self.parm.bonds_inc_h, self.parm.bonds_without_h)
+        atoms2 = set([self.parm.atom_list[j] for j in self.mask2.Selected()])
         for i in self.mask1.Selected():
             ai = self.parm.atom_list[i]
-            for j in self.mask2.Selected():
-                aj = self.parm.atom_list[j]
-                # Skip if these two atoms are identical
-                if ai is aj: continue
-                if aj in ai.bonds():
-                    # A bond exists here. Now find the bond in the appropriate
-                    # list (is there a hydrogen or not?) and add its index to
-                    # the relevant list.
-                    if 1 in (ai.atomic_number, aj.atomic_number):
-                        for ii, bond in enumerate(self.parm.bonds_inc_h):
-                            if ai in bond and aj in bond:
-                                self.del_h_bonds.add(ii)
-                                deleted_bond_list.add(bond)
-                                break
-                    else:
-                        for ii, bond in enumerate(self.parm.bonds_without_h):
-                            if ai in bond and aj in bond:
-                                self.del_noh_bonds.add(ii)
-                                deleted_bond_list.add(bond)
-                                break
+            for which, ii, bond in index.find(ai):
+                aj = bond.atom2 if bond.atom1 is ai else bond.atom1
+                # Skip bonds to atoms not in mask2 (or to ai itself)
+                if aj is ai or not aj in atoms2: continue
+                # A bond exists here. Add its index to the list of the
+                # appropriate bond list (is there a hydrogen or not?) if it is
+                # in that list
+                if 1 in (ai.atomic_number, aj.atomic_number):
+                    if which != 0: continue
+                    self.del_h_bonds.add(ii)
+                else:
+                    if which != 1: continue
+                    self.del_noh_bonds.add(ii)
+                deleted_bond_list.add(bond)
         # Now go through all of our other valence terms and collect the terms
         # we need to delete.
         if not deleted_bond_list:
@@ -3094,30 +3064,26 @@ class deletebond(Action):
             self.del_impropers = set()
             self.del_ureybrad = set()
             self.del_cmap = set()
-        for bond in deleted_bond_list:
-            for i, angle in enumerate(self.parm.angles_inc_h):
-                if bond in angle:
-                    self.del_h_angles.add(i)
-            for i, angle in enumerate(self.parm.angles_without_h):
-                if bond in angle:
-                    self.del_noh_angles.add(i)
-            for i, dihed in enumerate(self.parm.dihedrals_inc_h):
-                if bond in dihed:
-                    self.del_h_dihedrals.add(i)
-            for i, dihed in enumerate(self.parm.dihedrals_without_h):
-                if bond in dihed:
-                    self.del_noh_dihedrals.add(i)
-            if self.parm.chamber:
-                for i, ureybrad in enumerate(self.parm.urey_bradley):
-                    if bond in ureybrad:
-                        self.del_ureybrad.add(i)
-                for i, improper in enumerate(self.parm.improper):
-                    if bond in improper:
-                        self.del_impropers.add(i)
-                if hasattr(self.parm, 'cmap'):
-                    for i, cmap in enumerate(self.parm.cmap):
-                        if bond in cmap:
-                            self.del_cmap.add(i)
+        # Each kind of term with the sets of indexes to delete from each of its
+        # lists
+        kinds = [((self.parm.angles_inc_h, self.parm.angles_without_h),
+                  (self.del_h_angles, self.del_noh_angles)),
+                 ((self.parm.dihedrals_inc_h, self.parm.dihedrals_without_h),
+                  (self.del_h_dihedrals, self.del_noh_dihedrals))]
+        if self.parm.chamber:
+            kinds.append(((self.parm.urey_bradley,), (self.del_ureybrad,)))
+            kinds.append(((self.parm.improper,), (self.del_impropers,)))
+            if hasattr(self.parm, 'cmap'):
+                kinds.append(((self.parm.cmap,), (self.del_cmap,)))
+        # Only terms containing an atom of a bond can be severed by it (a
+        # Urey-Bradley term does not contain the central atom)
+        for term_lists, deleted in kinds:
+            index = TermIndex(*term_lists)
+            for bond in deleted_bond_list:
+                for atom in (bond.atom1, bond.atom2):
+                    for which, i, term in index.find(atom):
+                        if bond in term:
+                            deleted[which].add(i)
 
     def __str__(self):
         if not self.del_h_bonds and not self.del_noh_bonds:
@@ -3162,7 +3128,7 @@ class deletebond(Action):
     def _dfl(selection, mylist):
         """ Delete From List """
         if not selection: return
-        for i in reversed(list(selection)):
+        for i in sorted(selection, reverse=True):
             del mylist[i]
 
     def execute(self):
@@ -3239,7 +3205,7 @@ class fixtopology(Action):
     def execute(self):
         if not self.needs_fixing: return
         # This is the tracked list type we're using
-        listtype = type(self.parm.bonds_inc_h)
+        listtype = TrackedList
         if self.bf:
             # Need to fix bonds
             bonds_inc_h = listtype()
@@ -1,9 +1,11 @@
 " This command adds a new Lennard Jones atom type from the selected atoms. "
 
-from math import sqrt
-
 def AddLJType(parm, sel_atms, radius, epsilon, radius14=None, epsilon14=None):
     """ Adds a new Lennard Jones type to a topology file """
+    # The combining rules are applied with the matrices of the old types
+    lj = parm.lj_matrix()
+    if parm.chamber:
+        lj14 = parm.lj_matrix(one_4=True)
     # Set the new atom type
     for i in range(len(sel_atms)):
         if sel_atms[i] == 1:
@@ -31,34 +33,25 @@ def AddLJType(parm, sel_atms, radius, epsilon, radius14=None, epsilon14=None):
     # New type interacting with itself
     parm.parm_data['NONBONDED_PARM_INDEX'].append(current_idx)
 
-    # Now we need to add onto the ACOEF and BCOEF arrays
-    for i in range(old_ntypes):
-        rad = parm.LJ_radius[i] + radius
-        depth = sqrt(parm.LJ_depth[i] * epsilon)
-        parm.parm_data['LENNARD_JONES_ACOEF'].append(depth * rad**12)
-        parm.parm_data['LENNARD_JONES_BCOEF'].append(2 * depth * rad**6)
-    # Do the same for the 1-4 interactions if we're doing a chamber prmtop
-    if parm.chamber:
-        for i in range(old_ntypes):
-            rad = parm.LJ_14_radius[i] + radius14
-            depth = sqrt(parm.LJ_14_depth[i] * epsilon14)
-            parm.parm_data['LENNARD_JONES_14_ACOEF'].append(depth * rad**12)
-            parm.parm_data['LENNARD_JONES_14_BCOEF'].append(2 * depth * rad**6)
-   
-    # Now add the last type interacting with itself, and add it to the
+    # Now we need to add onto the ACOEF and BCOEF arrays the pairs of the new
+    # type with every other type and then with itself, and add it to the
     # LJ_radius/depth arrays
-    depth = epsilon
-    rad = 2 * radius
-    parm.parm_data['LENNARD_JONES_ACOEF'].append(depth * rad**12)
-    parm.parm_data['LENNARD_JONES_BCOEF'].append(2 * depth * rad**6)
     parm.LJ_radius.append(radius)
-    parm.LJ_depth.append(depth)
+    parm.LJ_depth.append(epsilon)
+    acoef, bcoef = lj.combine([old_ntypes], parm.LJ_radius, parm.LJ_depth)
+    parm.parm_data['LENNARD_JONES_ACOEF'].extend([float(a) for a in acoef[0]])
+    parm.parm_data['LENNARD_JONES_BCOEF'].extend([float(b) for b in bcoef[0]])
 
     # Do the same for chamber prmtops
     if parm.chamber:
-        depth = epsilon14
-        rad = 2 * radius14
-        parm.parm_data['LENNARD_JONES_14_ACOEF'].append(depth * rad**12)
-        parm.parm_data['LENNARD_JONES_14_BCOEF'].append(2 * depth * rad**6)
         parm.LJ_14_radius.append(radius14)
         parm.LJ_14_depth.append(epsilon14)
+        acoef, bcoef = lj14.combine([old_ntypes], parm.LJ_14_radius,
+                                    parm.LJ_14_depth)
+        parm.parm_data['LENNARD_JONES_14_ACOEF'].extend(
+                                            [float(a) for a in acoef[0]])
+        parm.parm_data['LENNARD_JONES_14_BCOEF'].extend(
+                                            [float(b) for b in bcoef[0]])
+
+    # The number of types and the layout of the sections changed
+    parm.lj_changed()
@@ -36,23 +36,30 @@ class ParmList(object):
         self.current_index = self.index(idx)
         self.parm = self[self.current_index]
 
-    def add_parm(self, parm, rst7=None):
-        """ Add a parm to the list """
+    def add_parm(self, parm, rst7=None, use_mmap=False, compact=False,
+                 array_topology=False):
+        """
+        Add a parm to the list. If parm is a file name, use_mmap parses it from
+        a memory map of the file, compact stores its data in compact typed
+        arrays, and array_topology stores its bonds, angles, and dihedrals as
+        arrays until their objects are needed
+        """
         # Make sure this parm is not part of the list already
         if str(parm) in self._parm_names:
             raise DuplicateParm('%s already in ParmList' % parm)
         # Convert a string to an AmberParm or add an AmberParm directly
         if not isinstance(parm, AmberFormat):
-            parm = AmberFormat(parm)
+            parm = AmberFormat(parm, use_mmap=use_mmap, compact=compact)
             # From the parm data, we should be able to tell whether it was a
             # chamber topology or regular topology. Take the proper view and
             # add it to the list
             if 'CTITLE' in parm.flag_list:
-                parm = parm.view(ChamberParm)
+                cls = ChamberParm
             elif 'AMOEBA_FORCEFIELD' in parm.flag_list:
-                parm = parm.view(AmoebaParm)
+                cls = AmoebaParm
             else:
-                parm = parm.view(AmberParm)
+                cls = AmberParm
+            parm = cls.load_from_rawdata(parm, array_topology=array_topology)
         # Otherwise, add in the new parm's name
         self._parm_names.append(str(parm))
         self._parm_instances.append(parm)
@@ -0,0 +1,13 @@
+"""
+Benchmarks for reading, setting up, and writing Amber topology files. Run the
+full suite with
+
+    python -m benchmarks.prmtop [options]
+
+from the top of the source tree (see benchmarks/prmtop.py for the options).
+The memory taken up by the topology objects is measured separately with
+
+    python -m benchmarks.memory [options]
+"""
+
+__all__ = ['memory', 'prmtop', 'synthetic', 'write_prmtop']
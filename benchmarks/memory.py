@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""
+Measures how much memory the object graph of an AmberParm takes up for the
+synthetic systems in synthetic.py, and reports the results as JSON. Each system
+and size is run in a fresh Python process. For every case the following are
+reported:
+
+    natom          -- Number of atoms
+    objects        -- Number of topology objects (atoms, residues, bonds,
+                      angles, dihedrals, and their types) of each class
+    graph_mb       -- Size (in MB) of those objects, their instance dicts (if
+                      they have them), and every list, set, and dict they hold,
+                      as reported by sys.getsizeof. Containers shared between
+                      objects are only counted once
+    bytes_per_atom -- graph_mb divided by the number of atoms
+    peak_rss_mb    -- Peak resident set size of the process once the structure
+                      has been set up
+
+To compare two versions of the code, run this benchmark on the old version with
+-o FILE, then on the new one with --baseline FILE. The change in the size of
+the object graph is printed for every case, and the program exits with status 1
+if any of them grew by more than the tolerance.
+
+Usage: python -m benchmarks.memory [-s SYSTEM] [-n NATOM] [-o FILE]
+                                   [--baseline FILE [--tolerance FRAC]]
+"""
+from __future__ import division
+
+from argparse import ArgumentParser
+import json
+import os
+import platform
+import subprocess
+import sys
+
+if __name__ == '__main__' and __package__ is None:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    os.path.pardir))
+
+from benchmarks.prmtop import peak_rss
+from benchmarks.synthetic import SYSTEMS
+from chemistry.amber.readparm import AmberParm
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+_CONTAINERS = (list, set, frozenset, dict)
+
+def _attribute_values(obj):
+    """ Yields the values of every attribute set on obj """
+    if hasattr(obj, '__dict__'):
+        for value in obj.__dict__.values():
+            yield value
+    for cls in type(obj).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            try:
+                yield object.__getattribute__(obj, name)
+            except AttributeError:
+                pass
+
+def graph_size(parm):
+    """
+    Adds up the memory taken by the topology objects of a parm
+
+    Parameters:
+        parm (AmberParm): The topology whose structure should be measured
+
+    Returns:
+        (total size in bytes, dict mapping class names to object counts)
+    """
+    seen = set()
+    total = 0
+    counts = {}
+    for name in type(parm)._structure_attrs:
+        for obj in getattr(parm, name):
+            if id(obj) in seen: continue
+            seen.add(id(obj))
+            cls = type(obj).__name__
+            counts[cls] = counts.get(cls, 0) + 1
+            total += sys.getsizeof(obj)
+            if hasattr(obj, '__dict__'):
+                total += sys.getsizeof(obj.__dict__)
+            for value in _attribute_values(obj):
+                if isinstance(value, _CONTAINERS) and not id(value) in seen:
+                    seen.add(id(value))
+                    total += sys.getsizeof(value)
+    return total, counts
+
+def run_case(system, natom):
+    """
+    Builds one system, sets up its structure, and measures it
+
+    Parameters:
+        system (str): Name of the system in SYSTEMS
+        natom (int): Approximate number of atoms
+
+    Returns:
+        dict with the results described in the module docstring
+    """
+    parm = AmberParm.load_from_rawdata(SYSTEMS[system](natom))
+    size, counts = graph_size(parm)
+    natom = parm.ptr('natom')
+    return dict(system=system, natom=natom, objects=counts,
+                graph_mb=size / 1024**2, bytes_per_atom=size / natom,
+                peak_rss_mb=peak_rss())
+
+def run_suite(systems, sizes):
+    """ Runs every case in its own Python process and returns the results """
+    results = []
+    for system in systems:
+        for natom in sizes:
+            sys.stderr.write('Measuring %s with %d atoms...\n' % (system, natom))
+            proc = subprocess.Popen([sys.executable, '-m', 'benchmarks.memory',
+                                     '--single', system, str(natom)],
+                                    stdout=subprocess.PIPE,
+                                    cwd=os.path.join(os.path.dirname(
+                                        os.path.abspath(__file__)),
+                                        os.path.pardir))
+            out = proc.communicate()[0]
+            if proc.returncode != 0:
+                raise RuntimeError('Memory benchmark of %s with %d atoms '
+                                   'failed' % (system, natom))
+            results.append(json.loads(out.decode('utf-8')))
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Compares the object graph sizes against a baseline set of results
+
+    Parameters:
+        results (list): Results from run_suite
+        baseline (list): Results from an earlier run_suite
+        tolerance (float): Allowed fractional growth of the object graph
+
+    Returns:
+        (list of strings comparing every case found in both sets of results,
+         list of strings describing every case that grew more than allowed)
+    """
+    reference = {}
+    for case in baseline:
+        reference[(case['system'], case['natom'])] = case
+    report, regressions = [], []
+    for case in results:
+        ref = reference.get((case['system'], case['natom']))
+        if ref is None: continue
+        old, new = ref['graph_mb'], case['graph_mb']
+        line = ('%s (%d atoms): %.1f MB -> %.1f MB (%.0f -> %.0f bytes/atom, '
+                '%+.1f%%)' % (case['system'], case['natom'], old, new,
+                ref['bytes_per_atom'], case['bytes_per_atom'],
+                100 * (new - old) / old))
+        report.append(line)
+        if new > old * (1 + tolerance):
+            regressions.append(line)
+    return report, regressions
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-s', '--system', dest='systems', action='append',
+                        default=[], choices=sorted(SYSTEMS.keys()),
+                        help='''System to measure. Can be specified multiple
+                        times. Default is all of them''')
+    parser.add_argument('-n', '--natom', dest='sizes', type=int,
+                        action='append', default=[], metavar='NATOM',
+                        help='''Approximate number of atoms in the test system.
+                        Can be specified multiple times. Default %s''' %
+                        ', '.join([str(n) for n in DEFAULT_SIZES]))
+    parser.add_argument('-o', '--output', dest='output', default=None,
+                        metavar='FILE', help='''File to write the JSON results
+                        to. Default is standard output''')
+    parser.add_argument('--baseline', dest='baseline', default=None,
+                        metavar='FILE', help='''JSON results of an earlier run
+                        to compare against''')
+    parser.add_argument('--tolerance', dest='tolerance', type=float,
+                        default=0.05, metavar='FRAC', help='''Fractional
+                        growth of the object graph compared to the baseline
+                        that counts as a regression. Default %(default)s''')
+    parser.add_argument('--single', dest='single', nargs=2, default=None,
+                        metavar=('SYSTEM', 'NATOM'), help='''Measure a single
+                        case in this process and print its results (used
+                        internally)''')
+    opt = parser.parse_args()
+
+    if opt.single is not None:
+        result = run_case(opt.single[0], int(opt.single[1]))
+        sys.stdout.write(json.dumps(result) + '\n')
+        return
+
+    results = run_suite(opt.systems or sorted(SYSTEMS.keys()),
+                        opt.sizes or DEFAULT_SIZES)
+    report = dict(python=platform.python_version(),
+                  platform=platform.platform(), results=results)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if opt.output is None:
+        sys.stdout.write(text + '\n')
+    else:
+        f = open(opt.output, 'w')
+        try:
+            f.write(text + '\n')
+        finally:
+            f.close()
+
+    if opt.baseline is not None:
+        f = open(opt.baseline, 'r')
+        try:
+            baseline = json.load(f)['results']
+        finally:
+            f.close()
+        comparison, regressions = compare(results, baseline, opt.tolerance)
+        sys.stderr.write('Object graph size compared to the baseline:\n    %s\n'
+                         % '\n    '.join(comparison))
+        if regressions:
+            sys.stderr.write('Memory regressions:\n    %s\n' %
+                             '\n    '.join(regressions))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""
+Times reading, setting up, and writing synthetic Amber topologies (see
+synthetic.py) and reports the results as JSON. Each system and size is run in a
+fresh Python process so the peak memory use of one case does not leak into the
+next. For every case the following stages are timed, in order:
+
+    generate    -- Building the synthetic topology (not part of ParmEd)
+    rdparm      -- AmberFormat.rdparm on the written topology file
+    initialize  -- Setting up an AmberParm from the parsed data (LoadPointers,
+                   fill_LJ, and _load_structure)
+    remake_parm -- AmberParm.remake_parm of the whole topology (as if atoms
+                   had been deleted)
+    remake_bond -- AmberParm.remake_parm after changing the type of one bond,
+                   which only rewrites the bond and exclusion sections
+    writeParm   -- AmberParm.writeParm
+
+and each stage reports its wall time in seconds and the peak resident set size
+of the process (in MB) once the stage is done. If --baseline is given, every
+stage is compared against the same stage in an earlier set of results, and the
+program exits with status 1 if any of them got slower by more than the
+tolerance, so it can be used to catch regressions in CI. With --array-topology
+the bonds, angles, and dihedrals are stored as arrays (see
+chemistry.amber.termarrays).
+
+Usage: python -m benchmarks.prmtop [-s SYSTEM] [-n NATOM] [-o FILE]
+                                   [--baseline FILE [--tolerance FRAC]]
+                                   [--array-topology]
+"""
+from __future__ import division
+
+from argparse import ArgumentParser
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from time import time
+try:
+    import resource
+except ImportError:
+    resource = None
+
+if __name__ == '__main__' and __package__ is None:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    os.path.pardir))
+
+from benchmarks.synthetic import SYSTEMS
+from chemistry.amber.amberformat import AmberFormat
+from chemistry.amber.readparm import AmberParm
+from chemistry.amber.topologyobjects import BondType
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000, 5000000]
+STAGES = ['generate', 'rdparm', 'initialize', 'remake_parm', 'remake_bond',
+          'writeParm']
+
+def peak_rss():
+    """ Peak resident set size of this process in MB (None if unknown) """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, but Mac OS X reports bytes
+    if sys.platform == 'darwin':
+        return peak / 1024**2
+    return peak / 1024
+
+def run_case(system, natom, array_topology=False):
+    """
+    Runs every stage for one system in this process
+
+    Parameters:
+        system (str): Name of the system in SYSTEMS
+        natom (int): Approximate number of atoms
+        array_topology (bool): Store the bonds, angles, and dihedrals as arrays
+
+    Returns:
+        dict with the system, the actual number of atoms, and the wall time and
+        peak RSS of each stage
+    """
+    stages = {}
+    def record(stage, start):
+        stages[stage] = dict(wall=time() - start, peak_rss_mb=peak_rss())
+
+    fd, fname = tempfile.mkstemp(suffix='.parm7')
+    os.close(fd)
+    try:
+        start = time()
+        gen = SYSTEMS[system](natom)
+        record('generate', start)
+        gen.writeParm(fname)
+        del gen
+
+        start = time()
+        raw = AmberFormat(fname)
+        record('rdparm', start)
+
+        start = time()
+        parm = AmberParm.load_from_rawdata(raw, array_topology=array_topology)
+        record('initialize', start)
+        del raw
+
+        start = time()
+        parm.atom_list.changed = True
+        parm.remake_parm()
+        record('remake_parm', start)
+
+        start = time()
+        bonds = parm.bonds_without_h or parm.bonds_inc_h
+        parm.bond_type_list.append(BondType(100.0, 1.5, -1))
+        bonds[0].bond_type = parm.bond_type_list[-1]
+        bonds.changed = True
+        parm.remake_parm()
+        record('remake_bond', start)
+
+        start = time()
+        parm.writeParm(fname)
+        record('writeParm', start)
+        size = os.path.getsize(fname)
+    finally:
+        os.unlink(fname)
+
+    return dict(system=system, natom=parm.ptr('natom'), file_size=size,
+                array_topology=array_topology, stages=stages)
+
+def run_suite(systems, sizes, array_topology=False):
+    """ Runs every case in its own Python process and returns the results """
+    results = []
+    extra = array_topology and ['--array-topology'] or []
+    for system in systems:
+        for natom in sizes:
+            sys.stderr.write('Running %s with %d atoms...\n' % (system, natom))
+            proc = subprocess.Popen([sys.executable, '-m', 'benchmarks.prmtop',
+                                     '--single', system, str(natom)] + extra,
+                                    stdout=subprocess.PIPE,
+                                    cwd=os.path.join(os.path.dirname(
+                                        os.path.abspath(__file__)),
+                                        os.path.pardir))
+            out = proc.communicate()[0]
+            if proc.returncode != 0:
+                raise RuntimeError('Benchmark of %s with %d atoms failed' %
+                                   (system, natom))
+            results.append(json.loads(out.decode('utf-8')))
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Compares wall times against a baseline set of results
+
+    Parameters:
+        results (list): Results from run_suite
+        baseline (list): Results from an earlier run_suite
+        tolerance (float): Allowed fractional slowdown of each stage
+
+    Returns:
+        list of strings describing every stage that got slower than allowed
+    """
+    reference = {}
+    for case in baseline:
+        reference[(case['system'], case['natom'])] = case['stages']
+    regressions = []
+    for case in results:
+        ref = reference.get((case['system'], case['natom']))
+        if ref is None: continue
+        for stage in STAGES:
+            if not stage in ref or not stage in case['stages']: continue
+            old = ref[stage]['wall']
+            new = case['stages'][stage]['wall']
+            if new > old * (1 + tolerance):
+                regressions.append('%s (%d atoms) %s: %.3f s -> %.3f s' %
+                                   (case['system'], case['natom'], stage,
+                                    old, new))
+    return regressions
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-s', '--system', dest='systems', action='append',
+                        default=[], choices=sorted(SYSTEMS.keys()),
+                        help='''System to benchmark. Can be specified multiple
+                        times. Default is all of them''')
+    parser.add_argument('-n', '--natom', dest='sizes', type=int,
+                        action='append', default=[], metavar='NATOM',
+                        help='''Approximate number of atoms in the test system.
+                        Can be specified multiple times. Default %s''' %
+                        ', '.join([str(n) for n in DEFAULT_SIZES]))
+    parser.add_argument('-o', '--output', dest='output', default=None,
+                        metavar='FILE', help='''File to write the JSON results
+                        to. Default is standard output''')
+    parser.add_argument('--baseline', dest='baseline', default=None,
+                        metavar='FILE', help='''JSON results of an earlier run
+                        to compare against''')
+    parser.add_argument('--tolerance', dest='tolerance', type=float,
+                        default=0.25, metavar='FRAC', help='''Fractional
+                        slowdown of a stage compared to the baseline that
+                        counts as a regression. Default %(default)s''')
+    parser.add_argument('--single', dest='single', nargs=2, default=None,
+                        metavar=('SYSTEM', 'NATOM'), help='''Run a single case
+                        in this process and print its results (used
+                        internally)''')
+    parser.add_argument('--array-topology', dest='array_topology',
+                        action='store_true', default=False, help='''Store the
+                        bonds, angles, and dihedrals as arrays''')
+    opt = parser.parse_args()
+
+    if opt.single is not None:
+        result = run_case(opt.single[0], int(opt.single[1]),
+                          opt.array_topology)
+        sys.stdout.write(json.dumps(result) + '\n')
+        return
+
+    results = run_suite(opt.systems or sorted(SYSTEMS.keys()),
+                        opt.sizes or DEFAULT_SIZES, opt.array_topology)
+    report = dict(python=platform.python_version(),
+                  platform=platform.platform(), results=results)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if opt.output is None:
+        sys.stdout.write(text + '\n')
+    else:
+        f = open(opt.output, 'w')
+        try:
+            f.write(text + '\n')
+        finally:
+            f.close()
+
+    if opt.baseline is not None:
+        f = open(opt.baseline, 'r')
+        try:
+            baseline = json.load(f)['results']
+        finally:
+            f.close()
+        regressions = compare(results, baseline, opt.tolerance)
+        if regressions:
+            sys.stderr.write('Performance regressions:\n    %s\n' %
+                             '\n    '.join(regressions))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,445 @@
+"""
+Generates synthetic, but complete and valid, Amber topology files for
+benchmarking. Systems are built by tiling a molecule template: the atoms,
+bonds, angles, dihedrals, and exclusions of each distinct molecule are worked
+out once from its bond graph and then copied with an atom offset, so even
+multi-million atom systems are generated quickly.
+
+Three kinds of systems are available (see SYSTEMS):
+    water   -- A periodic box of rigid TIP3P waters
+    peptide -- Chains of 100 alanine-like residues
+    lipid   -- Lipid-like molecules: a head group, a glycerol linker, and two
+               16-carbon tails
+"""
+from __future__ import division
+
+from chemistry.amber.amberformat import AmberFormat
+from chemistry.amber.constants import (NATOM, NTYPES, NBONH, MBONA, NTHETH,
+            MTHETA, NPHIH, MPHIA, NNB, NRES, NBONA, NTHETA, NPHIA, NUMBND,
+            NUMANG, NPTRA, NATYP, IFBOX, NMXRS)
+from math import sqrt
+
+__all__ = ['Residue', 'Molecule', 'build_topology', 'water_box', 'peptide',
+           'lipid', 'SYSTEMS']
+
+# Atomic number, mass, GB radius, and GB screening parameter of each element
+_ELEMENTS = {'H' : (1, 1.008, 1.2, 0.85), 'C' : (6, 12.01, 1.7, 0.72),
+             'N' : (7, 14.01, 1.55, 0.79), 'O' : (8, 16.00, 1.5, 0.85),
+             'P' : (15, 30.97, 1.85, 0.86)}
+
+# Lennard-Jones Rmin/2 and well depth of each atom type
+_LJ = {'OW' : (1.7683, 0.1520), 'HW' : (0.0, 0.0), 'N' : (1.8240, 0.1700),
+       'H' : (0.6000, 0.0157), 'CT' : (1.9080, 0.1094),
+       'HC' : (1.4870, 0.0157), 'H1' : (1.3870, 0.0157),
+       'C' : (1.9080, 0.0860), 'O' : (1.6612, 0.2100),
+       'OS' : (1.6837, 0.1700), 'O2' : (1.6612, 0.2100),
+       'P' : (2.1000, 0.2000), 'N3' : (1.8240, 0.1700),
+       'HP' : (1.1000, 0.0157)}
+
+class Residue(object):
+    """ A residue template: its atoms and the bonds between them """
+
+    def __init__(self, name, atoms, bonds):
+        """
+        Parameters:
+            name (str): Residue name
+            atoms (list): (name, type, charge, element) tuples for each atom
+            bonds (list): (name, name) tuples of the bonded atoms
+        """
+        self.name = name
+        self.atoms = atoms
+        index = dict([(atom[0], i) for i, atom in enumerate(atoms)])
+        self.index = index
+        self.bonds = [(index[a1], index[a2]) for a1, a2 in bonds]
+
+class Molecule(object):
+    """
+    A molecule template made of residues. The angles, dihedrals, and exclusions
+    are derived from the bonds (all 0-based and relative to the first atom)
+    """
+
+    def __init__(self, residues, links=(), rigid=False):
+        """
+        Parameters:
+            residues (list of Residue): The residues, in order
+            links (list): (residue index, atom name, residue index, atom name)
+                tuples of the bonds between residues
+            rigid (bool): If True, the molecule has no angles or dihedrals (as
+                for a rigid water model)
+        """
+        self.atoms = []
+        self.residues = []
+        starts = []
+        for res in residues:
+            starts.append(len(self.atoms))
+            self.residues.append((res.name, len(self.atoms)))
+            self.atoms.extend(res.atoms)
+        self.bonds = []
+        for res, start in zip(residues, starts):
+            self.bonds.extend([(i+start, j+start) for i, j in res.bonds])
+        for ires, name1, jres, name2 in links:
+            self.bonds.append((starts[ires] + residues[ires].index[name1],
+                               starts[jres] + residues[jres].index[name2]))
+        natom = len(self.atoms)
+        partners = [[] for i in range(natom)]
+        for i, j in self.bonds:
+            partners[i].append(j)
+            partners[j].append(i)
+        self.angles = []
+        self.dihedrals = []
+        if not rigid:
+            for j in range(natom):
+                for i in partners[j]:
+                    for k in partners[j]:
+                        if i < k:
+                            self.angles.append((i, j, k))
+            for j, k in self.bonds:
+                for i in partners[j]:
+                    if i == k: continue
+                    for l in partners[k]:
+                        if l == j or l == i: continue
+                        self.dihedrals.append((i, j, k, l))
+        # Exclusions are every atom within 3 bonds with a higher index
+        self.exclusions = []
+        for i in range(natom):
+            excl = set(partners[i])
+            for j in partners[i]:
+                excl.update(partners[j])
+                for k in partners[j]:
+                    excl.update(partners[k])
+            self.exclusions.append(sorted([j for j in excl if j > i]))
+
+def _lj_coefficients(types):
+    """ Returns the A and B coefficients for every pair of LJ types """
+    acoef, bcoef = [], []
+    for j in range(len(types)):
+        for i in range(j + 1):
+            rmin = _LJ[types[i]][0] + _LJ[types[j]][0]
+            eps = sqrt(_LJ[types[i]][1] * _LJ[types[j]][1])
+            acoef.append(eps * rmin**12)
+            bcoef.append(2 * eps * rmin**6)
+    return acoef, bcoef
+
+def build_topology(title, molecules, box=None):
+    """
+    Builds a topology by tiling molecule templates
+
+    Parameters:
+        title (str): Title of the topology file
+        molecules (list): (Molecule, count) tuples, in the order the molecules
+            should appear in the topology file
+        box (list): The box lengths (in Angstroms). If given, the topology is
+            periodic, and every molecule is treated as solvent
+
+    Returns:
+        AmberFormat instance with every section of a standard prmtop
+    """
+    lj_types = []
+    for mol, count in molecules:
+        for atom in mol.atoms:
+            if not atom[1] in lj_types:
+                lj_types.append(atom[1])
+
+    # Sort the bonded terms of each molecule into those with and without
+    # hydrogen, keyed by the atom types they are parametrized by
+    terms = []
+    for mol, count in molecules:
+        hydrogen = [atom[3] == 'H' for atom in mol.atoms]
+        types = [atom[1] for atom in mol.atoms]
+        bonds_h, bonds = [], []
+        for i, j in mol.bonds:
+            key = tuple(sorted((types[i], types[j])))
+            if hydrogen[i] or hydrogen[j]:
+                bonds_h.append((i, j, key))
+            else:
+                bonds.append((i, j, key))
+        angles_h, angles = [], []
+        for i, j, k in mol.angles:
+            key = (min(types[i], types[k]), types[j], max(types[i], types[k]))
+            if hydrogen[i] or hydrogen[j] or hydrogen[k]:
+                angles_h.append((i, j, k, key))
+            else:
+                angles.append((i, j, k, key))
+        dihedrals_h, dihedrals = [], []
+        for i, j, k, l in mol.dihedrals:
+            key = (types[i], types[j], types[k], types[l])
+            if key[::-1] < key: key = key[::-1]
+            if hydrogen[i] or hydrogen[j] or hydrogen[k] or hydrogen[l]:
+                dihedrals_h.append((i, j, k, l, key))
+            else:
+                dihedrals.append((i, j, k, l, key))
+        terms.append([bonds_h, bonds, angles_h, angles, dihedrals_h,
+                      dihedrals])
+
+    # Number the parameter types in the order they are first used in the
+    # topology file (the same order remake_parm assigns them in)
+    bond_types, angle_types, dihedral_types = {}, {}, {}
+    for first, types in ((0, bond_types), (2, angle_types),
+                         (4, dihedral_types)):
+        for idx in (first, first + 1):
+            for mol_terms in terms:
+                for term in mol_terms[idx]:
+                    if not term[-1] in types:
+                        types[term[-1]] = len(types) + 1
+    for mol_terms in terms:
+        for idx, types in enumerate((bond_types, bond_types, angle_types,
+                                     angle_types, dihedral_types,
+                                     dihedral_types)):
+            mol_terms[idx] = [term[:-1] + (types[term[-1]],)
+                              for term in mol_terms[idx]]
+
+    data = {}
+    for flag in ('ATOM_NAME', 'CHARGE', 'ATOMIC_NUMBER', 'MASS',
+                 'ATOM_TYPE_INDEX', 'NUMBER_EXCLUDED_ATOMS', 'RESIDUE_LABEL',
+                 'RESIDUE_POINTER', 'BONDS_INC_HYDROGEN',
+                 'BONDS_WITHOUT_HYDROGEN', 'ANGLES_INC_HYDROGEN',
+                 'ANGLES_WITHOUT_HYDROGEN', 'DIHEDRALS_INC_HYDROGEN',
+                 'DIHEDRALS_WITHOUT_HYDROGEN', 'EXCLUDED_ATOMS_LIST',
+                 'AMBER_ATOM_TYPE', 'RADII', 'SCREEN', 'ATOMS_PER_MOLECULE'):
+        data[flag] = []
+    natom = nres = nmxrs = 0
+    for (mol, count), mol_terms in zip(molecules, terms):
+        # Work out the per-molecule arrays once, then tile them
+        atoms = mol.atoms
+        types = [atom[1] for atom in atoms]
+        bonds_h, bonds, angles_h, angles, dihedrals_h, dihedrals = mol_terms
+        nexcl = [len(excl) or 1 for excl in mol.exclusions]
+        size = len(atoms)
+        for start, stop in zip([r[1] for r in mol.residues],
+                               [r[1] for r in mol.residues[1:]] + [size]):
+            nmxrs = max(nmxrs, stop - start)
+        elements = [_ELEMENTS[atom[3]] for atom in atoms]
+        data['ATOM_NAME'].extend([atom[0] for atom in atoms] * count)
+        data['CHARGE'].extend([atom[2] for atom in atoms] * count)
+        data['ATOMIC_NUMBER'].extend([e[0] for e in elements] * count)
+        data['MASS'].extend([e[1] for e in elements] * count)
+        data['ATOM_TYPE_INDEX'].extend(
+                [lj_types.index(typ) + 1 for typ in types] * count)
+        data['NUMBER_EXCLUDED_ATOMS'].extend(nexcl * count)
+        data['AMBER_ATOM_TYPE'].extend(types * count)
+        data['RADII'].extend([e[2] for e in elements] * count)
+        data['SCREEN'].extend([e[3] for e in elements] * count)
+        data['RESIDUE_LABEL'].extend([r[0] for r in mol.residues] * count)
+        data['ATOMS_PER_MOLECULE'].extend([size] * count)
+        for n in range(count):
+            off = natom + n * size
+            data['RESIDUE_POINTER'].extend(
+                    [r[1] + off + 1 for r in mol.residues])
+            # Bonded terms store 3 * (atom index)
+            o3 = 3 * off
+            for src, dest in ((bonds_h, 'BONDS_INC_HYDROGEN'),
+                              (bonds, 'BONDS_WITHOUT_HYDROGEN')):
+                for i, j, typ in src:
+                    data[dest].extend((3*i + o3, 3*j + o3, typ))
+            for src, dest in ((angles_h, 'ANGLES_INC_HYDROGEN'),
+                              (angles, 'ANGLES_WITHOUT_HYDROGEN')):
+                for i, j, k, typ in src:
+                    data[dest].extend((3*i + o3, 3*j + o3, 3*k + o3, typ))
+            for src, dest in ((dihedrals_h, 'DIHEDRALS_INC_HYDROGEN'),
+                              (dihedrals, 'DIHEDRALS_WITHOUT_HYDROGEN')):
+                for i, j, k, l, typ in src:
+                    # The third atom cannot be atom 0, since its sign is used
+                    if k + off == 0 or l + off == 0:
+                        i, j, k, l = l, k, j, i
+                    data[dest].extend((3*i + o3, 3*j + o3, 3*k + o3,
+                                       3*l + o3, typ))
+            for excl in mol.exclusions:
+                if excl:
+                    data['EXCLUDED_ATOMS_LIST'].extend(
+                            [j + off + 1 for j in excl])
+                else:
+                    data['EXCLUDED_ATOMS_LIST'].append(0)
+        natom += size * count
+        nres += len(mol.residues) * count
+
+    ntypes = len(lj_types)
+    nb_idx = [0 for i in range(ntypes * ntypes)]
+    for i in range(ntypes):
+        for j in range(ntypes):
+            lo, hi = min(i, j), max(i, j)
+            nb_idx[ntypes*i+j] = hi * (hi + 1) // 2 + lo + 1
+    acoef, bcoef = _lj_coefficients(lj_types)
+
+    bond_keys = sorted(bond_types, key=bond_types.get)
+    angle_keys = sorted(angle_types, key=angle_types.get)
+    dihedral_keys = sorted(dihedral_types, key=dihedral_types.get)
+
+    pointers = [0 for i in range(31)]
+    pointers[NATOM] = natom
+    pointers[NTYPES] = ntypes
+    pointers[NBONH] = len(data['BONDS_INC_HYDROGEN']) // 3
+    pointers[MBONA] = pointers[NBONA] = \
+            len(data['BONDS_WITHOUT_HYDROGEN']) // 3
+    pointers[NTHETH] = len(data['ANGLES_INC_HYDROGEN']) // 4
+    pointers[MTHETA] = pointers[NTHETA] = \
+            len(data['ANGLES_WITHOUT_HYDROGEN']) // 4
+    pointers[NPHIH] = len(data['DIHEDRALS_INC_HYDROGEN']) // 5
+    pointers[MPHIA] = pointers[NPHIA] = \
+            len(data['DIHEDRALS_WITHOUT_HYDROGEN']) // 5
+    pointers[NNB] = len(data['EXCLUDED_ATOMS_LIST'])
+    pointers[NRES] = nres
+    pointers[NUMBND] = len(bond_keys)
+    pointers[NUMANG] = len(angle_keys)
+    pointers[NPTRA] = len(dihedral_keys)
+    pointers[NATYP] = 1
+    pointers[IFBOX] = box is not None and 1 or 0
+    pointers[NMXRS] = nmxrs
+
+    parm = AmberFormat()
+    parm.prm_name = title
+    parm.set_version()
+    parm.addFlag('TITLE', '20a4',
+                 data=[title[i:i+4] for i in range(0, min(len(title), 80), 4)])
+    parm.addFlag('POINTERS', '10I8', data=pointers)
+    parm.addFlag('ATOM_NAME', '20a4', data=data['ATOM_NAME'])
+    parm.addFlag('CHARGE', '5E16.8', data=data['CHARGE'])
+    parm.addFlag('ATOMIC_NUMBER', '10I8', data=data['ATOMIC_NUMBER'])
+    parm.addFlag('MASS', '5E16.8', data=data['MASS'])
+    parm.addFlag('ATOM_TYPE_INDEX', '10I8', data=data['ATOM_TYPE_INDEX'])
+    parm.addFlag('NUMBER_EXCLUDED_ATOMS', '10I8',
+                 data=data['NUMBER_EXCLUDED_ATOMS'])
+    parm.addFlag('NONBONDED_PARM_INDEX', '10I8', data=nb_idx)
+    parm.addFlag('RESIDUE_LABEL', '20a4', data=data['RESIDUE_LABEL'])
+    parm.addFlag('RESIDUE_POINTER', '10I8', data=data['RESIDUE_POINTER'])
+    parm.addFlag('BOND_FORCE_CONSTANT', '5E16.8',
+                 data=['H' in key[0] + key[1] and 340.0 or 310.0
+                       for key in bond_keys])
+    parm.addFlag('BOND_EQUIL_VALUE', '5E16.8',
+                 data=['H' in key[0] + key[1] and 1.09 or 1.526
+                       for key in bond_keys])
+    parm.addFlag('ANGLE_FORCE_CONSTANT', '5E16.8',
+                 data=[50.0 for key in angle_keys])
+    parm.addFlag('ANGLE_EQUIL_VALUE', '5E16.8',
+                 data=[1.9111 for key in angle_keys])
+    parm.addFlag('DIHEDRAL_FORCE_CONSTANT', '5E16.8',
+                 data=[0.1555 for key in dihedral_keys])
+    parm.addFlag('DIHEDRAL_PERIODICITY', '5E16.8',
+                 data=[3.0 for key in dihedral_keys])
+    parm.addFlag('DIHEDRAL_PHASE', '5E16.8',
+                 data=[0.0 for key in dihedral_keys])
+    parm.addFlag('SCEE_SCALE_FACTOR', '5E16.8',
+                 data=[1.2 for key in dihedral_keys])
+    parm.addFlag('SCNB_SCALE_FACTOR', '5E16.8',
+                 data=[2.0 for key in dihedral_keys])
+    parm.addFlag('SOLTY', '5E16.8', num_items=1)
+    parm.addFlag('LENNARD_JONES_ACOEF', '5E16.8', data=acoef)
+    parm.addFlag('LENNARD_JONES_BCOEF', '5E16.8', data=bcoef)
+    for flag in ('BONDS_INC_HYDROGEN', 'BONDS_WITHOUT_HYDROGEN',
+                 'ANGLES_INC_HYDROGEN', 'ANGLES_WITHOUT_HYDROGEN',
+                 'DIHEDRALS_INC_HYDROGEN', 'DIHEDRALS_WITHOUT_HYDROGEN',
+                 'EXCLUDED_ATOMS_LIST'):
+        parm.addFlag(flag, '10I8', data=data[flag])
+    parm.addFlag('HBOND_ACOEF', '5E16.8', num_items=0)
+    parm.addFlag('HBOND_BCOEF', '5E16.8', num_items=0)
+    parm.addFlag('HBCUT', '5E16.8', num_items=0)
+    parm.addFlag('AMBER_ATOM_TYPE', '20a4', data=data['AMBER_ATOM_TYPE'])
+    parm.addFlag('TREE_CHAIN_CLASSIFICATION', '20a4', data=['BLA'] * natom)
+    parm.addFlag('JOIN_ARRAY', '10I8', num_items=natom)
+    parm.addFlag('IROTAT', '10I8', num_items=natom)
+    if box is not None:
+        nmol = len(data['ATOMS_PER_MOLECULE'])
+        parm.addFlag('SOLVENT_POINTERS', '3I8', data=[0, nmol, 1])
+        parm.addFlag('ATOMS_PER_MOLECULE', '10I8',
+                     data=data['ATOMS_PER_MOLECULE'])
+        parm.addFlag('BOX_DIMENSIONS', '5E16.8', data=[90.0] + list(box))
+    parm.addFlag('RADIUS_SET', '1a80',
+                 data=['modified Bondi radii (mbondi)'])
+    parm.addFlag('RADII', '5E16.8', data=data['RADII'])
+    parm.addFlag('SCREEN', '5E16.8', data=data['SCREEN'])
+    parm.addFlag('IPOL', '1I8', data=[0])
+    parm.valid = True
+    return parm
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+WAT = Residue('WAT', [('O', 'OW', -0.834, 'O'), ('H1', 'HW', 0.417, 'H'),
+                      ('H2', 'HW', 0.417, 'H')],
+              [('O', 'H1'), ('O', 'H2'), ('H1', 'H2')])
+
+ALA = Residue('ALA', [('N', 'N', -0.4157, 'N'), ('H', 'H', 0.2719, 'H'),
+                      ('CA', 'CT', 0.0337, 'C'), ('HA', 'H1', 0.0823, 'H'),
+                      ('CB', 'CT', -0.1825, 'C'), ('HB1', 'HC', 0.0603, 'H'),
+                      ('HB2', 'HC', 0.0603, 'H'), ('HB3', 'HC', 0.0603, 'H'),
+                      ('C', 'C', 0.5973, 'C'), ('O', 'O', -0.5679, 'O')],
+              [('N', 'H'), ('N', 'CA'), ('CA', 'HA'), ('CA', 'CB'),
+               ('CB', 'HB1'), ('CB', 'HB2'), ('CB', 'HB3'), ('CA', 'C'),
+               ('C', 'O')])
+
+HEAD = Residue('PC', [('N', 'N3', -0.60, 'N'), ('C11', 'CT', -0.20, 'C'),
+                      ('H11A', 'HP', 0.10, 'H'), ('H11B', 'HP', 0.10, 'H'),
+                      ('H11C', 'HP', 0.10, 'H'), ('C12', 'CT', -0.20, 'C'),
+                      ('H12A', 'HP', 0.10, 'H'), ('H12B', 'HP', 0.10, 'H'),
+                      ('H12C', 'HP', 0.10, 'H'), ('C1', 'CT', -0.05, 'C'),
+                      ('H1A', 'HP', 0.10, 'H'), ('H1B', 'HP', 0.10, 'H'),
+                      ('C2', 'CT', 0.05, 'C'), ('H2A', 'H1', 0.05, 'H'),
+                      ('H2B', 'H1', 0.05, 'H'), ('O3', 'OS', -0.45, 'O'),
+                      ('P', 'P', 1.20, 'P'), ('O1', 'O2', -0.80, 'O'),
+                      ('O2', 'O2', -0.80, 'O'), ('O4', 'OS', -0.45, 'O')],
+               [('N', 'C11'), ('C11', 'H11A'), ('C11', 'H11B'),
+                ('C11', 'H11C'), ('N', 'C12'), ('C12', 'H12A'),
+                ('C12', 'H12B'), ('C12', 'H12C'), ('N', 'C1'), ('C1', 'H1A'),
+                ('C1', 'H1B'), ('C1', 'C2'), ('C2', 'H2A'), ('C2', 'H2B'),
+                ('C2', 'O3'), ('O3', 'P'), ('P', 'O1'), ('P', 'O2'),
+                ('P', 'O4')])
+
+GLYCEROL = Residue('GL', [('C1', 'CT', 0.08, 'C'), ('H1A', 'H1', 0.05, 'H'),
+                          ('H1B', 'H1', 0.05, 'H'), ('C2', 'CT', 0.10, 'C'),
+                          ('H2', 'H1', 0.05, 'H'), ('O2', 'OS', -0.33, 'O'),
+                          ('C3', 'CT', 0.08, 'C'), ('H3A', 'H1', 0.05, 'H'),
+                          ('H3B', 'H1', 0.05, 'H'), ('O3', 'OS', -0.33, 'O')],
+                   [('C1', 'H1A'), ('C1', 'H1B'), ('C1', 'C2'), ('C2', 'H2'),
+                    ('C2', 'O2'), ('C2', 'C3'), ('C3', 'H3A'), ('C3', 'H3B'),
+                    ('C3', 'O3')])
+
+def _tail(name, ncarbon=16):
+    """ A saturated acyl chain of ncarbon carbons (C1 is the carbonyl) """
+    atoms = [('C1', 'C', 0.60, 'C'), ('O1', 'O', -0.55, 'O')]
+    bonds = [('C1', 'O1')]
+    for i in range(2, ncarbon + 1):
+        carbon = 'C%d' % i
+        nh = i == ncarbon and 3 or 2
+        atoms.append((carbon, 'CT', -0.06 * nh, 'C'))
+        bonds.append(('C%d' % (i - 1), carbon))
+        for h in 'XYZ'[:nh]:
+            atoms.append(('H%d%s' % (i, h), 'HC', 0.06, 'H'))
+            bonds.append((carbon, 'H%d%s' % (i, h)))
+    return Residue(name, atoms, bonds)
+
+TAIL1 = _tail('PA')
+TAIL2 = _tail('OL')
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def water_box(natom):
+    """ A periodic box of (at least 1) rigid TIP3P waters with ~natom atoms """
+    nres = max(natom // 3, 1)
+    # Pure water is about 0.0334 molecules per cubic Angstrom
+    side = (nres / 0.0334) ** (1 / 3)
+    return build_topology('water box', [(Molecule([WAT], rigid=True), nres)],
+                          box=(side, side, side))
+
+def peptide(natom, chain_length=100):
+    """
+    Alanine-like peptide chains of chain_length residues (the last one may be
+    shorter) with ~natom atoms in total
+    """
+    nres = max(natom // len(ALA.atoms), 1)
+    molecules = []
+    def chain(n):
+        links = [(i, 'C', i+1, 'N') for i in range(n - 1)]
+        return Molecule([ALA for i in range(n)], links)
+    if nres // chain_length:
+        molecules.append((chain(chain_length), nres // chain_length))
+    if nres % chain_length:
+        molecules.append((chain(nres % chain_length), 1))
+    return build_topology('peptide chains', molecules)
+
+def lipid(natom):
+    """ Lipid-like molecules (head, glycerol, and two tails) with ~natom atoms """
+    mol = Molecule([HEAD, GLYCEROL, TAIL1, TAIL2],
+                   [(0, 'O4', 1, 'C1'), (1, 'O2', 2, 'C1'),
+                    (1, 'O3', 3, 'C1')])
+    nmol = max(natom // len(mol.atoms), 1)
+    return build_topology('lipid-like repeats', [(mol, nmol)])
+
+SYSTEMS = {'water' : water_box, 'peptide' : peptide, 'lipid' : lipid}
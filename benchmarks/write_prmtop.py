@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Times AmberFormat.writeParm for synthetic water-box topologies of various sizes
+(see synthetic.water_box), so the amount of formatting work scales like a real
+solvated system.
+
+Usage: write_prmtop.py [-n NATOM [-n NATOM ...]] [--compare]
+"""
+from __future__ import division
+
+from argparse import ArgumentParser
+import os
+import sys
+import tempfile
+from time import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.path.pardir))
+
+from benchmarks.synthetic import water_box
+from chemistry.amber.amberformat import FortranFormat
+
+def _write_per_field(self, items, dest):
+    """ The original writer: one write call per field and per newline """
+    mod = self.nitems - 1
+    for i, item in enumerate(items):
+        if self.type is str:
+            dest.write((self.fmt % item).ljust(self.itemlen))
+        else:
+            dest.write(self.fmt % item)
+        if i % self.nitems == mod:
+            dest.write('\n')
+    if i % self.nitems != mod:
+        dest.write('\n')
+
+def time_write(parm, fname):
+    """ Returns the time (in seconds) it takes to write parm to fname """
+    start = time()
+    parm.writeParm(fname)
+    return time() - start
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-n', '--natom', dest='natom', type=int,
+                        action='append', default=[], metavar='NATOM',
+                        help='''Number of atoms in the test system. Can be
+                        specified multiple times. Default 100000, 1000000, and
+                        5000000''')
+    parser.add_argument('--compare', dest='compare', action='store_true',
+                        default=False, help='''Also time the original
+                        field-by-field writer for comparison''')
+    opt = parser.parse_args()
+    if not opt.natom:
+        opt.natom = [100000, 1000000, 5000000]
+
+    fd, fname = tempfile.mkstemp(suffix='.parm7')
+    os.close(fd)
+    try:
+        print '%10s %12s %12s' % ('NATOM', 'bulk (s)',
+                                  opt.compare and 'per-field (s)' or '')
+        for natom in opt.natom:
+            parm = water_box(natom)
+            bulk = time_write(parm, fname)
+            size = os.path.getsize(fname)
+            if opt.compare:
+                for flag in parm.flag_list:
+                    fmt = parm.formats[flag]
+                    fmt.write = _write_per_field.__get__(fmt, FortranFormat)
+                slow = time_write(parm, fname)
+                print '%10d %12.3f %12.3f   (%.1f MB)' % (natom, bulk, slow,
+                                                        size / 1024**2)
+            else:
+                print '%10d %12.3f   (%.1f MB)' % (natom, bulk, size / 1024**2)
+            del parm
+    finally:
+        os.unlink(fname)
+
+if __name__ == '__main__':
+    main()
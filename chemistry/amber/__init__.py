@@ -6,8 +6,9 @@ import warnings as _warnings
 __version__ = _chemistry_version
 __author__ = "Jason Swails <jason.swails@gmail.com>"
 
-__all__ = ['leaprc', 'mask', 'mdcrd', 'netcdffiles', 'openmmloader',
-           'openmmreporters', 'readparm', 'residue',
+__all__ = ['compactarrays', 'leaprc', 'ljmatrix', 'mask', 'mdcrd',
+           'netcdffiles', 'openmmloader', 'openmmreporters', 'parmcache',
+           'readparm', 'residue', 'termarrays',
            # NetCDF objects
            'open_netcdf', 'get_int_dimension', 'get_float']
 
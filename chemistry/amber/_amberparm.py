@@ -23,20 +23,43 @@ Boston, MA 02111-1307, USA.
 from __future__ import division
 
 from chemistry import periodic_table
-from chemistry.amber.topologyobjects import (Bond, Angle,
-            Dihedral, ResidueList, AtomList, BondTypeList,
-            AngleTypeList, DihedralTypeList, TrackedList)
+from chemistry.amber.topologyobjects import (ResidueList, AtomList,
+            BondTypeList, AngleTypeList, DihedralTypeList)
 from chemistry.amber.constants import (NATOM, NTYPES, NBONH, MBONA, NTHETH,
             MTHETA, NPHIH, MPHIA, NHPARM, NPARM, NEXT, NRES, NBONA, NTHETA,
             NPHIA, NUMBND, NUMANG, NPTRA, NATYP, NPHB, IFPERT, NBPER, NGPER,
             NDPER, MBPER, MGPER, MDPER, IFBOX, NMXRS, IFCAP, NUMEXTRA, NCOPY,
             NNB)
 from chemistry.amber.amberformat import AmberFormat
+from chemistry.amber import ljmatrix, termarrays
+from chemistry.molecule import find_molecules
 from chemistry.exceptions import (AmberParmWarning, AmberParmError, ReadError,
                                   MoleculeError, MoleculeWarning)
+import gc
+from itertools import chain, compress
 from warnings import warn
 from math import sqrt
 
+def _pausing_gc(fcn):
+    """
+    Decorator that turns the cyclic garbage collector off while fcn runs. None
+    of the hundreds of thousands of objects that make up the structure of a
+    large topology is garbage, but creating them would otherwise set off full
+    collections over and over, which takes most of the time to set it up
+    """
+    def new_fcn(*args, **kwargs):
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return fcn(*args, **kwargs)
+        finally:
+            if enabled: gc.enable()
+    new_fcn.__name__ = fcn.__name__
+    new_fcn.__doc__ = fcn.__doc__
+    return new_fcn
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
 class AmberParm(AmberFormat):
     """
     Amber Topology (parm7 format) class. Gives low, and some high, level access
@@ -45,17 +68,78 @@ class AmberParm(AmberFormat):
 
     solvent_residues = ['WAT', 'HOH']
 
+    # Attributes set by _load_structure. Copies build their own the first time
+    # any of them is used (see __copy__)
+    _structure_attrs = ('atom_list', 'residue_list', 'bond_type_list',
+                        'bonds_inc_h', 'bonds_without_h', 'angle_type_list',
+                        'angles_inc_h', 'angles_without_h',
+                        'dihedral_type_list', 'dihedrals_inc_h',
+                        'dihedrals_without_h')
+
+    # Whether the bonds, angles, and dihedrals are stored as arrays (see
+    # termarrays) until their objects are needed. Set with the array_topology
+    # argument of the constructor or load_from_rawdata
+    array_topology = False
+    # Set while the term objects have not been created from the term arrays
+    # and while the atom partners have not been filled in from them
+    _terms_pending = _partners_pending = False
+    # The atoms and the pairs of partners of each kind (by Atom slot) that
+    # termarrays.load_term_objects kept to fill in the partners from
+    _partner_pairs = None
+    # The PartnerIndex of the atom list (see AtomList.partner_index). Thrown
+    # away whenever the partners of any atom or the atom list change
+    _partner_index = None
+    # The LJMatrix of the Lennard-Jones coefficients and of the 1-4 coefficients
+    # of chamber topologies, by section prefix (see lj_matrix). Thrown away by
+    # lj_changed
+    _lj_matrices = None
+    # The coordinates and velocities of the atoms as (natom, 3) arrays of
+    # float64 (lists of [x, y, z] lists without numpy), or None if they have not
+    # been loaded. Each atom holds a view of its own row (see Atom.xx)
+    _coordinate_array = _velocity_array = None
+    # Counts the changes to the atoms, their names and types, and the residues
+    # (see data_changed). The SelectionCache of the AmberMask selections (see
+    # selection_cache) keeps the selections of the current version only
+    topology_version = 0
+    _selection_cache = None
+
+    # The term lists and type list of each kind of term, which partners of the
+    # atoms the terms define (the keyword of Atom.reset_topology, or None if
+    # they do not affect the exclusions), and the method that writes their
+    # sections. remake_parm only rewrites the kinds whose lists changed
+    _term_kinds = ((('bonds_inc_h', 'bonds_without_h'), 'bond_type_list',
+                    'bonds', '_write_bonds'),
+                   (('angles_inc_h', 'angles_without_h'), 'angle_type_list',
+                    'angles', '_write_angles'),
+                   (('dihedrals_inc_h', 'dihedrals_without_h'),
+                    'dihedral_type_list', 'dihedrals', '_write_dihedrals'))
+
+    # The sections with one entry per atom that delete_mask filters directly
+    # (see _strip_sections). JOIN_ARRAY and IROTAT are simply zeroed, like
+    # remake_parm does. Subclasses with sections that _strip_sections does not
+    # know about set _can_strip_sections to False, so delete_mask deletes the
+    # atoms from the atom list and rebuilds the topology instead
+    _atom_sections = ('ATOM_NAME', 'CHARGE', 'ATOMIC_NUMBER', 'MASS',
+                      'ATOM_TYPE_INDEX', 'AMBER_ATOM_TYPE',
+                      'TREE_CHAIN_CLASSIFICATION', 'RADII', 'SCREEN')
+    _can_strip_sections = True
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-    def __init__(self, prm_name=None, rst7_name=None):
+    def __init__(self, prm_name=None, rst7_name=None, array_topology=False):
         """
         Instantiates an AmberParm object from data in prm_name and establishes
         validity based on presence of POINTERS and CHARGE sections. In general,
         you should use LoadParm from the readparm module instead. LoadParm will
         correctly dispatch the object to the 'correct' flavor of AmberParm
+
+        If array_topology is True, the bonds, angles, and dihedrals are stored
+        as arrays until their objects are first needed (see termarrays). This
+        requires numpy
         """
 
         AmberFormat.__init__(self, prm_name)
+        self._set_array_topology(array_topology)
         if prm_name is not None:
             self.initialize_topology(rst7_name)
 
@@ -78,6 +162,8 @@ class AmberParm(AmberFormat):
         self.LJ_radius = []  # ordered array of L-J radii in Ang -- indices
                              # are elements in LJ_types-1
         self.LJ_depth = []   # similarly ordered array of L-J depths
+        self.lj_changed()
+        self.data_changed()
 
         # If we were given a prmtop, read it in
         if self.valid:
@@ -108,7 +194,7 @@ class AmberParm(AmberFormat):
         if self.valid:
             self._load_structure()
             # Find any extra exclusion rules that may be defined
-            self.atom_list.find_extra_exclusions()
+            self._load_extra_exclusions()
 
         # We now have the following instance arrays: All arrays are dynamic such
         # that removing an item propagates the indices if applicable. bond has
@@ -128,16 +214,6 @@ class AmberParm(AmberFormat):
         # dihedrals_inc_h
         # dihedrals_without_h
 
-        # If we have coordinates or velocities, load them into the atom list
-        if hasattr(self, 'coords'):
-            for i, atom in enumerate(self.atom_list):
-                i3 = i * 3
-                atom.xx, atom.xy, atom.xz = self.coords[i3:i3+3]
-        if hasattr(self, 'vels'):
-            for i, atom in enumerate(self.atom_list):
-                i3 = i * 3
-                atom.vx, atom.vy, atom.vz = self.coords[i3:i3+3]
-
         self.hasvels = self.hasbox = False
         if rst7_name is not None:
             self.LoadRst7(rst7_name)
@@ -145,24 +221,28 @@ class AmberParm(AmberFormat):
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
     @classmethod
-    def load_from_rawdata(cls, rawdata):
+    def load_from_rawdata(cls, rawdata, array_topology=False):
         """
         Take the raw data from a AmberFormat object and initialize an AmberParm
         from that data.
 
         Parameters:
             - rawdata (AmberFormat): Already has a parsed file
+            - array_topology (bool): Store the bonds, angles, and dihedrals as
+              arrays until their objects are first needed (see termarrays)
 
         Returns:
             Populated AmberParm instance
         """
         inst = cls()
+        inst._set_array_topology(array_topology)
         inst.prm_name = rawdata.prm_name
         inst.version = rawdata.version
         inst.formats = rawdata.formats
         inst.parm_data = rawdata.parm_data
         inst.parm_comments = rawdata.parm_comments
         inst.flag_list = rawdata.flag_list
+        inst.compact = rawdata.compact
         inst.valid = True
         inst.initialize_topology()
         # Convert charges if necessary due to differences in electrostatic
@@ -186,25 +266,87 @@ class AmberParm(AmberFormat):
             inst.hasvels = rawdata.hasvels
         return inst
    
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _set_array_topology(self, array_topology):
+        """ Turns on the array topology storage if requested and possible """
+        if array_topology and termarrays.np is None:
+            warn('numpy is not available. Bonds, angles, and dihedrals will be '
+                 'stored as objects', AmberParmWarning)
+            array_topology = False
+        if array_topology:
+            self.array_topology = True
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _load_extra_exclusions(self):
+        """
+        Adds the exclusions in the topology file that no bond, angle, or
+        dihedral defines to the exclusion partners of the atoms. This has to
+        follow every _load_structure, or the next time the exclusions are
+        written from the atoms those exclusions are lost
+        """
+        if self._partners_pending:
+            termarrays.load_extra_exclusions(self)
+        else:
+            self.atom_list.find_extra_exclusions()
+
+    def _build_term_objects(self):
+        """ Creates the objects of every term stored in the term arrays """
+        termarrays.build_term_objects(self)
+
+    def _register_partners(self):
+        """ Fills in the atom partners from the term arrays """
+        termarrays.register_partners(self)
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def __getattr__(self, attr):
+        """
+        Builds the topology structure of a copy the first time one of its
+        structure attributes is needed, even if it is only read
+        """
+        if (attr in self._structure_attrs and
+                self.__dict__.get('_structure_pending', False)):
+            self._structure_pending = False
+            try:
+                self._load_structure()
+                self._load_extra_exclusions()
+            except (KeyError, IndexError, AttributeError):
+                raise AmberParmError('Could not set up topology for parm copy')
+            return getattr(self, attr)
+        raise AttributeError("'%s' object has no attribute '%s'" %
+                             (type(self).__name__, attr))
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
     def __copy__(self):
-        """ Needs to copy a few additional data structures """
+        """
+        Needs to copy a few additional data structures. Only the sections of
+        parm_data are shared with the copy (until they are first accessed). The
+        structure is not: the copy builds all of its own atoms, residues,
+        bonds, angles, dihedrals, and types from its sections the first time
+        any of them is used (see _structure_attrs), so copying is cheap only
+        until then
+        """
         other = super(AmberParm, self).__copy__()
         other.pointers = {}
         other.LJ_types = {}
         other.LJ_radius = self.LJ_radius[:]
         other.LJ_depth = self.LJ_depth[:]
+        other.array_topology = self.array_topology
         # This is as far as we've gotten if the prm is invalid
         if not self.valid: return other
 
         # Now fill the LJ and other data structures
         for p in self.pointers: other.pointers[p] = self.pointers[p]
         for typ in self.LJ_types: other.LJ_types[typ] = self.LJ_types[typ]
-        try:
-            other._load_structure()
-        except (KeyError, IndexError, AttributeError):
-            raise AmberParmError('Could not set up topology for parm copy')
+        other._structure_pending = True
+        # The copy gets its own coordinates and velocities
+        if self._coordinate_array is not None:
+            other._coordinate_array = _vector_array(self.coords)
+        if self._velocity_array is not None:
+            other._velocity_array = _vector_array(self.vels)
         # See if we have a restart file
         if hasattr(self, 'rst7'):
             other.rst7 = Rst7.copy_from(self.rst7)
@@ -261,6 +403,7 @@ class AmberParm(AmberFormat):
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
+    @_pausing_gc
     def _load_structure(self):
         """ 
         Loads all of the topology instance variables. This is necessary if we
@@ -269,86 +412,19 @@ class AmberParm(AmberFormat):
         """
         ##### First create our atoms #####
         self.atom_list = AtomList(self)
+        self._partner_index = None
         ##### Next, load our residues #####
         self.residue_list = ResidueList(self)
-        ##### Next create our list of bonds #####
+        ##### Next create our lists of bonds, angles, and dihedrals #####
         self.bond_type_list = BondTypeList(self)
-        self.bonds_inc_h, self.bonds_without_h = TrackedList(), TrackedList()
-        # Array of bonds with hydrogen
-        for i in range(self.ptr('nbonh')):
-            blist = self.parm_data['BONDS_INC_HYDROGEN']
-            self.bonds_inc_h.append(
-                    Bond(self.atom_list[blist[3*i  ]//3],
-                         self.atom_list[blist[3*i+1]//3],
-                         self.bond_type_list[blist[3*i+2]-1])
-            )
-        # Array of bonds without hydrogen
-        for i in range(self.ptr('mbona')):
-            blist = self.parm_data['BONDS_WITHOUT_HYDROGEN']
-            self.bonds_without_h.append(
-                    Bond(self.atom_list[blist[3*i  ]//3],
-                         self.atom_list[blist[3*i+1]//3],
-                         self.bond_type_list[blist[3*i+2]-1])
-            )
-        # We haven't changed yet...
-        self.bonds_inc_h.changed = self.bonds_without_h.changed = False
-        ##### Next create our list of angles #####
         self.angle_type_list = AngleTypeList(self)
-        self.angles_inc_h, self.angles_without_h = TrackedList(), TrackedList()
-        # Array of angles with hydrogen
-        for i in range(self.ptr('ntheth')):
-            alist = self.parm_data['ANGLES_INC_HYDROGEN']
-            self.angles_inc_h.append(
-                    Angle(self.atom_list[alist[4*i  ]//3],
-                          self.atom_list[alist[4*i+1]//3],
-                          self.atom_list[alist[4*i+2]//3],
-                          self.angle_type_list[alist[4*i+3]-1])
-            )
-        # Array of angles without hydrogen
-        for i in range(self.ptr('mtheta')):
-            alist = self.parm_data['ANGLES_WITHOUT_HYDROGEN']
-            self.angles_without_h.append(
-                    Angle(self.atom_list[alist[4*i  ]//3],
-                          self.atom_list[alist[4*i+1]//3],
-                          self.atom_list[alist[4*i+2]//3],
-                          self.angle_type_list[alist[4*i+3]-1])
-            )
-        # We haven't changed yet
-        self.angles_inc_h.changed = self.angles_without_h.changed = False
-        ##### Next create our list of dihedrals #####
         self.dihedral_type_list = DihedralTypeList(self)
-        self.dihedrals_inc_h = TrackedList()
-        self.dihedrals_without_h = TrackedList()
-        # Array of dihedrals with hydrogen
-        for i in range(self.ptr('nphih')):
-            dlist = self.parm_data['DIHEDRALS_INC_HYDROGEN']
-            signs = [1,1]
-            if dlist[5*i+2] < 0: signs[0] = -1
-            if dlist[5*i+3] < 0: signs[1] = -1
-            self.dihedrals_inc_h.append(
-                    Dihedral(self.atom_list[dlist[5*i  ]//3],
-                             self.atom_list[dlist[5*i+1]//3],
-                             self.atom_list[abs(dlist[5*i+2]//3)],
-                             self.atom_list[abs(dlist[5*i+3]//3)],
-                             self.dihedral_type_list[dlist[5*i+4]-1],
-                             signs)
-            )
-        # Array of dihedrals without hydrogen
-        for i in range(self.ptr('mphia')):
-            dlist = self.parm_data['DIHEDRALS_WITHOUT_HYDROGEN']
-            signs = [1,1]
-            if dlist[5*i+2] < 0: signs[0] = -1
-            if dlist[5*i+3] < 0: signs[1] = -1
-            self.dihedrals_without_h.append(
-                    Dihedral(self.atom_list[dlist[5*i  ]//3],
-                             self.atom_list[dlist[5*i+1]//3],
-                             self.atom_list[abs(dlist[5*i+2]//3)],
-                             self.atom_list[abs(dlist[5*i+3]//3)],
-                             self.dihedral_type_list[dlist[5*i+4]-1],
-                             signs)
-            )
-        # We haven't changed yet
-        self.dihedrals_inc_h.changed = self.dihedrals_without_h.changed = False
+        if self.array_topology:
+            # Keep the bonds, angles, and dihedrals as arrays until needed
+            termarrays.load_term_arrays(self)
+        else:
+            # Decode the sections in bulk and create the objects from those
+            termarrays.load_term_objects(self)
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -385,20 +461,12 @@ class AmberParm(AmberFormat):
             if self.hasbox:
                 self.rst7.box = self.box
 
-        # Now fill in the rst7 coordinates
+        # Now fill in the rst7 coordinates. These are views of our arrays (if
+        # numpy is available), so nothing is copied
         self.rst7.natom = len(self.atom_list)
-        self.rst7.coordinates = [0.0 for i in range(len(self.atom_list) * 3)]
+        self.rst7.coordinates = self.coords
         if self.rst7.hasvels:
-            self.rst7.velocities = [0.0 for i in range(len(self.atom_list) * 3)]
-
-        for i, at in enumerate(self.atom_list):
-            self.rst7.coordinates[3*i  ] = at.xx
-            self.rst7.coordinates[3*i+1] = at.xy
-            self.rst7.coordinates[3*i+2] = at.xz
-            if self.rst7.hasvels:
-                self.rst7.velocities[3*i  ] = at.vx
-                self.rst7.velocities[3*i+1] = at.vy
-                self.rst7.velocities[3*i+2] = at.vz
+            self.rst7.velocities = self.vels
 
         # Now write the restart file
         self.rst7.write(name, netcdf)
@@ -414,11 +482,16 @@ class AmberParm(AmberFormat):
         Writes the current data in parm_data into a new topology file with a
         given name.
         """
-        if hasattr(self, 'atom_list') and self._topology_changed(): 
+        if hasattr(self, 'atom_list') and self._topology_changed():
+            atoms_changed = self.atom_list.changed
             self.remake_parm()
             # Reload the structure now that we've recalculated it to flush all
-            # data structures to what they *should* be.
-            self._load_structure()
+            # data structures to what they *should* be. This is only necessary
+            # if atoms were deleted, since the terms with those atoms remain in
+            # the term lists until then
+            if atoms_changed:
+                self._load_structure()
+                self._load_extra_exclusions()
             # Now we have to redo the ATOMS_PER_MOLECULE/SOLVENT_POINTERS
             # sections
             if self.ptr('ifbox'): self.rediscover_molecules()
@@ -430,27 +503,95 @@ class AmberParm(AmberFormat):
     def remake_parm(self):
         """
         Re-fills the topology file arrays if we have changed the underlying
-        structure
+        structure. Only the sections that depend on what changed are rebuilt:
+        everything if the atom list changed (since the atom indexes may have
+        changed), otherwise only the sections of each kind of term whose term
+        or type lists changed (see _term_kinds), along with the exclusions if
+        those terms determine them
         """
+        if self.atom_list.changed:
+            kinds = list(self._term_kinds)
+        else:
+            kinds = [kind for kind in self._term_kinds
+                     if self._kind_changed(kind)]
+            if self._terms_pending and [kind for kind in kinds if kind[2]]:
+                # Modifying a term array creates the term objects, so only a
+                # type list can have changed here. Just rebuild everything
+                kinds = list(self._term_kinds)
+                self.atom_list.changed = True
+        if not kinds: return
         # First thing we have to do is load any of our old atom parameters into
         # our atom_list to preserve any changes we've made directly to the data
         self.atom_list.refresh_data()
-        # Now delete all of the bond/angle/dihedral partner information and
-        # refresh it to make sure we get the exclusions right
-        for atm in self.atom_list: atm.reset_topology()
-        for bnd in self.bonds_inc_h: bnd.register()
-        for bnd in self.bonds_without_h: bnd.register()
-        for ang in self.angles_inc_h: ang.register()
-        for ang in self.angles_without_h: ang.register()
-        for dih in self.dihedrals_inc_h: dih.register()
-        for dih in self.dihedrals_without_h: dih.register()
-        # Reset all type lists
-        self.bond_type_list.reset()
-        self.angle_type_list.reset()
-        self.dihedral_type_list.reset()
+        if self.atom_list.changed:
+            self._remake_atoms()
+        else:
+            # The atoms keep their indexes, but the terms are written with them
+            self.atom_list._index_us()
+            self._remake_exclusions([kind[2] for kind in kinds if kind[2]])
+        for lists, type_list, partners, writer in kinds:
+            # The term arrays are written along with the atoms
+            if self._terms_pending and lists[0] in termarrays.TERM_LISTS:
+                continue
+            getattr(self, writer)()
+
+        # Load the pointers now
+        self.LoadPointers()
+        self.data_changed()
+        # Mark everything we rebuilt as unchanged
+        self.atom_list.changed = False
+        for kind in kinds:
+            # Writing the sections may remove lists that became empty
+            for tlist in self._kind_lists(kind): tlist.changed = False
+        if self.compact: self.compact_data()
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _kind_lists(self, kind):
+        """ The term lists and type list of a kind of term that are present """
+        lists = []
+        for name in kind[0] + (kind[1],):
+            # Optional terms (e.g., CMAP) may not be present at all
+            if name is not None and hasattr(self, name):
+                lists.append(getattr(self, name))
+        return lists
+
+    def _kind_changed(self, kind):
+        """ Whether any of the term lists or the type list of a kind changed """
+        for tlist in self._kind_lists(kind):
+            if tlist.changed: return True
+        return False
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _remake_atoms(self):
+        """
+        Writes the atom and residue sections along with the exclusions after
+        the atom list changed. If the terms are still stored as arrays, their
+        sections are written as well, since they have to be re-indexed
+        """
+        if self._terms_pending:
+            # The bonds, angles, and dihedrals are still only stored as arrays,
+            # so get the exclusions straight from those
+            new_index = termarrays.atom_index_map(self)
+            exclusions = termarrays.exclusion_lists(self, new_index)
+        else:
+            # Now delete all of the bond/angle/dihedral partner information and
+            # refresh it to make sure we get the exclusions right. Partners
+            # that were never filled in are simply forgotten
+            self._partners_pending = False
+            self._partner_pairs = None
+            for atm in self.atom_list: atm.reset_topology()
+            for bnd in self.bonds_inc_h: bnd.register()
+            for bnd in self.bonds_without_h: bnd.register()
+            for ang in self.angles_inc_h: ang.register()
+            for ang in self.angles_without_h: ang.register()
+            for dih in self.dihedrals_inc_h: dih.register()
+            for dih in self.dihedrals_without_h: dih.register()
+            exclusions = None
         # Fill up the atom arrays. This will also adjust NATOM for us if 
         # we've deleted atoms
-        self.atom_list.write_to_parm()
+        self.atom_list.write_to_parm(exclusions)
 
         # Recount number of extra points
         nextra = 0
@@ -479,24 +620,96 @@ class AmberParm(AmberFormat):
         bigres = max([len(r) for r in self.residue_list])
         self.parm_data['POINTERS'][NMXRS] = bigres
 
+        if self._terms_pending:
+            self._write_term_arrays(new_index)
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _remake_exclusions(self, kinds):
+        """
+        Re-registers the partners defined by the given kinds of terms ('bonds',
+        'angles', and/or 'dihedrals') and rewrites the exclusion sections. The
+        atom list must not have changed, so no other atom data is written
+        """
+        if not kinds: return
+        # The partners that are kept have to be filled in before the others
+        # are reset
+        if self._partners_pending: self._register_partners()
+        reset = dict([(kind, kind in kinds) for kind in
+                      ('bonds', 'angles', 'dihedrals')])
+        for atm in self.atom_list: atm.reset_topology(**reset)
+        for lists, type_list, partners, writer in self._term_kinds:
+            if not partners in kinds: continue
+            for name in lists:
+                for term in getattr(self, name): term.register()
+        self.atom_list.write_exclusions_to_parm()
+        nnb = self.parm_data['EXCLUDED_ATOMS_LIST']
+        self.parm_data['POINTERS'][NNB] = len(nnb)
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _write_term_arrays(self, new_index):
+        """
+        Writes the bond, angle, and dihedral sections and their parameters from
+        the term arrays. new_index maps the old atom indexes to the new ones
+        """
+        self.bond_type_list.reset()
+        self.angle_type_list.reset()
+        self.dihedral_type_list.reset()
+        counts = termarrays.write_term_sections(self, new_index)
+        self._set_term_pointers(counts)
+        self.parm_data['BOND_FORCE_CONSTANT'] = _zeros(counts['NUMBND'])
+        self.parm_data['BOND_EQUIL_VALUE'] = _zeros(counts['NUMBND'])
+        self.bond_type_list.write_to_parm()
+        self.parm_data['ANGLE_FORCE_CONSTANT'] = _zeros(counts['NUMANG'])
+        self.parm_data['ANGLE_EQUIL_VALUE'] = _zeros(counts['NUMANG'])
+        self.angle_type_list.write_to_parm()
+        for key in ('DIHEDRAL_FORCE_CONSTANT', 'DIHEDRAL_PERIODICITY',
+                    'DIHEDRAL_PHASE', 'SCEE_SCALE_FACTOR', 'SCNB_SCALE_FACTOR'):
+            if not key in self.parm_data.keys(): continue
+            self.parm_data[key] = _zeros(counts['NPTRA'])
+        self.dihedral_type_list.write_to_parm()
+
+    def _set_term_pointers(self, counts):
+        """
+        Sets the pointers of the bond, angle, and dihedral sections from the
+        counts returned by termarrays.write_term_sections or
+        termarrays.strip_term_sections
+        """
+        pointers = self.parm_data['POINTERS']
+        pointers[NBONH] = counts['NBONH']
+        pointers[MBONA] = pointers[NBONA] = counts['MBONA']
+        pointers[NUMBND] = counts['NUMBND']
+        pointers[NTHETH] = counts['NTHETH']
+        pointers[MTHETA] = pointers[NTHETA] = counts['MTHETA']
+        pointers[NUMANG] = counts['NUMANG']
+        pointers[NPHIH] = counts['NPHIH']
+        pointers[MPHIA] = pointers[NPHIA] = counts['MPHIA']
+        pointers[NPTRA] = counts['NPTRA']
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _write_bonds(self):
+        """
+        Writes the bond sections and their parameters from the bond objects
+        """
+        self.bond_type_list.reset()
         # Now write all of the bond arrays. We will loop through all of the
         # bonds to make sure that all of their atoms still exist (atm.idx > -1).
         # At the same time, we will start applying indexes to the bond_types so
         # we only print out the bond types that will be used. To do this, we
         # need a couple counters. Different bond types will have an index of -1
-        # until we find out they are needed. Then we assign them an index and
-        # write out that bond info. We also have to make sure that every array
-        # is at least large enough, so give it enough elements to cover every
-        # bond in the list which will be reduced in size if not every bond is
-        # actually added
+        # until we find out they are needed. Then we assign them an index
+        # (shared by all equal bond types) and write out that bond info. We
+        # also have to make sure that every array is at least large enough, so
+        # give it enough elements to cover every bond in the list which will be
+        # reduced in size if not every bond is actually added
         bond_num = 0
-        bond_type_num = 0
         self.parm_data['BONDS_INC_HYDROGEN'] = _zeros(len(self.bonds_inc_h)*3)
         for i, bnd in enumerate(self.bonds_inc_h):
             if -1 in (bnd.atom1.idx, bnd.atom2.idx): continue
             if bnd.bond_type.idx == -1:
-                bnd.bond_type.idx = bond_type_num
-                bond_type_num += 1
+                self.bond_type_list.number(bnd.bond_type)
             bnd.write_info(self, 'BONDS_INC_HYDROGEN', bond_num)
             bond_num += 1
         self.parm_data['POINTERS'][NBONH] = bond_num
@@ -512,12 +725,12 @@ class AmberParm(AmberFormat):
         for i, bnd in enumerate(self.bonds_without_h):
             if -1 in (bnd.atom1.idx, bnd.atom2.idx): continue
             if bnd.bond_type.idx == -1:
-                bnd.bond_type.idx = bond_type_num
-                bond_type_num += 1
+                self.bond_type_list.number(bnd.bond_type)
             bnd.write_info(self, 'BONDS_WITHOUT_HYDROGEN', bond_num)
             bond_num += 1
         # Make sure BOND_FORCE_CONSTANT and BOND_EQUIL_VALUE arrays are big
         # enough
+        bond_type_num = self.bond_type_list.num_indexes
         self.parm_data['BOND_FORCE_CONSTANT'] = _zeros(bond_type_num)
         self.parm_data['BOND_EQUIL_VALUE'] = _zeros(bond_type_num)
         # Now we can write all of the bond types out
@@ -528,17 +741,22 @@ class AmberParm(AmberFormat):
         self.parm_data['POINTERS'][NUMBND] = bond_type_num
         self._truncate_array('BONDS_WITHOUT_HYDROGEN', 3*bond_num)
 
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _write_angles(self):
+        """
+        Writes the angle sections and their parameters from the angle objects
+        """
+        self.angle_type_list.reset()
         # Now do all of the angle arrays
         angle_num = 0
-        angle_type_num = 0
         # Make sure we have enough ANGLES_INC_HYDROGEN
         self.parm_data['ANGLES_INC_HYDROGEN'] = _zeros(len(self.angles_inc_h)*4)
         for i, ang in enumerate(self.angles_inc_h):
             if -1 in (ang.atom1.idx, ang.atom2.idx, ang.atom3.idx):
                 continue
             if ang.angle_type.idx == -1:
-                ang.angle_type.idx = angle_type_num
-                angle_type_num += 1
+                self.angle_type_list.number(ang.angle_type)
             ang.write_info(self, 'ANGLES_INC_HYDROGEN', angle_num)
             angle_num += 1
         self.parm_data['POINTERS'][NTHETH] = angle_num
@@ -551,12 +769,12 @@ class AmberParm(AmberFormat):
             if -1 in (ang.atom1.idx, ang.atom2.idx, ang.atom3.idx):
                 continue
             if ang.angle_type.idx == -1:
-                ang.angle_type.idx = angle_type_num
-                angle_type_num += 1
+                self.angle_type_list.number(ang.angle_type)
             ang.write_info(self, 'ANGLES_WITHOUT_HYDROGEN', angle_num)
             angle_num += 1
         # Make sure BOND_FORCE_CONSTANT and BOND_EQUIL_VALUE arrays are big
         # enough
+        angle_type_num = self.angle_type_list.num_indexes
         self.parm_data['ANGLE_FORCE_CONSTANT'] = _zeros(angle_type_num)
         self.parm_data['ANGLE_EQUIL_VALUE'] = _zeros(angle_type_num)
         # Write angle type info to parm
@@ -566,9 +784,16 @@ class AmberParm(AmberFormat):
         self.parm_data['POINTERS'][NUMANG] = angle_type_num
         self._truncate_array('ANGLES_WITHOUT_HYDROGEN', 4*angle_num)
 
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _write_dihedrals(self):
+        """
+        Writes the dihedral sections and their parameters from the dihedral
+        objects
+        """
+        self.dihedral_type_list.reset()
         # Now do all of the dihedral arrays
         dihedral_num = 0
-        dihedral_type_num = 0
         self.parm_data['DIHEDRALS_INC_HYDROGEN'] = \
                                           _zeros(len(self.dihedrals_inc_h)*5)
         for i, dih in enumerate(self.dihedrals_inc_h):
@@ -576,8 +801,7 @@ class AmberParm(AmberFormat):
                       dih.atom3.idx, dih.atom4.idx):
                 continue
             if dih.dihed_type.idx == -1:
-                dih.dihed_type.idx = dihedral_type_num
-                dihedral_type_num += 1
+                self.dihedral_type_list.number(dih.dihed_type)
             dih.write_info(self, 'DIHEDRALS_INC_HYDROGEN', dihedral_num)
             dihedral_num += 1
         self.parm_data['POINTERS'][NPHIH] = dihedral_num
@@ -591,10 +815,10 @@ class AmberParm(AmberFormat):
                       dih.atom3.idx, dih.atom4.idx):
                 continue
             if dih.dihed_type.idx == -1:
-                dih.dihed_type.idx = dihedral_type_num
-                dihedral_type_num += 1
+                self.dihedral_type_list.number(dih.dihed_type)
             dih.write_info(self, 'DIHEDRALS_WITHOUT_HYDROGEN', dihedral_num)
             dihedral_num += 1
+        dihedral_type_num = self.dihedral_type_list.num_indexes
         self.parm_data['POINTERS'][NPHIA] = dihedral_num
         self.parm_data['POINTERS'][MPHIA] = dihedral_num
         self.parm_data['POINTERS'][NPTRA] = dihedral_type_num
@@ -607,20 +831,6 @@ class AmberParm(AmberFormat):
             self.parm_data[key] = _zeros(dihedral_type_num)
       
         self.dihedral_type_list.write_to_parm()
-      
-        # Load the pointers now
-        self.LoadPointers()
-        # Mark atom list as unchanged
-        self.atom_list.changed = False
-        self.bond_type_list.changed = False
-        self.bonds_inc_h.changed = False
-        self.bonds_without_h.changed = False
-        self.angle_type_list.changed = False
-        self.angles_inc_h.changed = False
-        self.angles_without_h.changed = False
-        self.dihedral_type_list.changed = False
-        self.dihedrals_inc_h.changed = False
-        self.dihedrals_without_h.changed = False
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
    
@@ -629,16 +839,10 @@ class AmberParm(AmberFormat):
         Determines if any of the topological arrays have changed since the
         last upload
         """
-        topology_changed = (self.atom_list.changed or
-                            self.bond_type_list.changed or
-                            self.bonds_inc_h.changed or
-                            self.bonds_without_h.changed or
-                            self.angle_type_list.changed or
-                            self.angles_inc_h.changed or
-                            self.angles_without_h.changed or
-                            self.dihedral_type_list.changed or
-                            self.dihedrals_inc_h.changed or
-                            self.dihedrals_without_h.changed)
+        topology_changed = self.atom_list.changed
+        for kind in self._term_kinds:
+            if topology_changed: break
+            topology_changed = self._kind_changed(kind)
         if topology_changed and hasattr(self, '_topology'):
             del self._topology
         return topology_changed
@@ -658,27 +862,140 @@ class AmberParm(AmberFormat):
         else:
             selection = AmberMask(self, mask).Selection()
 
-        # Delete all of the atoms
-        for i in reversed(range(len(selection))):
-            if not selection[i]: continue
-            self.atom_list[i].deleted = True
-            del self.atom_list[i]
+        if not any(selection): return
+        # Filter the topology file sections directly if we know all of them
+        # (this needs numpy). Otherwise, delete the atoms from the atom list and
+        # rebuild the topology file from what remains
+        if self._can_strip_sections and termarrays.np is not None:
+            self._strip_sections(selection)
+        else:
+            self._delete_atoms(selection)
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _delete_atoms(self, selection):
+        """
+        Deletes the selected atoms from the atom list and rebuilds the topology
+        file and the topology objects from the atoms that remain
+        """
+        self.atom_list.delete_atoms(selection)
 
         # Remake the topology file and re-set the molecules if we have periodic
         # boxes (or delete the Molecule info if we removed all solvent)
         self.remake_parm()
 
-        # Reconstruct the coordinates and velocities from the remaining atoms
-        if hasattr(self, 'coords'):
-            self.coords = []
-            if self.hasvels: self.vels = []
-            for atm in self.atom_list:
-                self.coords.extend([atm.xx, atm.xy, atm.xz])
-                if self.hasvels: self.vels.extend([atm.vx, atm.vy, atm.vz])
+        # Keep the coordinates and velocities of the remaining atoms
+        self._strip_vectors([not sel for sel in selection])
 
         self._load_structure()
+        self._load_extra_exclusions()
         if self.ptr('ifbox'): self.rediscover_molecules()
 
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _strip_vectors(self, keep):
+        """
+        Keeps only the rows of the coordinate and velocity arrays of the atoms
+        for which keep is True. The atoms created afterwards share the new
+        arrays
+        """
+        np = termarrays.np
+        for attr in ('_coordinate_array', '_velocity_array'):
+            array = getattr(self, attr)
+            if array is None: continue
+            if np is None:
+                setattr(self, attr, list(compress(array, keep)))
+            else:
+                setattr(self, attr, array[np.asarray(keep, dtype=bool)])
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _reorder_vectors(self, order):
+        """
+        Puts the rows of the coordinate and velocity arrays in the new order of
+        the atoms (order is the old index of every atom of the atom list) and
+        points each atom at its row of the new arrays
+        """
+        np = termarrays.np
+        for attr, slot in (('_coordinate_array', '_xyz'),
+                           ('_velocity_array', '_vxyz')):
+            array = getattr(self, attr)
+            if array is None: continue
+            if np is None:
+                array = [array[i] for i in order]
+            else:
+                array = array[np.asarray(order, dtype=np.int64)]
+            setattr(self, attr, array)
+            for atom, row in zip(self.atom_list, array):
+                setattr(atom, slot, row)
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _strip_sections(self, selection):
+        """
+        Deletes the selected atoms by filtering every section of the topology
+        file (and the coordinates and velocities) with the old-to-new index of
+        each atom, then sets up the topology objects from the new sections.
+        This gives the same topology file as _delete_atoms, but no atom, term,
+        or type object is involved until the structure is loaded again
+        """
+        np = termarrays.np
+        # Anything changed through the topology objects has to be written to
+        # the sections first. The molecules may have changed as well, then
+        flushed = self._topology_changed()
+        if flushed: self.remake_parm()
+
+        keep = np.logical_not(np.asarray(selection, dtype=bool))
+        new_index = termarrays.strip_index_map(keep)
+        natom = int(keep.sum())
+        molecules = None
+        if self.ptr('ifbox') and not flushed:
+            molecules = termarrays.strip_molecules(self, keep)
+        pd = self.parm_data
+
+        # Per-atom sections
+        for flag in self._atom_sections:
+            if flag in pd: pd[flag] = list(compress(pd[flag], keep))
+        pd['JOIN_ARRAY'] = _zeros(natom)
+        pd['IROTAT'] = _zeros(natom)
+        pd['NUMBER_EXCLUDED_ATOMS'], pd['EXCLUDED_ATOMS_LIST'] = \
+                termarrays.strip_exclusions(self, new_index)
+        pd['POINTERS'][NATOM] = natom
+        pd['POINTERS'][NNB] = len(pd['EXCLUDED_ATOMS_LIST'])
+        pd['POINTERS'][NUMEXTRA] = len([typ for typ in pd['AMBER_ATOM_TYPE']
+                                        if typ[:2] in ('EP', 'LP')])
+
+        # Residues with no atoms left are dropped
+        start = np.asarray(pd['RESIDUE_POINTER'], dtype=np.int64) - 1
+        bounds = np.append(start, len(keep))
+        residue = np.repeat(np.arange(len(start)), np.diff(bounds))
+        sizes = np.bincount(residue[keep], minlength=len(start))
+        remaining = sizes > 0
+        pd['RESIDUE_LABEL'] = list(compress(pd['RESIDUE_LABEL'], remaining))
+        sizes = sizes[remaining]
+        pd['RESIDUE_POINTER'] = (np.cumsum(sizes) - sizes + 1).tolist()
+        pd['POINTERS'][NRES] = len(sizes)
+        pd['POINTERS'][NMXRS] = int(sizes.max()) if len(sizes) else 0
+
+        # Bonds, angles, and dihedrals, along with their types
+        self._set_term_pointers(termarrays.strip_term_sections(self, new_index))
+
+        # Coordinates and velocities
+        self._strip_vectors(keep)
+
+        self.LoadPointers()
+        self.data_changed()
+        if self.compact: self.compact_data()
+        self._load_structure()
+        self._load_extra_exclusions()
+        if not self.ptr('ifbox'): return
+        if molecules is None:
+            self.rediscover_molecules()
+        else:
+            self._set_molecule_sections(molecules.tolist(),
+                                        (np.cumsum(molecules) -
+                                         molecules).tolist())
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
     def rediscover_molecules(self, solute_ions=True, fix_broken=True):
@@ -692,6 +1009,45 @@ class AmberParm(AmberFormat):
         if not self.ptr('ifbox'): return None
 
         owner = set_molecules(self)
+        if not self._set_molecule_sections([len(mol) for mol in owner],
+                                           [mol[0] for mol in owner],
+                                           solute_ions):
+            return None
+
+        # Check that all of our molecules are contiguous, because we have to
+        # re-order atoms if they're not
+        try:
+            for mol in owner:
+                for i in range(1, len(mol)):
+                    if mol[i] != mol[i-1] + 1:
+                        raise StopIteration()
+        except StopIteration:
+            if not fix_broken:
+                raise MoleculeError('Molecule atoms are not contiguous!')
+            # Non-contiguous molecules detected... time to fix (ugh!)
+            warn('Molecule atoms are not contiguous! I am attempting to fix '
+                 'this, but it may take a while.', MoleculeWarning)
+            new_atoms = AtomList(self, fill_from=self.atom_list)
+            i = 0
+            for mol in owner:
+                for atm in mol:
+                    new_atoms[i] = self.atom_list[atm]
+                    i += 1
+            self.atom_list = new_atoms
+            self._reorder_vectors(list(chain.from_iterable(owner)))
+            return owner
+
+        return None
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _set_molecule_sections(self, sizes, firsts, solute_ions=True):
+        """
+        Sets the SOLVENT_POINTERS and ATOMS_PER_MOLECULE sections from the
+        number of atoms in each molecule and the index of its first atom. If
+        there is no solvent, the box information is deleted instead and False
+        is returned
+        """
         ions = ['Br-','Cl-','Cs+','F-','I-','K+','Li+','Mg+','Na+','Rb+','IB',
                 'CIO','MG2']
         indices = []
@@ -720,44 +1076,21 @@ class AmberParm(AmberFormat):
             except AttributeError:
                 # So we don't have box information... doesn't matter :)
                 pass
-            return None
+            return False
         # Now remake our SOLVENT_POINTERS and ATOMS_PER_MOLECULE section
-        self.parm_data['SOLVENT_POINTERS'] = [min(indices), len(owner), 0]
+        self.parm_data['SOLVENT_POINTERS'] = [min(indices), len(sizes), 0]
         first_solvent = self.parm_data['RESIDUE_POINTER'][min(indices)]
         # Find the first solvent molecule
-        for i, mol in enumerate(owner):
-            if first_solvent-1 == mol[0]:
+        for i, first in enumerate(firsts):
+            if first_solvent-1 == first:
                 self.parm_data['SOLVENT_POINTERS'][2] = i + 1
                 break
         else: # this else belongs to 'for', not 'if'
             raise MoleculeError('Could not find first solvent atom!')
 
-        # Now set up ATOMS_PER_MOLECULE and catch any errors
-        self.parm_data['ATOMS_PER_MOLECULE'] = [len(mol) for mol in owner]
-
-        # Check that all of our molecules are contiguous, because we have to
-        # re-order atoms if they're not
-        try:
-            for mol in owner:
-                for i in range(1, len(mol)):
-                    if mol[i] != mol[i-1] + 1:
-                        raise StopIteration()
-        except StopIteration:
-            if not fix_broken:
-                raise MoleculeError('Molecule atoms are not contiguous!')
-            # Non-contiguous molecules detected... time to fix (ugh!)
-            warn('Molecule atoms are not contiguous! I am attempting to fix '
-                 'this, but it may take a while.', MoleculeWarning)
-            new_atoms = AtomList(self, fill_from=self.atom_list)
-            i = 0
-            for mol in owner:
-                for atm in mol:
-                    new_atoms[i] = self.atom_list[atm]
-                    i += 1
-            self.atom_list = new_atoms
-            return owner
-
-        return None
+        # Now set up ATOMS_PER_MOLECULE
+        self.parm_data['ATOMS_PER_MOLECULE'] = sizes
+        return True
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -769,6 +1102,8 @@ class AmberParm(AmberFormat):
    
         # keep track of all the residues we have to print to the OFF file
         residues = []
+        # The keys of those residues (see Residue.key)
+        found = set()
    
         # First create a Molecule object from the prmtop
         mol = self.ToMolecule()
@@ -777,12 +1112,8 @@ class AmberParm(AmberFormat):
         # unique ones to the list of residues to print
         for i in range(len(mol.residues)):
             res = ToResidue(mol, i)
-            present = False
-            for compres in residues:
-                if res == compres:
-                    present = True
-   
-            if not present:
+            if res.key not in found:
+                found.add(res.key)
                 residues.append(res)
       
         # Now that we have all of the residues that we need to add, put their
@@ -797,6 +1128,57 @@ class AmberParm(AmberFormat):
 
         off_file.close()
 
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def lj_matrix(self, one_4=False):
+        """
+        Returns the LJMatrix with the Lennard-Jones coefficients of every pair
+        of atom types (or the 1-4 coefficients of a chamber topology if one_4
+        is True). It is built the first time it is needed and kept until
+        lj_changed is called
+        """
+        prefix = one_4 and 'LENNARD_JONES_14' or 'LENNARD_JONES'
+        if self._lj_matrices is None:
+            self._lj_matrices = dict()
+        if not prefix in self._lj_matrices:
+            self._lj_matrices[prefix] = ljmatrix.LJMatrix(self, prefix)
+        return self._lj_matrices[prefix]
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def lj_changed(self):
+        """
+        Throws away the cached LJMatrix objects. This must be called whenever
+        NONBONDED_PARM_INDEX, the number of atom types, or the Lennard-Jones
+        coefficient sections are changed other than through an LJMatrix
+        """
+        self._lj_matrices = None
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def data_changed(self):
+        """
+        Bumps topology_version, which throws away the cached AmberMask
+        selections. remake_parm, delete_mask, and AtomList.refresh_data do this,
+        and so does setting the name or number of a Residue, but it must also be
+        done whenever the atom names, atom types, or residues are changed in
+        parm_data in any other way
+        """
+        self.topology_version += 1
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    @property
+    def selection_cache(self):
+        """
+        The SelectionCache with the AmberMask selections of this topology. Its
+        hits and misses count the lookups, for profiling
+        """
+        if self._selection_cache is None:
+            from chemistry.amber.mask import SelectionCache
+            self._selection_cache = SelectionCache()
+        return self._selection_cache
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
     def fill_LJ(self):
@@ -805,28 +1187,13 @@ class AmberParm(AmberFormat):
         from LENNARD_JONES_ACOEF and LENNARD_JONES_BCOEF sections of the prmtop
         files, by undoing the canonical combining rules.
         """
-        self.LJ_radius = []  # empty LJ_radii so it can be re-filled
-        self.LJ_depth = []   # empty LJ_depths so it can be re-filled
-        self.LJ_types = {}   # empty LJ_types so it can be re-filled
-        one_sixth = 1 / 6    # we need to raise some numbers to the 1/6th power
-
         pd = self.parm_data
-        acoef = pd['LENNARD_JONES_ACOEF']
-        bcoef = pd['LENNARD_JONES_BCOEF']
         natom = self.pointers['NATOM']
-        ntypes = self.pointers['NTYPES']
-        for i in range(natom): # fill the LJ_types array
-            self.LJ_types[pd["AMBER_ATOM_TYPE"][i]] = pd["ATOM_TYPE_INDEX"][i]
-         
-        for i in range(ntypes):
-            lj_index = pd["NONBONDED_PARM_INDEX"][ntypes*i+i] - 1
-            if pd["LENNARD_JONES_ACOEF"][lj_index] < 1.0e-10:
-                self.LJ_radius.append(0)
-                self.LJ_depth.append(0)
-            else:
-                factor = 2 * acoef[lj_index] / bcoef[lj_index]
-                self.LJ_radius.append(pow(factor, one_sixth) * 0.5)
-                self.LJ_depth.append(bcoef[lj_index] / 2 / factor)
+        # fill the LJ_types array
+        self.LJ_types = dict(zip(pd['AMBER_ATOM_TYPE'][:natom],
+                                 pd['ATOM_TYPE_INDEX'][:natom]))
+        self.LJ_radius, self.LJ_depth = \
+                    self.lj_matrix().type_parameters(1.0e-10)
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -839,24 +1206,8 @@ class AmberParm(AmberFormat):
         if not self.chamber:
             raise TypeError('fill_14_LJ() only valid on a chamber prmtop!')
 
-        pd = self.parm_data
-        acoef = pd['LENNARD_JONES_14_ACOEF']
-        bcoef = pd['LENNARD_JONES_14_BCOEF']
-        ntypes = self.pointers['NTYPES']
-
-        self.LJ_14_radius = []  # empty LJ_radii so it can be re-filled
-        self.LJ_14_depth = []   # empty LJ_depths so it can be re-filled
-        one_sixth = 1.0 / 6.0 # we need to raise some numbers to the 1/6th power
-
-        for i in range(ntypes):
-            lj_index = pd["NONBONDED_PARM_INDEX"][ntypes*i+i] - 1
-            if acoef[lj_index] < 1.0e-6:
-                self.LJ_14_radius.append(0)
-                self.LJ_14_depth.append(0)
-            else:
-                factor = 2 * acoef[lj_index] / bcoef[lj_index]
-                self.LJ_14_radius.append(pow(factor, one_sixth) * 0.5)
-                self.LJ_14_depth.append(bcoef[lj_index] / 2 / factor)
+        self.LJ_14_radius, self.LJ_14_depth = \
+                    self.lj_matrix(one_4=True).type_parameters(1.0e-6)
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -866,15 +1217,7 @@ class AmberParm(AmberFormat):
         the LENNARD_JONES_A/BCOEF topology sections from the canonical combining
         rules.
         """
-        pd = self.parm_data
-        ntypes = self.pointers['NYTPES']
-        for i in range(ntypes):
-            for j in range(i, ntypes):
-                index = pd['NONBONDED_PARM_INDEX'][ntypes*i+j] - 1
-                rij = self.combine_rmin(self.LJ_radius[i], self.LJ_radius[j])
-                wdij = self.combine_epsilon(self.LJ_depth[i], self.LJ_depth[j])
-                pd["LENNARD_JONES_ACOEF"][index] = wdij * rij**12
-                pd["LENNARD_JONES_BCOEF"][index] = 2 * wdij * rij**6
+        self.lj_matrix().set_all(self.LJ_radius, self.LJ_depth)
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -887,19 +1230,7 @@ class AmberParm(AmberFormat):
         if not self.chamber:
             raise TypeError('recalculate_14_LJ() requires a CHAMBER prmtop!')
 
-        pd = self.parm_data
-        ntypes = self.pointers['NYTPES']
-        for i in range(ntypes):
-            for j in range(i, ntypes):
-                index = pd['NONBONDED_PARM_INDEX'][ntypes*i+j] - 1
-                rij = self.combine_rmin(
-                        self.LJ_14_radius[i],self.LJ_14_radius[j]
-                )
-                wdij = self.combine_epsilon(
-                        self.LJ_14_depth[i],self.LJ_14_depth[j]
-                )
-                pd["LENNARD_JONES_14_ACOEF"][index] = wdij * rij**12
-                pd["LENNARD_JONES_14_BCOEF"][index] = 2 * wdij * rij**6
+        self.lj_matrix(one_4=True).set_all(self.LJ_14_radius, self.LJ_14_depth)
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -910,7 +1241,12 @@ class AmberParm(AmberFormat):
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
     def combine_epsilon(self, eps1, eps2):
-        """ Define the combining rule for Epsilon """
+        """
+        Define the combining rule for Epsilon. Like the rule for Rmin, this is
+        also applied to whole numpy arrays at once (see LJMatrix.combine)
+        """
+        if ljmatrix.np is not None:
+            return ljmatrix.np.sqrt(eps1 * eps2)
         return sqrt(eps1 * eps2)
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
@@ -934,25 +1270,47 @@ class AmberParm(AmberFormat):
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
     def load_coordinates(self, coords):
-        """ Loads the coordinates into the atom list """
-        self.coords = coords
-        for i, atom in enumerate(self.atom_list):
-            i3 = 3 * i
-            atom.xx = coords[i3  ]
-            atom.xy = coords[i3+1]
-            atom.xz = coords[i3+2]
+        """
+        Loads the coordinates (x, y, and z of every atom in a flat sequence, or
+        a sequence of (x, y, z) if numpy is available) into a new coordinate
+        array, which the atom list shares
+        """
+        self._coordinate_array = xyz = _vector_array(coords)
+        if not hasattr(self, 'atom_list'): return
+        for atom, row in zip(self.atom_list, xyz): atom._xyz = row
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
     def load_velocities(self, vels):
-        """ Loads the coordinates into the atom list """
+        """ Loads the velocities like load_coordinates loads coordinates """
         self.hasvels = True
-        self.vels = vels
-        for i, atom in enumerate(self.atom_list):
-            i3 = 3 * i
-            atom.vx = vels[i3  ]
-            atom.vy = vels[i3+1]
-            atom.vz = vels[i3+2]
+        self._velocity_array = vxyz = _vector_array(vels)
+        if not hasattr(self, 'atom_list'): return
+        for atom, row in zip(self.atom_list, vxyz): atom._vxyz = row
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    @property
+    def coords(self):
+        """
+        The coordinates as a flat array with x, y, and z of every atom. If numpy
+        is available, this is a view of the coordinate array, so changes to it
+        are seen by the atoms as well. Setting it calls load_coordinates
+        """
+        return _flat_vectors(self._coordinate_array, 'coordinates')
+
+    @coords.setter
+    def coords(self, value):
+        self.load_coordinates(value)
+
+    @property
+    def vels(self):
+        """ The velocities, like coords """
+        return _flat_vectors(self._velocity_array, 'velocities')
+
+    @vels.setter
+    def vels(self, value):
+        self.load_velocities(value)
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -986,36 +1344,28 @@ class AmberParm(AmberFormat):
             self.remake_parm()
             if self.ptr('ifbox'): self.rediscover_molecules()
             self._load_structure()
+            self._load_extra_exclusions()
 
-        all_bonds = []        # bond array in Molecule format
-        residue_pointers = [] # residue pointers adjusted for indexing from 0
         radii = []
 
-        # Set up initial, blank, bond array
-        for i in range(self.pointers['NATOM']):
-            all_bonds.append([])
-      
-        # Fill up bond arrays with bond partners excluding H atoms
-        for i in range(self.pointers['MBONA']):
-            atom1 = self.parm_data['BONDS_WITHOUT_HYDROGEN'][3*i  ]//3
-            atom2 = self.parm_data['BONDS_WITHOUT_HYDROGEN'][3*i+1]//3
-            all_bonds[atom1].append(atom2)
-            all_bonds[atom2].append(atom1)
-
-        # Fill up bond arrays with bond partners including H atoms
-        for i in range(self.pointers['NBONH']):
-            atom1 = self.parm_data['BONDS_INC_HYDROGEN'][3*i  ]//3
-            atom2 = self.parm_data['BONDS_INC_HYDROGEN'][3*i+1]//3
-            all_bonds[atom1].append(atom2)
-            all_bonds[atom2].append(atom1)
-
-        # Sort bond arrays
-        for i in range(len(all_bonds)):
-            all_bonds[i].sort()
+        # The bond array in Molecule format: the sorted bond partners of every
+        # atom. This is done on the whole bond sections at once if we can
+        if termarrays.np is not None:
+            all_bonds = termarrays.bond_lists(self)
+        else:
+            all_bonds = [[] for i in xrange(self.pointers['NATOM'])]
+            for flag, nbond in (('BONDS_WITHOUT_HYDROGEN', 'MBONA'),
+                                ('BONDS_INC_HYDROGEN', 'NBONH')):
+                bonds = self.parm_data[flag]
+                for i in xrange(self.pointers[nbond]):
+                    atom1 = bonds[3*i  ]//3
+                    atom2 = bonds[3*i+1]//3
+                    all_bonds[atom1].append(atom2)
+                    all_bonds[atom2].append(atom1)
+            for partners in all_bonds: partners.sort()
 
         # Adjust RESIDUE_POINTER for indexing from 0
-        for i in range(len(self.parm_data['RESIDUE_POINTER'])):
-            residue_pointers.append(self.parm_data['RESIDUE_POINTER'][i]-1)
+        residue_pointers = [ptr-1 for ptr in self.parm_data['RESIDUE_POINTER']]
 
         # Determine which element each atom is
         elements = [periodic_table.Element[atm.atomic_number]
@@ -1042,7 +1392,7 @@ class AmberParm(AmberFormat):
                                 residues=self.parm_data['RESIDUE_LABEL'][:],
                                 bonds=all_bonds,
                                 residue_pointers=residue_pointers,
-                                coords=self.coords[:],
+                                coords=list(self.coords),
                                 elements=elements,
                                 title=title,
                                 radii=radii
@@ -1200,58 +1550,71 @@ def set_molecules(parm):
     Correctly sets the ATOMS_PER_MOLECULE and SOLVENT_POINTERS sections of the
     topology file.
     """
-    from sys import setrecursionlimit, getrecursionlimit
-    # Since we use a recursive function here, we make sure that the recursion
-    # limit is large enough to handle the maximum possible recursion depth we'll
-    # need (NATOM). We don't want to shrink it, though, since we use list
-    # comprehensions in list constructors in some places that have an implicit
-    # (shallow) recursion, therefore, reducing the recursion limit too much here
-    # could raise a recursion depth exceeded exception during a _Type/Atom/XList
-    # creation. Therefore, set the recursion limit to the greater of the current
-    # limit or the number of atoms
-    setrecursionlimit(max(parm.ptr('natom'), getrecursionlimit()))
-
     # Unmark all atoms so we can track which molecule each goes into
     parm.atom_list.unmark()
 
     if not parm.ptr('ifbox'):
         raise MoleculeError('Only periodic prmtops can have '
                             'Molecule definitions')
-    # The molecule "ownership" list
-    owner = []
-    # The way I do this is via a recursive algorithm, in which
-    # the "set_owner" method is called for each bonded partner an atom
-    # has, which in turn calls set_owner for each of its partners and 
-    # so on until everything has been assigned.
-    molecule_number = 1 # which molecule number we are on
-    for i in range(parm.ptr('natom')):
-        # If this atom has not yet been "owned", make it the next molecule
-        # However, we only increment which molecule number we're on if 
-        # we actually assigned a new molecule (obviously)
-        if not parm.atom_list[i].marked:
-            tmp = [i]
-            _set_owner(parm, tmp, i, molecule_number)
-            # Make sure the atom indexes are sorted
-            tmp.sort()
-            owner.append(tmp)
-            molecule_number += 1
+    owner, marked = find_molecules(*_bond_graph(parm))
+    for atm, molecule_number in zip(parm.atom_list, marked):
+        atm.marked = molecule_number
     return owner
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def _set_owner(parm, owner_array, atm, mol_id):
-    """ Recursively sets ownership of given atom and all bonded partners """
-    parm.atom_list[atm].marked = mol_id
-    for partner in parm.atom_list[atm].bond_partners:
-        if not partner.marked:
-            owner_array.append(partner.starting_index)
-            _set_owner(parm, owner_array, partner.starting_index, mol_id)
-        elif partner.marked != mol_id:
-            raise MoleculeError('Atom %d in multiple molecules' % 
-                                partner.starting_index)
+def _bond_graph(parm):
+    """
+    Returns the bonded partners of every atom in compressed sparse row form, as
+    (offsets, neighbors): the atoms bonded to atom i are
+    neighbors[offsets[i]:offsets[i+1]]
+    """
+    if parm._partners_pending:
+        # Get the bonds from the arrays the partners are filled in from instead
+        # of filling in the partners of every atom
+        return termarrays.bond_graph(parm)
+    index = parm._partner_index
+    if index is not None and index.atom_list is parm.atom_list:
+        return index.offsets[index.BOND], index.neighbors[index.BOND]
+    # Only the bonded partners are needed, so do not build the whole index
+    offsets = [0]
+    neighbors = []
+    for atm in parm.atom_list:
+        neighbors.extend([partner.starting_index
+                          for partner in atm._bond_partners])
+        offsets.append(len(neighbors))
+    return offsets, neighbors
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 def _zeros(length):
     """ Returns an array of zeros of the given length """
     return [0 for i in xrange(length)]
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _vector_array(values):
+    """
+    Returns a new (N, 3) array of float64 from a flat sequence of x, y, and z
+    values or a sequence of (x, y, z) (a list of [x, y, z] lists from a flat
+    sequence if numpy is not available)
+    """
+    np = termarrays.np
+    if np is None:
+        values = list(values)
+        return [values[i:i+3] for i in xrange(0, len(values), 3)]
+    return np.array(values, dtype=np.float64).reshape((-1, 3))
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _flat_vectors(array, what):
+    """
+    Returns an (N, 3) array as a flat view (a flat copy without numpy). Raises
+    AttributeError if the array has not been loaded, so hasattr(parm, 'coords')
+    tells whether coordinates are loaded
+    """
+    if array is None:
+        raise AttributeError('No %s loaded' % what)
+    if termarrays.np is None:
+        return list(chain.from_iterable(array))
+    return array.reshape(-1)
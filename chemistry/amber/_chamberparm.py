@@ -22,8 +22,9 @@ Boston, MA 02111-1307, USA.
 """
 from __future__ import division
 
-from chemistry.amber._amberparm import AmberParm, Rst7, _zeros
+from chemistry.amber._amberparm import AmberParm, Rst7, _zeros, _pausing_gc
 from chemistry.amber.amberformat import AmberFormat
+from chemistry.amber.termarrays import decode_section
 from chemistry.amber.constants import (NATOM, NTYPES, NBONH, MBONA, NTHETH,
                 MTHETA, NPHIH, MPHIA, NNB, NRES, NBONA, NTHETA, NPHIA, NUMBND,
                 NUMANG, NPTRA, NATYP, IFBOX, NMXRS, CHARMM_ELECTROSTATIC)
@@ -41,6 +42,21 @@ class ChamberParm(AmberParm):
 
     CHARGE_SCALE = CHARMM_ELECTROSTATIC
 
+    _structure_attrs = AmberParm._structure_attrs + ('urey_bradley',
+                        'urey_bradley_type_list', 'improper',
+                        'improper_type_list', 'cmap', 'cmap_type_list')
+
+    # The Urey-Bradley, improper, and CMAP terms are rewritten by remake_parm
+    # like the other terms, but do not determine any exclusions
+    _term_kinds = AmberParm._term_kinds + (
+            (('urey_bradley',), 'urey_bradley_type_list', None,
+             '_write_urey_bradleys'),
+            (('improper',), 'improper_type_list', None, '_write_impropers'),
+            (('cmap',), 'cmap_type_list', None, '_write_cmaps'))
+
+    # The CHARMM sections are not handled by AmberParm._strip_sections
+    _can_strip_sections = False
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
     def initialize_topology(self, rst7_name=None):
@@ -115,6 +131,7 @@ class ChamberParm(AmberParm):
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
+    @_pausing_gc
     def _load_structure(self):
         """ 
         Loads all of the topology instance variables. This is necessary if we
@@ -128,32 +145,29 @@ class ChamberParm(AmberParm):
         # potentials, so support topologies that do not have this extra
         # potential as well.
 
-        # Do the Urey-Bradley terms now
-        self.urey_bradley = TrackedList()
-        self.urey_bradley_type_list = UreyBradleyTypeList(self)
-        for i in range(self.ptr('NUB')):
-            a1 = self.parm_data['CHARMM_UREY_BRADLEY'][3*i  ] - 1
-            a2 = self.parm_data['CHARMM_UREY_BRADLEY'][3*i+1] - 1
-            ty = self.parm_data['CHARMM_UREY_BRADLEY'][3*i+2] - 1
-            self.urey_bradley.append(
-                    UreyBradley(self.atom_list[a1], self.atom_list[a2],
-                                self.urey_bradley_type_list[ty])
-            )
+        # Do the Urey-Bradley terms now. Every term section is decoded in bulk
+        # (the atom indexes of these sections count from 1)
+        atoms = self.atom_list
+        ubtl = self.urey_bradley_type_list = UreyBradleyTypeList(self)
+        cols, types, signs = decode_section(
+                self.parm_data['CHARMM_UREY_BRADLEY'], self.ptr('NUB'), 3,
+                amber=False)
+        self.urey_bradley = TrackedList(
+                [UreyBradley(atoms[a1], atoms[a2], ubtl[ty])
+                 for a1, a2, ty in zip(cols[0], cols[1], types)]
+        )
 
         # Now do the improper torsion terms
-        self.improper = TrackedList()
-        self.improper_type_list = ImproperTypeList(self)
-        for i in range(self.ptr('NIMPHI')):
-            a1 = self.parm_data['CHARMM_IMPROPERS'][5*i  ] - 1
-            a2 = self.parm_data['CHARMM_IMPROPERS'][5*i+1] - 1
-            a3 = self.parm_data['CHARMM_IMPROPERS'][5*i+2] - 1
-            a4 = self.parm_data['CHARMM_IMPROPERS'][5*i+3] - 1
-            ty = self.parm_data['CHARMM_IMPROPERS'][5*i+4] - 1
-            self.improper.append(
-                    Improper(self.atom_list[a1], self.atom_list[a2],
-                             self.atom_list[a3], self.atom_list[a4],
-                             self.improper_type_list[ty])
-            )
+        imtl = self.improper_type_list = ImproperTypeList(self)
+        cols, types, signs = decode_section(
+                self.parm_data['CHARMM_IMPROPERS'], self.ptr('NIMPHI'), 5,
+                amber=False)
+        self.improper = TrackedList(
+                [Improper(atoms[a1], atoms[a2], atoms[a3], atoms[a4],
+                          imtl[ty])
+                 for a1, a2, a3, a4, ty in zip(cols[0], cols[1], cols[2],
+                                               cols[3], types)]
+        )
 
         # Mark all new lists unchanged
         self.urey_bradley.changed = False
@@ -163,20 +177,16 @@ class ChamberParm(AmberParm):
 
         # Now if we have CMAP, do those
         if self.has_cmap:
-            self.cmap = TrackedList()
-            self.cmap_type_list = CmapTypeList(self)
-            for i in range(self.ptr('CMAP')):
-                a1 = self.parm_data['CHARMM_CMAP_INDEX'][6*i  ] - 1
-                a2 = self.parm_data['CHARMM_CMAP_INDEX'][6*i+1] - 1
-                a3 = self.parm_data['CHARMM_CMAP_INDEX'][6*i+2] - 1
-                a4 = self.parm_data['CHARMM_CMAP_INDEX'][6*i+3] - 1
-                a5 = self.parm_data['CHARMM_CMAP_INDEX'][6*i+4] - 1
-                ty = self.parm_data['CHARMM_CMAP_INDEX'][6*i+5] - 1
-                self.cmap.append(
-                        Cmap(self.atom_list[a1], self.atom_list[a2],
-                             self.atom_list[a3], self.atom_list[a4],
-                             self.atom_list[a5], self.cmap_type_list[ty])
-                )
+            cmtl = self.cmap_type_list = CmapTypeList(self)
+            cols, types, signs = decode_section(
+                    self.parm_data['CHARMM_CMAP_INDEX'], self.ptr('CMAP'), 6,
+                    amber=False)
+            self.cmap = TrackedList(
+                    [Cmap(atoms[a1], atoms[a2], atoms[a3], atoms[a4],
+                          atoms[a5], cmtl[ty])
+                     for a1, a2, a3, a4, a5, ty in zip(cols[0], cols[1],
+                                        cols[2], cols[3], cols[4], types)]
+            )
             # Mark the cmap lists unchanged
             self.cmap.changed = False
             self.cmap_type_list.changed = False
@@ -187,34 +197,20 @@ class ChamberParm(AmberParm):
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-    def remake_parm(self):
-        """
-        Re-fills the topology file arrays if we have changed the underlying
-        structure
-        """
-        # Reset the chamber-specific type lists
+    def _write_urey_bradleys(self):
+        """ Writes the Urey-Bradley sections and their parameters """
         self.urey_bradley_type_list.reset()
-        self.improper_type_list.reset()
-        if self.has_cmap:
-            self.cmap_type_list.reset()
-
-        # Handle all parts that are common with Amber via AmberParm
-        AmberParm.remake_parm(self)
-
-        # Now rebuild the remaining parts -- Urey-Bradley, Impropers, and CMAP
-
-        # Urey-Bradley
-        ub_num = ub_type_num = 0
+        ub_num = 0
         self.parm_data['CHARMM_UREY_BRADLEY'] = _zeros(len(self.urey_bradley)*3)
         for i, ub in enumerate(self.urey_bradley):
             if -1 in (ub.atom1.idx, ub.atom2.idx):
                 continue
             if ub.ub_type.idx == -1:
-                ub.ub_type.idx = ub_type_num
-                ub_type_num += 1
+                self.urey_bradley_type_list.number(ub.ub_type)
             ub.write_info(self, 'CHARMM_UREY_BRADLEY', ub_num)
             ub_num += 1
         # Truncate our list to only include those Urey-Bradleys that remain
+        ub_type_num = self.urey_bradley_type_list.num_indexes
         self.parm_data['CHARMM_UREY_BRADLEY_COUNT'] = [ub_num, ub_type_num]
         self._truncate_array('CHARMM_UREY_BRADLEY', 3*ub_num)
         # type parameters
@@ -223,39 +219,37 @@ class ChamberParm(AmberParm):
             self.parm_data[key] = _zeros(ub_type_num)
         self.urey_bradley_type_list.write_to_parm()
 
-        # Impropers
-        imp_num = imp_type_num = 0
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+    def _write_impropers(self):
+        """ Writes the improper torsion sections and their parameters """
+        self.improper_type_list.reset()
+        imp_num = 0
         self.parm_data['CHARMM_IMPROPERS'] = _zeros(len(self.improper) * 5)
         for i, imp in enumerate(self.improper):
             if -1 in (imp.atom1.idx, imp.atom2.idx,
                       imp.atom3.idx, imp.atom4.idx):
                 continue
             if imp.improp_type.idx == -1:
-                imp.improp_type.idx = imp_type_num
-                imp_type_num += 1
+                self.improper_type_list.number(imp.improp_type)
             imp.write_info(self, 'CHARMM_IMPROPERS', imp_num)
             imp_num += 1
         # Truncate our list to only include those impropers that remain
         self.parm_data['CHARMM_NUM_IMPROPERS'] = [imp_num]
         self._truncate_array('CHARMM_IMPROPERS', 5*imp_num)
         # type parameters
+        imp_type_num = self.improper_type_list.num_indexes
         self.parm_data['CHARMM_NUM_IMPR_TYPES'] = [imp_type_num]
         for key in ('CHARMM_IMPROPER_FORCE_CONSTANT', 'CHARMM_IMPROPER_PHASE'):
             self.parm_data[key] = _zeros(imp_type_num)
         self.improper_type_list.write_to_parm()
 
-        # These arrays should no longer appear changed
-        self.urey_bradley.changed = False
-        self.urey_bradley_type_list.changed = False
-        self.improper.changed = False
-        self.improper_type_list.changed = False
-
-        # If we have no CMAP, we are done. Otherwise, press on
-        if not self.has_cmap:
-            self.LoadPointers() # update CHARMM pointers
-            return
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-        # If we are here, then we have CMAP terms to do
+    def _write_cmaps(self):
+        """ Writes the CMAP sections and their parameters, if we have any """
+        if not self.has_cmap: return
+        self.cmap_type_list.reset()
         cmap_num = 0
         cmap_types = []
         self.parm_data['CHARMM_CMAP_INDEX'] = _zeros(len(self.cmap)*6)
@@ -276,7 +270,6 @@ class ChamberParm(AmberParm):
             for flag in self.flag_list:
                 if flag.startswith('CHARMM_CMAP_PARAMETER'):
                     self.deleteFlag(flag)
-            self.LoadPointers() # update CHARMM pointers
             del self.cmap, self.cmap_type_list
             return
         # Truncate our list to only include those cmaps that remain
@@ -302,25 +295,6 @@ class ChamberParm(AmberParm):
         for i, ct in enumerate(cmap_types):
             self.addFlag('CHARMM_CMAP_PARAMETER_%02d' % (i+1), fmt,
                          data=ct.grid, comments=ct.comments)
-        self.LoadPointers() # update CHARMM pointers
-        self.cmap.changed = False
-        self.cmap_type_list.changed = False
-
-# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-   
-    def _topology_changed(self):
-        """ 
-        Determines if any of the topological arrays have changed since the
-        last upload
-        """
-        tc = (AmberParm._topology_changed(self) or
-              self.urey_bradley.changed or
-              self.urey_bradley_type_list.changed or
-              self.improper.changed or
-              self.improper_type_list.changed)
-        if self.has_cmap:
-            return tc or self.cmap.changed or self.cmap_type_list.changed
-        return tc
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -336,27 +310,11 @@ class ChamberParm(AmberParm):
         """
         Fills the LJ_radius, LJ_depth arrays and LJ_types dictionary with data
         from LENNARD_JONES_ACOEF and LENNARD_JONES_BCOEF sections of the prmtop
-        files, by undoing the canonical combining rules.
+        files, by undoing the canonical combining rules. The 1-4 arrays are
+        filled as well (see fill_14_LJ)
         """
         AmberParm.fill_LJ(self)
-
-        acoef = self.parm_data['LENNARD_JONES_14_ACOEF']
-        bcoef = self.parm_data['LENNARD_JONES_14_BCOEF']
-        ntypes = self.pointers['NTYPES']
-
-        self.LJ_14_radius = []  # empty LJ_radii so it can be re-filled
-        self.LJ_14_depth = []   # empty LJ_depths so it can be re-filled
-        one_sixth = 1.0 / 6.0 # we need to raise some numbers to the 1/6th power
-
-        for i in range(ntypes):
-            lj_index = self.parm_data["NONBONDED_PARM_INDEX"][ntypes*i+i] - 1
-            if acoef[lj_index] < 1.0e-6:
-                self.LJ_14_radius.append(0)
-                self.LJ_14_depth.append(0)
-            else:
-                factor = 2 * acoef[lj_index] / bcoef[lj_index]
-                self.LJ_14_radius.append(pow(factor, one_sixth) * 0.5)
-                self.LJ_14_depth.append(bcoef[lj_index] / 2 / factor)
+        self.fill_14_LJ()
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -364,21 +322,11 @@ class ChamberParm(AmberParm):
         """
         Takes the values of the LJ_radius and LJ_depth arrays and recalculates
         the LENNARD_JONES_A/BCOEF topology sections from the canonical
-        combining rules.
+        combining rules. The 1-4 sections are recalculated as well (see
+        recalculate_14_LJ)
         """
         AmberParm.recalculate_LJ(self)
-        ntypes = self.pointers['NTYPES']
-        acoef = self.parm_data['LENNARD_JONES_14_ACOEF']
-        bcoef = self.parm_data['LENNARD_JONES_14_BCOEF']
-        for i in range(ntypes):
-            for j in range(i, ntypes):
-                index = self.parm_data['NONBONDED_PARM_INDEX'][ntypes*i+j] - 1
-                rij = self.combine_rmin(self.LJ_14_radius[i],
-                                        self.LJ_14_radius[j])
-                wdij = self.combine_epsilon(self.LJ_14_depth[i],
-                                            self.LJ_14_depth[j])
-                acoef[index] = wdij * rij ** 12
-                bcoef[index] = 2 * wdij * rij**6
+        self.recalculate_14_LJ()
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
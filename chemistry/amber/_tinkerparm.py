@@ -23,9 +23,10 @@ Boston, MA 02111-1307, USA.
 from __future__ import division
 
 from compat24 import property
-from chemistry.amber._amberparm import AmberParm, _zeros
+from chemistry.amber._amberparm import AmberParm, _zeros, _pausing_gc
 from chemistry.amber.amberformat import AmberFormat
 from chemistry.amber.constants import NRES, NNB, NMXRS
+from chemistry.amber.termarrays import decode_section
 from chemistry.amber.tinkertopology import (AtomList, ResidueList, TrackedList,
         Bond, BondTypeList, PiTorsionTypeList, PiTorsion, UreyBradleyTypeList,
         UreyBradley, AngleTypeList, Angle, TrigonalAngle, TrigonalAngleTypeList,
@@ -44,6 +45,47 @@ class AmoebaParm(AmberParm):
 
     solvent_residues = ['WAT', 'HOH']
 
+    _structure_attrs = ('atom_list', 'residue_list', 'bond_type_list',
+                        'bond_list', 'urey_bradley_type_list',
+                        'urey_bradley_list', 'angle_type_list', 'angle_list',
+                        'trigonal_angle_type_list', 'trigonal_angle_list',
+                        'oopbend_type_list', 'oopbend_list',
+                        'dihedral_type_list', 'dihedral_list',
+                        'pitorsion_type_list', 'pitorsion_list',
+                        'stretch_bend_type_list', 'stretch_bend_list',
+                        'torsion_torsion_type_list', 'torsion_torsion_list',
+                        'chiral_frame_list', 'multipole_frame_list',
+                        'adjust_list', 'adjust_weights')
+
+    # The term lists and type list of every kind of term and the method that
+    # writes their sections (see AmberParm._term_kinds). Only the bonds
+    # determine the exclusions
+    _term_kinds = ((('bond_list',), 'bond_type_list', 'bonds', '_write_bonds'),
+                   (('urey_bradley_list',), 'urey_bradley_type_list', None,
+                    '_write_urey_bradleys'),
+                   (('angle_list',), 'angle_type_list', None, '_write_angles'),
+                   (('trigonal_angle_list',), 'trigonal_angle_type_list', None,
+                    '_write_trigonal_angles'),
+                   (('oopbend_list',), 'oopbend_type_list', None,
+                    '_write_oopbends'),
+                   (('dihedral_list',), 'dihedral_type_list', None,
+                    '_write_dihedrals'),
+                   (('pitorsion_list',), 'pitorsion_type_list', None,
+                    '_write_pitorsions'),
+                   (('stretch_bend_list',), 'stretch_bend_type_list', None,
+                    '_write_stretch_bends'),
+                   (('torsion_torsion_list',), 'torsion_torsion_type_list',
+                    None, '_write_torsion_torsions'),
+                   (('chiral_frame_list',), None, None,
+                    '_write_chiral_frames'),
+                   (('multipole_frame_list',), None, None,
+                    '_write_multipole_frames'),
+                   (('adjust_list',), 'adjust_weights', None,
+                    '_write_adjusts'))
+
+    # The AMOEBA sections are not handled by AmberParm._strip_sections
+    _can_strip_sections = False
+
     #=============================================
 
     def initialize_topology(self, rst7_name=None):
@@ -94,6 +136,15 @@ class AmoebaParm(AmberParm):
 
     #=============================================
 
+    def _load_extra_exclusions(self):
+        """
+        The exclusions of Amoeba topologies are always determined from the
+        bonds (see _remake_atoms), so there are no extra ones to load
+        """
+
+    #=============================================
+
+    @_pausing_gc
     def _load_structure(self):
         " Responsible for setting up the parameter and parameter type arrays "
 
@@ -104,183 +155,81 @@ class AmoebaParm(AmberParm):
         self.atom_list.changed = False
         self.residue_list.changed = False
         ##### Next create our list of bonds #####
+        atoms = self.atom_list
         self.bond_type_list = BondTypeList(self)
-        self.bond_list = TrackedList()
-        # Add all of our bonds
-        try:
-            for i in range(self.parm_data['AMOEBA_REGULAR_BOND_NUM_LIST'][0]):
-                id1 = self.parm_data['AMOEBA_REGULAR_BOND_LIST'][3*i  ] - 1
-                id2 = self.parm_data['AMOEBA_REGULAR_BOND_LIST'][3*i+1] - 1
-                typ = self.parm_data['AMOEBA_REGULAR_BOND_LIST'][3*i+2] - 1
-                self.bond_list.append(
-                        Bond(self.atom_list[id1], self.atom_list[id2],
-                             self.bond_type_list[typ])
-                )
-        except KeyError:
-            pass
-        self.bond_list.changed = False
+        self.bond_list = TrackedList(
+                [Bond(atoms[id1], atoms[id2], self.bond_type_list[typ])
+                 for id1, id2, typ in self._term_rows('REGULAR_BOND', 3)]
+        )
         self.bond_type_list.changed = False
         ##### Next create our list of urey-bradleys #####
         self.urey_bradley_type_list = UreyBradleyTypeList(self)
-        self.urey_bradley_list = TrackedList()
-        # Add all of our urey-bradley terms
-        try:
-            nub = self.parm_data['AMOEBA_UREY_BRADLEY_BOND_NUM_LIST'][0]
-            for i in range(nub):
-                id1 = self.parm_data['AMOEBA_UREY_BRADLEY_BOND_LIST'][3*i  ] - 1
-                id2 = self.parm_data['AMOEBA_UREY_BRADLEY_BOND_LIST'][3*i+1] - 1
-                typ = self.parm_data['AMOEBA_UREY_BRADLEY_BOND_LIST'][3*i+2] - 1
-                self.urey_bradley_list.append(
-                        UreyBradley(self.atom_list[id1], self.atom_list[id2],
-                                    self.urey_bradley_type_list[typ])
-                )
-        except KeyError:
-            pass
+        self.urey_bradley_list = TrackedList(
+                [UreyBradley(atoms[id1], atoms[id2],
+                             self.urey_bradley_type_list[typ])
+                 for id1, id2, typ in self._term_rows('UREY_BRADLEY_BOND', 3)]
+        )
         self.urey_bradley_type_list.changed = False
-        self.urey_bradley_list.changed = False
         ##### Next create our list of angles #####
         self.angle_type_list = AngleTypeList(self)
-        self.angle_list = TrackedList()
-        # Add all of our angles
-        try:
-            for i in range(self.parm_data['AMOEBA_REGULAR_ANGLE_NUM_LIST'][0]):
-                id1 = self.parm_data['AMOEBA_REGULAR_ANGLE_LIST'][4*i  ] - 1
-                id2 = self.parm_data['AMOEBA_REGULAR_ANGLE_LIST'][4*i+1] - 1
-                id3 = self.parm_data['AMOEBA_REGULAR_ANGLE_LIST'][4*i+2] - 1
-                typ = self.parm_data['AMOEBA_REGULAR_ANGLE_LIST'][4*i+3] - 1
-                self.angle_list.append(
-                        Angle(self.atom_list[id1], self.atom_list[id2],
-                              self.atom_list[id3], self.angle_type_list[typ])
-                )
-        except KeyError:
-            pass
+        self.angle_list = TrackedList(
+                [Angle(atoms[id1], atoms[id2], atoms[id3],
+                       self.angle_type_list[typ])
+                 for id1, id2, id3, typ in self._term_rows('REGULAR_ANGLE', 4)]
+        )
         self.angle_type_list.changed = False
-        self.angle_list.changed = False
         ##### Next create our list of trigonal angles (in-plane)
         self.trigonal_angle_type_list = TrigonalAngleTypeList(self)
-        self.trigonal_angle_list = TrackedList()
-        # Add all trigonal angles
-        try:
-            for i in range(self.parm_data['AMOEBA_TRIGONAL_ANGLE_NUM_LIST'][0]):
-                id1 = self.parm_data['AMOEBA_TRIGONAL_ANGLE_LIST'][5*i  ] - 1
-                id2 = self.parm_data['AMOEBA_TRIGONAL_ANGLE_LIST'][5*i+1] - 1
-                id3 = self.parm_data['AMOEBA_TRIGONAL_ANGLE_LIST'][5*i+2] - 1
-                id4 = self.parm_data['AMOEBA_TRIGONAL_ANGLE_LIST'][5*i+3] - 1
-                typ = self.parm_data['AMOEBA_TRIGONAL_ANGLE_LIST'][5*i+4] - 1
-                self.trigonal_angle_list.append(
-                        TrigonalAngle(self.atom_list[id1], self.atom_list[id2],
-                                      self.atom_list[id3], self.atom_list[id4],
-                                      self.trigonal_angle_type_list[typ])
-                )
-        except KeyError:
-            pass
+        self.trigonal_angle_list = TrackedList(
+                [TrigonalAngle(atoms[id1], atoms[id2], atoms[id3], atoms[id4],
+                               self.trigonal_angle_type_list[typ])
+                 for id1, id2, id3, id4, typ in
+                        self._term_rows('TRIGONAL_ANGLE', 5)]
+        )
         self.trigonal_angle_type_list.changed = False
-        self.trigonal_angle_list.changed = False
         ##### Next create our list of out-of-plane bending terms #####
         self.oopbend_type_list = OutOfPlaneBendTypeList(self)
-        self.oopbend_list = TrackedList()
-        # Add the out-of-plane bending terms
-        try:
-            for i in range(self.parm_data['AMOEBA_OPBEND_ANGLE_NUM_LIST'][0]):
-                id1 = self.parm_data['AMOEBA_OPBEND_ANGLE_LIST'][5*i  ] - 1
-                id2 = self.parm_data['AMOEBA_OPBEND_ANGLE_LIST'][5*i+1] - 1
-                id3 = self.parm_data['AMOEBA_OPBEND_ANGLE_LIST'][5*i+2] - 1
-                id4 = self.parm_data['AMOEBA_OPBEND_ANGLE_LIST'][5*i+3] - 1
-                typ = self.parm_data['AMOEBA_OPBEND_ANGLE_LIST'][5*i+4] - 1
-                self.oopbend_list.append(
-                        OutOfPlaneBend(self.atom_list[id1], self.atom_list[id2],
-                                       self.atom_list[id3], self.atom_list[id4],
-                                       self.oopbend_type_list[typ])
-                )
-        except KeyError:
-            pass
+        self.oopbend_list = TrackedList(
+                [OutOfPlaneBend(atoms[id1], atoms[id2], atoms[id3], atoms[id4],
+                                self.oopbend_type_list[typ])
+                 for id1, id2, id3, id4, typ in
+                        self._term_rows('OPBEND_ANGLE', 5)]
+        )
         self.oopbend_type_list.changed = False
-        self.oopbend_list.changed = False
         ##### Next create our list of normal dihedrals #####
         self.dihedral_type_list = DihedralTypeList(self)
-        self.dihedral_list = TrackedList()
-        # Add the dihedrals
-        try:
-            for i in range(self.parm_data['AMOEBA_TORSION_NUM_LIST'][0]):
-                id1 = self.parm_data['AMOEBA_TORSION_LIST'][5*i  ] - 1
-                id2 = self.parm_data['AMOEBA_TORSION_LIST'][5*i+1] - 1
-                id3 = self.parm_data['AMOEBA_TORSION_LIST'][5*i+2] - 1
-                id4 = self.parm_data['AMOEBA_TORSION_LIST'][5*i+3] - 1
-                typ = self.parm_data['AMOEBA_TORSION_LIST'][5*i+4] - 1
-                self.dihedral_list.append(
-                        Dihedral(self.atom_list[id1], self.atom_list[id2],
-                                 self.atom_list[id3], self.atom_list[id4],
-                                 self.dihedral_type_list[typ])
-                )
-        except KeyError:
-            pass
+        self.dihedral_list = TrackedList(
+                [Dihedral(atoms[id1], atoms[id2], atoms[id3], atoms[id4],
+                          self.dihedral_type_list[typ])
+                 for id1, id2, id3, id4, typ in self._term_rows('TORSION', 5)]
+        )
         self.dihedral_type_list.changed = False
-        self.dihedral_list.changed = False
         ##### Next create our list of pi-torsions #####
         self.pitorsion_type_list = PiTorsionTypeList(self)
-        self.pitorsion_list = TrackedList()
-        # Add the pi-torsions
-        try:
-            for i in range(self.parm_data['AMOEBA_PI_TORSION_NUM_LIST'][0]):
-                id1 = self.parm_data['AMOEBA_PI_TORSION_LIST'][7*i  ] - 1
-                id2 = self.parm_data['AMOEBA_PI_TORSION_LIST'][7*i+1] - 1
-                id3 = self.parm_data['AMOEBA_PI_TORSION_LIST'][7*i+2] - 1
-                id4 = self.parm_data['AMOEBA_PI_TORSION_LIST'][7*i+3] - 1
-                id5 = self.parm_data['AMOEBA_PI_TORSION_LIST'][7*i+4] - 1
-                id6 = self.parm_data['AMOEBA_PI_TORSION_LIST'][7*i+5] - 1
-                typ = self.parm_data['AMOEBA_PI_TORSION_LIST'][7*i+6] - 1
-                self.pitorsion_list.append(
-                        PiTorsion(self.atom_list[id1], self.atom_list[id2],
-                                  self.atom_list[id3], self.atom_list[id4],
-                                  self.atom_list[id5], self.atom_list[id6],
-                                  self.pitorsion_type_list[typ])
-                )
-        except KeyError:
-            pass
+        self.pitorsion_list = TrackedList(
+                [PiTorsion(atoms[id1], atoms[id2], atoms[id3], atoms[id4],
+                           atoms[id5], atoms[id6], self.pitorsion_type_list[typ])
+                 for id1, id2, id3, id4, id5, id6, typ in
+                        self._term_rows('PI_TORSION', 7)]
+        )
         self.pitorsion_type_list.changed = False
-        self.pitorsion_list.changed = False
         ##### Next create stretch-bend terms #####
         self.stretch_bend_type_list = StretchBendTypeList(self)
-        self.stretch_bend_list = TrackedList()
-        # Add the stretch-bends
-        try:
-            for i in range(self.parm_data['AMOEBA_STRETCH_BEND_NUM_LIST'][0]):
-                id1 = self.parm_data['AMOEBA_STRETCH_BEND_LIST'][4*i  ] - 1
-                id2 = self.parm_data['AMOEBA_STRETCH_BEND_LIST'][4*i+1] - 1
-                id3 = self.parm_data['AMOEBA_STRETCH_BEND_LIST'][4*i+2] - 1
-                typ = self.parm_data['AMOEBA_STRETCH_BEND_LIST'][4*i+3] - 1
-                self.stretch_bend_list.append(
-                        StretchBend(self.atom_list[id1], self.atom_list[id2],
-                                    self.atom_list[id3],
-                                    self.stretch_bend_type_list[typ])
-                )
-        except KeyError:
-            pass
+        self.stretch_bend_list = TrackedList(
+                [StretchBend(atoms[id1], atoms[id2], atoms[id3],
+                             self.stretch_bend_type_list[typ])
+                 for id1, id2, id3, typ in self._term_rows('STRETCH_BEND', 4)]
+        )
         self.stretch_bend_type_list.changed = False
-        self.stretch_bend_list.changed = False
         ##### Next create the torsion-torsion parameters #####
         self.torsion_torsion_type_list = TorsionTorsionTypeList(self)
-        self.torsion_torsion_list = TrackedList()
-        # Add the torsion-torsions
-        try:
-            ntt = self.parm_data['AMOEBA_TORSION_TORSION_NUM_LIST'][0]
-            for i in range(ntt):
-                id1 = self.parm_data['AMOEBA_TORSION_TORSION_LIST'][6*i  ] - 1
-                id2 = self.parm_data['AMOEBA_TORSION_TORSION_LIST'][6*i+1] - 1
-                id3 = self.parm_data['AMOEBA_TORSION_TORSION_LIST'][6*i+2] - 1
-                id4 = self.parm_data['AMOEBA_TORSION_TORSION_LIST'][6*i+3] - 1
-                id5 = self.parm_data['AMOEBA_TORSION_TORSION_LIST'][6*i+4] - 1
-                typ = self.parm_data['AMOEBA_TORSION_TORSION_LIST'][6*i+5] - 1
-                self.torsion_torsion_list.append(
-                        TorsionTorsion(self.atom_list[id1], self.atom_list[id2],
-                                       self.atom_list[id3], self.atom_list[id4],
-                                       self.atom_list[id5],
-                                       self.torsion_torsion_type_list[typ])
-                )
-        except KeyError:
-            pass
+        self.torsion_torsion_list = TrackedList(
+                [TorsionTorsion(atoms[id1], atoms[id2], atoms[id3], atoms[id4],
+                                atoms[id5], self.torsion_torsion_type_list[typ])
+                 for id1, id2, id3, id4, id5, typ in
+                        self._term_rows('TORSION_TORSION', 6)]
+        )
         self.torsion_torsion_type_list.changed = False
-        self.torsion_torsion_list.changed = False
         ##### Next create the chiral frame list #####
         self.chiral_frame_list = TrackedList()
         try:
@@ -328,25 +277,60 @@ class AmoebaParm(AmberParm):
 
     #=============================================
 
+    def _term_rows(self, name, width):
+        """
+        Decodes the AMOEBA_<name>_LIST section in bulk and returns the atom
+        indexes and type index (all counting from 0) of each of its terms, or
+        an empty list if the section is not present
+        """
+        try:
+            nterm = self.parm_data['AMOEBA_%s_NUM_LIST' % name][0]
+            atoms, types, signs = decode_section(
+                    self.parm_data['AMOEBA_%s_LIST' % name], nterm, width,
+                    amber=False)
+        except KeyError:
+            return []
+        return zip(*(atoms + [types]))
+
+    #=============================================
+
     def remake_parm(self):
-        """ Recomputes the topology file parameters """
+        """
+        Recomputes the topology file parameters. Like AmberParm.remake_parm,
+        this only rebuilds the sections that depend on what changed. Since the
+        exclusions are determined from the bonds, the atom data is rewritten if
+        either the atoms or the bonds changed
+        """
+        if self.atom_list.changed:
+            kinds = list(self._term_kinds)
+        else:
+            kinds = [kind for kind in self._term_kinds
+                     if self._kind_changed(kind)]
+        if not kinds: return
         # First thing we have to do is load any of our old atom parameters into
         # our atom_list to preserve any changes we've made directly to the data
         self.atom_list.refresh_data()
+        if self.atom_list.changed or [kind for kind in kinds if kind[2]]:
+            self._remake_atoms()
+        else:
+            self.atom_list._index_us()
+        for kind in kinds:
+            getattr(self, kind[3])()
+        self.data_changed()
+        # Mark all lists we rebuilt as *not* changed
+        self.atom_list.changed = False
+        for kind in kinds:
+            for tlist in self._kind_lists(kind): tlist.changed = False
+        if self.compact: self.compact_data()
+
+    #=============================================
+
+    def _remake_atoms(self):
+        """ Writes the atom and residue sections along with the exclusions """
         # Now delete all of the bond/angle/dihedral partner information and
         # refresh it to make sure we get the exclusions right
         for atm in self.atom_list: atm.reset_topology()
         for bnd in self.bond_list: bnd.register()
-        # Reset all of the type lists
-        self.bond_type_list.reset()
-        self.urey_bradley_type_list.reset()
-        self.angle_type_list.reset()
-        self.trigonal_angle_type_list.reset()
-        self.oopbend_type_list.reset()
-        self.dihedral_type_list.reset()
-        self.pitorsion_type_list.reset()
-        self.stretch_bend_type_list.reset()
-        self.torsion_torsion_type_list.reset()
         # Shortcut here -- for each atom now just determine the angle/dihedral
         # partners directly from the bonded network
         for atm in self.atom_list: atm.determine_exclusions_from_bonds()
@@ -370,7 +354,12 @@ class AmoebaParm(AmberParm):
         self._truncate_array('RESIDUE_POINTER', num_res)
         nmxrs = max([len(r) for r in self.residue_list])
         self.parm_data['POINTERS'][NMXRS] = nmxrs
-    
+
+    #=============================================
+
+    def _write_bonds(self):
+        """ Writes the bond sections and their parameters """
+        self.bond_type_list.reset()
         # Now write all of the bond arrays. We will loop through all of the
         # bonds to make sure that all of their atoms still exist (atm.idx > -1).
         # At the same time, we will start applying indexes to the bond_types so
@@ -410,7 +399,11 @@ class AmoebaParm(AmberParm):
             self.deleteFlag('AMOEBA_REGULAR_BOND_FORCE_CONSTANT')
             self.deleteFlag('AMOEBA_REGULAR_BOND_EQUIL_VALUE')
 
-        # Now time for urey-bradleys
+    #=============================================
+
+    def _write_urey_bradleys(self):
+        """ Writes the Urey-Bradley sections and their parameters """
+        self.urey_bradley_type_list.reset()
         if self.urey_bradley_list:
             ub_num = typenum = 0
             self.parm_data['AMOEBA_UREY_BRADLEY_BOND_LIST'] = \
@@ -438,7 +431,11 @@ class AmoebaParm(AmberParm):
             self.deleteFlag('AMOEBA_UREY_BRADLEY_BOND_FORCE_CONSTANT')
             self.deleteFlag('AMOEBA_UREY_BRADLEY_BOND_EQUIL_VALUE')
 
-        # Now time for angles
+    #=============================================
+
+    def _write_angles(self):
+        """ Writes the angle sections and their parameters """
+        self.angle_type_list.reset()
         if self.angle_list:
             ang_num = typenum = 0
             self.parm_data['AMOEBA_REGULAR_ANGLE_LIST'] = \
@@ -465,7 +462,11 @@ class AmoebaParm(AmberParm):
             self.deleteFlag('AMOEBA_REGULAR_ANGLE_FORCE_CONSTANT')
             self.deleteFlag('AMOEBA_REGULAR_ANGLE_EQUIL_VALUE')
 
-        # Now time for the trigonal angles
+    #=============================================
+
+    def _write_trigonal_angles(self):
+        """ Writes the trigonal angle sections and their parameters """
+        self.trigonal_angle_type_list.reset()
         if self.trigonal_angle_list:
             ang_num = typenum = 0
             self.parm_data['AMOEBA_TRIGONAL_ANGLE_LIST'] = \
@@ -495,7 +496,11 @@ class AmoebaParm(AmberParm):
             self.deleteFlag('AMOEBA_TRIGONAL_ANGLE_FORCE_CONSTANT')
             self.deleteFlag('AMOEBA_TRIGONAL_ANGLE_EQUIL_VALUE')
 
-        # Now time for the out-of-plane bending terms
+    #=============================================
+
+    def _write_oopbends(self):
+        """ Writes the out-of-plane bending sections and their parameters """
+        self.oopbend_type_list.reset()
         if self.oopbend_list:
             oop_num = typenum = 0
             self.parm_data['AMOEBA_OPBEND_ANGLE_LIST'] = \
@@ -524,7 +529,11 @@ class AmoebaParm(AmberParm):
             self.deleteFlag('AMOEBA_OPBEND_ANGLE_FORCE_CONSTANT')
             self.deleteFlag('AMOEBA_OPBEND_ANGLE_EQUIL_VALUE')
 
-        # Now time for torsions
+    #=============================================
+
+    def _write_dihedrals(self):
+        """ Writes the torsion sections and their parameters """
+        self.dihedral_type_list.reset()
         if self.dihedral_list:
             dih_num = typenum = 0
             self.parm_data['AMOEBA_TORSION_LIST'] = \
@@ -554,7 +563,11 @@ class AmoebaParm(AmberParm):
             self.deleteFlag('AMOEBA_TORSION_PERIODICITY')
             self.deleteFlag('AMOEBA_TORSION_PHASE')
 
-        # Now time for pi-torsions
+    #=============================================
+
+    def _write_pitorsions(self):
+        """ Writes the pi-torsion sections and their parameters """
+        self.pitorsion_type_list.reset()
         if self.pitorsion_list:
             tor_num = typenum = 0
             self.parm_data['AMOEBA_PI_TORSION_LIST'] = \
@@ -584,7 +597,11 @@ class AmoebaParm(AmberParm):
             self.deleteFlag('AMOEBA_PI_TORSION_PERIODICITY')
             self.deleteFlag('AMOEBA_PI_TORSION_PHASE')
 
-        # Now time for the stretch-bends
+    #=============================================
+
+    def _write_stretch_bends(self):
+        """ Writes the stretch-bend sections and their parameters """
+        self.stretch_bend_type_list.reset()
         if self.stretch_bend_list:
             strb_num = typenum = 0
             self.parm_data['AMOEBA_STRETCH_BEND_LIST'] = \
@@ -618,7 +635,11 @@ class AmoebaParm(AmberParm):
             self.deleteFlag('AMOEBA_STRETCH_BEND_BOND1_EQUIL_VALUE')
             self.deleteFlag('AMOEBA_STRETCH_BEND_BOND2_EQUIL_VALUE')
 
-        # Now time for the coupled torsions
+    #=============================================
+
+    def _write_torsion_torsions(self):
+        """ Writes the coupled torsion sections and their parameters """
+        self.torsion_torsion_type_list.reset()
         if self.torsion_torsion_list:
             tor_num = 0
             typelist = []
@@ -656,7 +677,10 @@ class AmoebaParm(AmberParm):
                 if flag.startswith('AMOEBA_TORSION_TORSION_TORTOR_TABLE'):
                     self.deleteFlag(flag)
 
-        # Now time for the chiral frames
+    #=============================================
+
+    def _write_chiral_frames(self):
+        """ Writes the chiral frame sections """
         if self.chiral_frame_list:
             chi_num = 0
             self.parm_data['AMOEBA_CHIRAL_FRAME_LIST'] = \
@@ -671,7 +695,10 @@ class AmoebaParm(AmberParm):
             self.deleteFlag('AMOEBA_CHIRAL_FRAME_NUM_LIST')
             self.deleteFlag('AMOEBA_CHIRAL_FRAME_LIST')
 
-        # Now time for the multipole frames
+    #=============================================
+
+    def _write_multipole_frames(self):
+        """ Writes the multipole frame sections """
         if self.multipole_frame_list:
             mul_num = 0
             self.parm_data['AMOEBA_FRAME_DEF_LIST'] = \
@@ -686,7 +713,10 @@ class AmoebaParm(AmberParm):
             self.deleteFlag('AMOEBA_FRAME_DEF_NUM_LIST')
             self.deleteFlag('AMOEBA_FRAME_DEF_LIST')
 
-        # Now time for the adjust array
+    #=============================================
+
+    def _write_adjusts(self):
+        """ Writes the adjust sections """
         if self.adjust_list:
             adj_num = 0
             self.parm_data['AMOEBA_ADJUST_LIST'] = \
@@ -703,55 +733,6 @@ class AmoebaParm(AmberParm):
             self.deleteFlag('AMOEBA_ADJUST_NUM_LIST')
             self.deleteFlag('AMOEBA_ADJUST_LIST')
 
-        # Mark all lists as *not* changed
-        self.bond_type_list.changed = False
-        self.bond_list.changed = False
-        self.urey_bradley_type_list.changed = False
-        self.urey_bradley_list.changed = False
-        self.angle_type_list.changed = False
-        self.angle_list.changed = False
-        self.trigonal_angle_type_list.changed = False
-        self.trigonal_angle_list.changed = False
-        self.oopbend_type_list.changed = False
-        self.oopbend_list.changed = False
-        self.dihedral_type_list.changed = False
-        self.dihedral_list.changed = False
-        self.pitorsion_type_list.changed = False
-        self.pitorsion_list.changed = False
-        self.stretch_bend_type_list.changed = False
-        self.stretch_bend_list.changed = False
-        self.torsion_torsion_type_list.changed = False
-        self.torsion_torsion_list.changed = False
-        self.chiral_frame_list.changed = False
-        self.multipole_frame_list.changed = False
-        self.adjust_weights.changed = False
-        self.adjust_list.changed = False
-
-    #=============================================
-
-    def _topology_changed(self):
-        return (self.bond_type_list.changed or
-                self.bond_list.changed or
-                self.urey_bradley_type_list.changed or
-                self.urey_bradley_list.changed or
-                self.angle_type_list.changed or
-                self.angle_list.changed or
-                self.trigonal_angle_list.changed or
-                self.trigonal_angle_type_list.changed or
-                self.oopbend_type_list.changed or
-                self.oopbend_list.changed or
-                self.dihedral_type_list.changed or
-                self.dihedral_list.changed or
-                self.pitorsion_type_list.changed or
-                self.pitorsion_list.changed or
-                self.stretch_bend_type_list.changed or
-                self.stretch_bend_list.changed or
-                self.torsion_torsion_type_list.changed or
-                self.torsion_torsion_list.changed or
-                self.chiral_frame_list.changed or
-                self.adjust_weights.changed or
-                self.adjust_list.changed)
-
     #=============================================
 
     def mdin_skeleton(self):
@@ -7,12 +7,26 @@ from __future__ import division
 from chemistry.amber.constants import (NATOM, NTYPES, NBONH, NTHETH, NPHIH,
             NEXT, NRES, NBONA, NTHETA, NPHIA, NUMBND, NUMANG, NPTRA, NATYP,
             NPHB, IFBOX, IFCAP, AMBER_ELECTROSTATIC)
-from chemistry.exceptions import AmberFormatWarning, FlagError
+from chemistry.amber.compactarrays import compact_section
+from chemistry.amber.parmcache import get_cache
+from chemistry.exceptions import AmberFormatWarning, FlagError, ReadError
+from chemistry.genopen import compression, genopen
 from copy import copy
 import datetime
 from math import ceil
+import mmap
+import os
 import re
 from warnings import warn
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
 
 if not 'unicode' in dir(__builtins__): unicode = str
 if not 'basestring' in dir(__builtins__): basestring = str
@@ -105,31 +119,44 @@ class FortranFormat(object):
     def write(self, items, dest):
         """ Writes a list/tuple of data (or a single item) """
         if hasattr(items, '__iter__') and not isinstance(items, basestring):
-            mod = self.nitems - 1
-            for i, item in enumerate(items):
-                dest.write(self.fmt % item)
-                if i % self.nitems == mod:
-                    dest.write('\n')
-            if i % self.nitems != mod:
-                dest.write('\n')
+            self._write_lines(self.fmt, items, dest)
         else:
-            dest.write(self.fmt % item)
+            dest.write(self.fmt % items)
             dest.write('\n')
 
     #===================================================
 
     def write_string(self, items, dest):
         """ Writes a list/tuple of strings """
+        # A left-justified %s pads exactly like str.ljust
+        fmt = '%%-%ds' % self.itemlen
         if hasattr(items, '__iter__') and not isinstance(items, basestring):
-            mod = self.nitems - 1
-            for i, item in enumerate(items):
-                dest.write((self.fmt % item).ljust(self.itemlen))
-                if i % self.nitems == mod:
-                    dest.write('\n')
-            if i % self.nitems != mod:
-                dest.write('\n')
+            self._write_lines(fmt, items, dest)
         else:
-            dest.write((self.fmt % item).ljust(self.itemlen))
+            dest.write(fmt % items)
+            dest.write('\n')
+
+    #===================================================
+
+    def _write_lines(self, fmt, items, dest, lines_per_write=10000):
+        """
+        Formats items a whole line at a time (nitems fields per line) and sends
+        them to dest in large blocks of lines rather than one field at a time
+        """
+        if not hasattr(items, '__getitem__'):
+            items = list(items)
+        nitems = self.nitems
+        line_fmt = fmt * nitems
+        nfull = len(items) // nitems * nitems
+        chunk = nitems * lines_per_write
+        for start in range(0, nfull, chunk):
+            end = min(start + chunk, nfull)
+            dest.write('\n'.join([line_fmt % tuple(items[i:i+nitems])
+                                  for i in range(start, end, nitems)]))
+            dest.write('\n')
+        if nfull < len(items):
+            leftover = items[nfull:]
+            dest.write((fmt * len(leftover)) % tuple(leftover))
             dest.write('\n')
 
     #===================================================
@@ -161,6 +188,378 @@ class FortranFormat(object):
             end += self.itemlen
         return ret
 
+    #===================================================
+
+    def read_section(self, lines, nostrip=False):
+        """
+        Reads all of the data lines of a section at once and returns the
+        converted data. This returns exactly what calling read (or read_nostrip
+        if nostrip is True) on each line would, but does the conversion in bulk
+
+        Parameters:
+            lines (list of str) : The data lines of the section
+            nostrip (bool) : If True, only newlines are stripped from each line
+                before splitting it into fields (see read_nostrip)
+
+        Returns:
+            list of the converted data
+        """
+        w = self.itemlen
+        if nostrip:
+            lines = [line.rstrip('\n') for line in lines]
+        else:
+            lines = [line.rstrip() for line in lines]
+        if self.type is str:
+            process = self.process_method
+            return [process(line[i:i+w]) for line in lines
+                                         for i in range(0, len(line), w)]
+        if np is None:
+            return self._read_section_slow(lines)
+        # Pad each line out to a whole number of fields so the entire section
+        # can be viewed as a single array of fixed-width fields
+        data = ''.join([line.ljust(-(-len(line) // w) * w) for line in lines])
+        try:
+            fields = np.frombuffer(data.encode('ascii'), dtype='S%d' % w)
+            if self.type is int:
+                return fields.astype(np.int64).tolist()
+            return fields.astype(np.float64).tolist()
+        except ValueError:
+            # Let the line-by-line reader either handle it or raise the error
+            return self._read_section_slow(lines)
+
+    #===================================================
+
+    def _read_section_slow(self, lines):
+        """ Converts each field of already-stripped lines one at a time """
+        ret = []
+        w, typ, process = self.itemlen, self.type, self.process_method
+        for line in lines:
+            ret.extend([process(typ(line[i:i+w]))
+                        for i in range(0, len(line), w)])
+        return ret
+
+    #===================================================
+
+    def read_buffer(self, buf, spans, nostrip=False):
+        """
+        Reads section data directly out of a buffer (like a memory-mapped file)
+        and returns exactly what read_section would for the same lines. When
+        numpy is available and every line but the last is full width, numeric
+        fields are converted straight from the buffer without building a string
+        for each line
+
+        Parameters:
+            buf (str or mmap) : Buffer holding the data
+            spans (list of tuples) : (start, end) offsets of the data in buf
+            nostrip (bool) : See read_section
+
+        Returns:
+            list of the converted data
+        """
+        if (np is not None and self.type is not str and not nostrip and
+                len(spans) == 1):
+            start, end = spans[0]
+            chars = np.frombuffer(buf, dtype=np.uint8, count=end-start,
+                                  offset=start)
+            width = self.nitems * self.itemlen
+            newlines = np.flatnonzero(chars == ord('\n'))
+            nfull = max(len(newlines) - 1, 0)
+            # Make sure all lines except for the last are exactly full
+            if nfull == 0 or (newlines[nfull-1] == nfull * (width + 1) - 1 and
+                              np.all(np.diff(newlines[:nfull]) == width + 1)):
+                block = chars[:nfull*(width+1)].reshape((nfull, width+1))
+                fields = np.ascontiguousarray(block[:,:width]).view(
+                                    'S%d' % self.itemlen).ravel()
+                last = buf[start+nfull*(width+1):end]
+                try:
+                    if self.type is int:
+                        ret = fields.astype(np.int64).tolist()
+                    else:
+                        ret = fields.astype(np.float64).tolist()
+                except ValueError:
+                    pass
+                else:
+                    ret.extend(self.read_section(last.split('\n')))
+                    return ret
+        text = ''.join([buf[start:end] for start, end in spans])
+        return self.read_section(text.split('\n'), nostrip)
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+class _SharedSection(object):
+    """ Section data shared by several parm_data mappings """
+
+    def __init__(self, data, refs):
+        self.data = data
+        self.refs = refs
+
+class CopyOnWriteParmData(MutableMapping):
+    """
+    A parm_data dictionary that can be copied in constant time. A copy shares
+    the data of every section with the mapping it was copied from, and each
+    mapping only makes a private copy of a section the first time it is
+    accessed through that mapping. Since the data of a section is a list that
+    can be modified in place, any access (not just assignment) gives the
+    accessing mapping its own copy. The last mapping still sharing a section
+    takes it over without copying it
+    """
+
+    #===================================================
+
+    def __init__(self, data=None):
+        """
+        Parameters:
+            data (dict): The sections to start with. They are not copied
+        """
+        self._data = {}
+        self._shared = {}
+        if data is not None:
+            self._data.update(data)
+
+    #===================================================
+
+    def _release(self, flag):
+        """
+        Stops sharing a section and returns its data. The data is copied unless
+        nobody else shares it
+        """
+        box = self._shared.pop(flag)
+        box.refs -= 1
+        if box.refs == 0:
+            data, box.data = box.data, None
+            return data
+        return box.data[:]
+
+    #===================================================
+
+    def is_shared(self, flag):
+        """ Whether the data of flag is still shared with another mapping """
+        return flag in self._shared and self._shared[flag].refs > 1
+
+    #===================================================
+
+    def peek(self, flag):
+        """
+        Returns the data of a section without making a private copy of it. The
+        returned data must not be modified
+        """
+        if flag in self._shared:
+            return self._shared[flag].data
+        return self[flag]
+
+    #===================================================
+
+    def __getitem__(self, flag):
+        try:
+            return self._data[flag]
+        except KeyError:
+            pass
+        data = self._data[flag] = self._release(flag)
+        return data
+
+    #===================================================
+
+    def __setitem__(self, flag, value):
+        if flag in self._shared:
+            self._shared.pop(flag).refs -= 1
+        self._data[flag] = value
+
+    #===================================================
+
+    def __delitem__(self, flag):
+        if flag in self._shared:
+            self._shared.pop(flag).refs -= 1
+        else:
+            del self._data[flag]
+
+    #===================================================
+
+    def __contains__(self, flag):
+        return flag in self._data or flag in self._shared
+
+    #===================================================
+
+    def __iter__(self):
+        for flag in list(self._data.keys()) + list(self._shared.keys()):
+            yield flag
+
+    #===================================================
+
+    def __len__(self):
+        return len(self._data) + len(self._shared)
+
+    #===================================================
+
+    def _share_with(self, other):
+        """ Starts sharing every section of this mapping with other """
+        for flag, data in self._data.items():
+            self._shared[flag] = _SharedSection(data, 1)
+        self._data = {}
+        other._data = {}
+        other._shared = self._shared.copy()
+        for box in self._shared.values():
+            box.refs += 1
+
+    #===================================================
+
+    def copy(self):
+        """ Returns a copy that shares every section with this mapping """
+        other = type(self).__new__(type(self))
+        self._share_with(other)
+        return other
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+class LazyParmData(CopyOnWriteParmData):
+    """
+    A parm_data dictionary whose sections are only parsed from the topology file
+    the first time they are accessed. Until then, only the byte offsets of the
+    section data in the file are stored.
+    """
+
+    #===================================================
+
+    def __init__(self, fname, charge_flag='CHARGE', charge_scale=1.0):
+        """
+        Parameters:
+            fname (str): Name of the file the sections are read from
+            charge_flag (str): The section that holds the atomic charges
+            charge_scale (float): The charges are divided by this when parsed
+        """
+        self.fname = fname
+        self.charge_flag = charge_flag
+        self.charge_scale = charge_scale
+        # If True, sections are converted to compact arrays when parsed
+        self.compact = False
+        CopyOnWriteParmData.__init__(self)
+        self._unread = {}
+        # Make sure the file does not change out from under us
+        stat = os.stat(fname)
+        self._stamp = (stat.st_size, stat.st_mtime)
+
+    #===================================================
+
+    def add_section(self, flag, fmt, spans):
+        """
+        Registers an unread section
+
+        Parameters:
+            flag (str): The name of the %FLAG
+            fmt (FortranFormat): The format the data is stored in
+            spans (list of tuples): (start, end) byte offsets of the data lines
+        """
+        if flag in self._data or flag in self._shared:
+            CopyOnWriteParmData.__delitem__(self, flag)
+        self._unread[flag] = (fmt, spans)
+
+    #===================================================
+
+    def is_unread(self, flag, fmt=None):
+        """
+        Whether flag has never been accessed (and therefore cannot have been
+        modified). If fmt is given, the section must also still have that format
+        """
+        if not flag in self._unread:
+            return False
+        return fmt is None or str(fmt) == str(self._unread[flag][0])
+
+    #===================================================
+
+    def raw_section(self, flag):
+        """ Returns the unparsed text of an unread section's data lines """
+        self._check_file()
+        spans = self._unread[flag][1]
+        f = open(self.fname, 'rb')
+        try:
+            chunks = []
+            for start, end in spans:
+                f.seek(start)
+                chunks.append(f.read(end - start))
+        finally:
+            f.close()
+        text = ''.join(chunks)
+        if not text.endswith('\n'):
+            text += '\n'
+        return text
+
+    #===================================================
+
+    def _check_file(self):
+        try:
+            stat = os.stat(self.fname)
+        except OSError:
+            raise ReadError('%s is no longer available to read unparsed '
+                            'sections from' % self.fname)
+        if (stat.st_size, stat.st_mtime) != self._stamp:
+            raise ReadError('%s changed since it was opened. Cannot read '
+                            'unparsed sections from it' % self.fname)
+
+    #===================================================
+
+    def __getitem__(self, flag):
+        if not flag in self._unread:
+            return CopyOnWriteParmData.__getitem__(self, flag)
+        fmt, spans = self._unread[flag]
+        lines = self.raw_section(flag).split('\n')
+        # RESIDUE_ICODE can have a lot of blank data...
+        data = fmt.read_section(lines, nostrip=flag == 'RESIDUE_ICODE')
+        if flag == self.charge_flag:
+            data = [chg / self.charge_scale for chg in data]
+        if self.compact:
+            data = compact_section(data, fmt)
+        del self._unread[flag]
+        self._data[flag] = data
+        return data
+
+    #===================================================
+
+    def __setitem__(self, flag, value):
+        self._unread.pop(flag, None)
+        CopyOnWriteParmData.__setitem__(self, flag, value)
+
+    #===================================================
+
+    def __delitem__(self, flag):
+        if flag in self._unread:
+            del self._unread[flag]
+        else:
+            CopyOnWriteParmData.__delitem__(self, flag)
+
+    #===================================================
+
+    def __contains__(self, flag):
+        return (CopyOnWriteParmData.__contains__(self, flag) or
+                flag in self._unread)
+
+    #===================================================
+
+    def __iter__(self):
+        for flag in CopyOnWriteParmData.__iter__(self):
+            yield flag
+        for flag in list(self._unread.keys()):
+            yield flag
+
+    #===================================================
+
+    def __len__(self):
+        return CopyOnWriteParmData.__len__(self) + len(self._unread)
+
+    #===================================================
+
+    def copy(self):
+        """
+        Returns a copy that shares every parsed section with this mapping (see
+        CopyOnWriteParmData). Unread sections stay unread in the copy
+        """
+        other = CopyOnWriteParmData.copy(self)
+        other.fname = self.fname
+        other.charge_flag = self.charge_flag
+        other.charge_scale = self.charge_scale
+        other.compact = self.compact
+        other._stamp = self._stamp
+        other._unread = self._unread.copy()
+        return other
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 class AmberFormat(object):
@@ -173,8 +572,13 @@ class AmberFormat(object):
 
     #===================================================
 
-    def __init__(self, fname=None):
-        """ Constructor.  Read a file if given """
+    def __init__(self, fname=None, lazy=False, use_mmap=False, compact=False):
+        """
+        Constructor.  Read a file if given. If lazy is True, sections are only
+        parsed when they are first accessed. If use_mmap is True, the file is
+        parsed from a memory map of it (see rdparm). If compact is True,
+        sections are stored in compact typed arrays (see compact_data)
+        """
         self._ncopies = 0
         self.parm_data = {}
         self.formats = {}
@@ -184,14 +588,19 @@ class AmberFormat(object):
         self.prm_name = fname
         self.charge_flag = 'CHARGE'
         self.valid = False
+        self.compact = compact
 
         if fname is not None:
-            self.rdparm(fname)
+            self.rdparm(fname, lazy, use_mmap)
 
     #===================================================
 
     def __copy__(self):
-        """ Copy all of the data """
+        """
+        Copy all of the data. The sections are not copied right away. Instead,
+        both objects share them until one of the two accesses a section in
+        parm_data (see CopyOnWriteParmData)
+        """
         self._ncopies += 1
         other = type(self)()
         other.flag_list = self.flag_list[:]
@@ -199,11 +608,13 @@ class AmberFormat(object):
         other.prm_name = self.prm_name + '_copy%d' % self._ncopies
         other.charge_flag = self.charge_flag
         other.valid = self.valid
-        other.parm_data = {}
+        other.compact = self.compact
         other.parm_comments = {}
         other.formats = {} # formats{} are copied shallow
+        if not isinstance(self.parm_data, CopyOnWriteParmData):
+            self.parm_data = CopyOnWriteParmData(self.parm_data)
+        other.parm_data = self.parm_data.copy()
         for flag in other.flag_list:
-            other.parm_data[flag] = self.parm_data[flag][:]
             other.parm_comments[flag] = self.parm_comments[flag][:]
             other.formats[flag] = copy(self.formats[flag])
         return other
@@ -235,8 +646,93 @@ class AmberFormat(object):
 
     #===================================================
 
-    def rdparm(self, fname):
-        """ Parses the Amber format file """
+    def rdparm(self, fname, lazy=False, use_mmap=False):
+        """
+        Parses the Amber format file, which may be compressed with gzip, bzip2,
+        or xz
+
+        Parameters:
+            fname (str): Name of the file to parse
+            lazy (bool): If True, only the %FLAG, %FORMAT, and %COMMENT lines
+                are parsed here, and parm_data becomes a LazyParmData that
+                parses each section when it is first accessed. Sections that
+                are never accessed are copied verbatim by writeParm. Ignored
+                for compressed files
+            use_mmap (bool): If True, the file is memory-mapped and sections
+                are parsed directly from the mapped buffer rather than line
+                by line. Ignored for compressed files
+
+        If the topology file cache is enabled (see parmcache.enable_cache), the
+        parsed data is taken from it when the file has not changed since it was
+        cached, and stored in it otherwise. Lazy loading bypasses the cache.
+        """
+
+        # Compressed files can only be streamed through once, so they can be
+        # neither memory-mapped nor indexed for lazy loading
+        if (lazy or use_mmap) and compression(fname) is not None:
+            lazy = use_mmap = False
+
+        # Old-style topology files start with a title rather than a %VERSION
+        # or %FLAG line, and are always read in full
+        old_style = self._is_old_style(fname)
+        if old_style:
+            lazy = use_mmap = False
+
+        if lazy:
+            self._rdparm_indexed(fname, lazy, use_mmap)
+            if self.compact:
+                self.compact_data()
+            return
+
+        cache = get_cache()
+        if cache is not None:
+            cached = cache.get(fname, self.CHARGE_SCALE)
+            if cached is not None:
+                self._load_cached(fname, cached)
+                if self.compact:
+                    self.compact_data()
+                return
+
+        if old_style:
+            self._rdparm_old_file(fname)
+        elif use_mmap:
+            self._rdparm_indexed(fname, lazy, use_mmap)
+        else:
+            self._rdparm_lines(fname)
+
+        if cache is not None:
+            cache.put(fname, self.CHARGE_SCALE, self)
+
+        if self.compact:
+            self.compact_data()
+
+    #===================================================
+
+    def compact_data(self):
+        """
+        Converts every section in parm_data to a compact typed container:
+        array.array for integer and floating point sections and a StringArray
+        for string sections. These behave like lists but take much less memory.
+        Sections of a lazily-loaded file are converted as they are parsed. This
+        also sets the compact attribute, so sections added with addFlag are
+        compact as well
+        """
+        self.compact = True
+        lazy = isinstance(self.parm_data, LazyParmData)
+        if lazy:
+            self.parm_data.compact = True
+        for flag in self.flag_list:
+            if lazy and self.parm_data.is_unread(flag):
+                continue
+            fmt = self.formats[flag]
+            if not isinstance(fmt, FortranFormat):
+                continue # section without a %FORMAT
+            self.parm_data[flag] = compact_section(self.parm_data[flag], fmt)
+
+    #===================================================
+
+    def _rdparm_lines(self, fname):
+        """ Parses the Amber format file line-by-line """
 
         self.prm_name = fname
         current_flag = ''
@@ -248,9 +744,12 @@ class AmberFormat(object):
         self.flag_list = []
         fmtre = re.compile(r'%FORMAT *\((.+)\)')
 
-        # Open up the file and read the data into memory
-        prm = open(self.prm_name, 'r')
+        # Open up the file and read the data into memory. The data lines of
+        # each section are collected and converted all at once when the section
+        # ends
+        prm = genopen(self.prm_name, 'r')
         self.valid = False
+        section_lines = []
 
         for line in prm:
 
@@ -258,6 +757,9 @@ class AmberFormat(object):
                 self.version = line.strip()
 
             elif line[0:5] == '%FLAG':
+                if section_lines:
+                    self._read_section(current_flag, section_lines)
+                    section_lines = []
                 current_flag = line[6:].strip()
                 self.formats[current_flag] = ''
                 self.parm_data[current_flag] = []
@@ -277,7 +779,11 @@ class AmberFormat(object):
                 gathering_data = True
 
             elif gathering_data:
-                self.parm_data[current_flag].extend(fmt.read(line))
+                section_lines.append(line)
+
+        if section_lines:
+            self._read_section(current_flag, section_lines)
+        prm.close()
 
         # convert charges to fraction-electrons
         try:
@@ -287,74 +793,192 @@ class AmberFormat(object):
             pass
         self.valid = True
 
-        # If we don't have a version, then read in an old-file topology
-        if self.version is None:
-            self.rdparm_old(open(self.prm_name, 'r').readlines())
+    #===================================================
 
-        return
+    @staticmethod
+    def _is_old_style(fname):
+        """ Whether fname is an old-style topology file, judged by line 1 """
+        prm = genopen(fname, 'r')
+        try:
+            first = prm.readline()
+        finally:
+            prm.close()
+        return bool(first) and not first.startswith('%')
+
+    #===================================================
+
+    def _rdparm_old_file(self, fname):
+        """ Reads an old-style topology file (see rdparm_old) """
+        self.prm_name = fname
+        self.version = None
+        self.formats = {}
+        self.parm_data = {}
+        self.parm_comments = {}
+        self.flag_list = []
+        prm = genopen(fname, 'r')
+        try:
+            lines = prm.readlines()
+        finally:
+            prm.close()
+        self.valid = True
+        self.rdparm_old(lines)
+
+    #===================================================
+
+    def _load_cached(self, fname, cached):
+        """ Sets up the parsed data retrieved from the topology file cache """
+        self.prm_name = fname
+        self.version = cached['version']
+        self.flag_list = cached['flag_list']
+        self.parm_comments = cached['parm_comments']
+        self.parm_data = cached['parm_data']
+        self.formats = {}
+        for flag in self.flag_list:
+            fmt = FortranFormat(cached['formats'][flag])
+            # RESIDUE_ICODE can have a lot of blank data...
+            if flag == 'RESIDUE_ICODE':
+                fmt.read = fmt.read_nostrip
+            self.formats[flag] = fmt
+        self.valid = True
+
+    #===================================================
+
+    def _rdparm_indexed(self, fname, lazy=False, use_mmap=False):
+        """
+        Locates all of the section data in an Amber format file from its %FLAG,
+        %FORMAT, and %COMMENT lines. The data are then either parsed from the
+        whole file buffer or (if lazy) left to be parsed on first access
+        """
+        self.prm_name = fname
+        current_flag = ''
+        gathering_data = False
+        self.version = None
+        self.formats = {}
+        self.parm_comments = {}
+        self.flag_list = []
+        self.valid = False
+        if lazy:
+            self.parm_data = LazyParmData(fname, self.charge_flag,
+                                          self.CHARGE_SCALE)
+        else:
+            self.parm_data = {}
+        sections = []
+        fmtre = re.compile(r'%FORMAT *\((.+)\)')
+        markre = re.compile(r'^%(?:VERSION|FLAG|COMMENT|FORMAT).*$', re.M)
+
+        prm = open(fname, 'rb')
+        try:
+            if use_mmap and os.fstat(prm.fileno()).st_size > 0:
+                text = mmap.mmap(prm.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                text = prm.read()
+        finally:
+            prm.close()
+
+        # Everything between the marker lines is section data
+        spans = []
+        start = 0
+        for mark in markre.finditer(text):
+            if gathering_data and mark.start() > start:
+                spans.append((start, mark.start()))
+            start = mark.end() + 1
+            line = mark.group()
+            if line[0:8] == '%VERSION':
+                self.version = line.strip()
+            elif line[0:5] == '%FLAG':
+                if spans:
+                    sections.append((current_flag, spans))
+                    spans = []
+                current_flag = line[6:].strip()
+                self.formats[current_flag] = ''
+                self.parm_data[current_flag] = []
+                self.parm_comments[current_flag] = []
+                self.flag_list.append(current_flag)
+                gathering_data = False
+            elif line[0:8] == '%COMMENT':
+                self.parm_comments[current_flag].append(line[9:].strip())
+            else:
+                fmt = FortranFormat(fmtre.match(line).groups()[0])
+                if current_flag == 'RESIDUE_ICODE':
+                    fmt.read = fmt.read_nostrip
+                self.formats[current_flag] = fmt
+                gathering_data = True
+        if gathering_data and len(text) > start:
+            spans.append((start, len(text)))
+        if spans:
+            sections.append((current_flag, spans))
+
+        if lazy:
+            for flag, spans in sections:
+                self.parm_data.add_section(flag, self.formats[flag], spans)
+        else:
+            for flag, spans in sections:
+                # RESIDUE_ICODE can have a lot of blank data...
+                self.parm_data[flag].extend(self.formats[flag].read_buffer(
+                            text, spans, nostrip=flag == 'RESIDUE_ICODE'))
+            # convert charges to fraction-electrons
+            if self.charge_flag in self.parm_data:
+                self.parm_data[self.charge_flag] = [chg / self.CHARGE_SCALE
+                            for chg in self.parm_data[self.charge_flag]]
+        if isinstance(text, mmap.mmap):
+            text.close()
+        del text
+        self.valid = True
+
+    #===================================================
+
+    def _read_section(self, flag, lines):
+        """ Converts the data lines of a section and adds them to parm_data """
+        # RESIDUE_ICODE can have a lot of blank data...
+        self.parm_data[flag].extend(self.formats[flag].read_section(lines,
+                                    nostrip=flag == 'RESIDUE_ICODE'))
 
     #===================================================
 
     def rdparm_old(self, prmtop_lines):
         """
         This reads an old-style topology file and stores the results in the
-        same data structures as a new-style topology file
+        same data structures as a new-style topology file. Each block of
+        12I6, 20a4, or 5E16.8 data is converted all at once with
+        FortranFormat.read_section
         """
-        def read_integer(line_idx, lines, num_items):
+        def read_block(fmt, line_idx, lines, num_items):
             # line_idx should be the line _before_ the first line you
-            # want data from.
-            i, tmp_data = 0, []
-            while i < num_items:
-                idx = i % 12
-                if idx == 0:
-                    line_idx += 1
-                try:
-                    tmp_data.append(int(lines[line_idx][idx*6:idx*6+6]))
-                except ValueError:
-                    raise ValueError(
-                            'Error parsing line %d, token %d [%s]: Problem '
-                            'during integer read.' % (line_idx, idx,
-                            lines[line_idx][idx*6:idx*6+6])
-                    )
-                i += 1
+            # want data from. Every line but the last holds fmt.nitems items
+            num_items = int(num_items)
             # If we had no items, we need to jump a line:
-            if num_items == 0: line_idx += 1
-            return tmp_data, line_idx
+            if num_items == 0: return [], line_idx + 1
+            nlines = int(ceil(num_items / fmt.nitems))
+            block = lines[line_idx+1:line_idx+1+nlines]
+            try:
+                tmp_data = fmt.read_section(block)[:num_items]
+            except ValueError:
+                raise ValueError('Error parsing lines %d to %d: Problem during '
+                                 '%s read.' % (line_idx + 1, line_idx + nlines,
+                                 fmt.type is int and 'integer' or
+                                 'floating point'))
+            if len(tmp_data) < num_items:
+                if fmt.type is not str or len(block) < nlines:
+                    raise ValueError('Error parsing lines %d to %d: Expected '
+                                     '%d items but found %d' % (line_idx + 1,
+                                     line_idx + nlines, num_items,
+                                     len(tmp_data)))
+                # Trailing blank strings were stripped off of the last line
+                tmp_data.extend(['' for i in range(num_items-len(tmp_data))])
+            return tmp_data, line_idx + nlines
+
+        int_fmt = FortranFormat('12I6')
+        str_fmt = FortranFormat('20a4')
+        float_fmt = FortranFormat('5E16.8')
+
+        def read_integer(line_idx, lines, num_items):
+            return read_block(int_fmt, line_idx, lines, num_items)
 
         def read_string(line_idx, lines, num_items):
-            # line_idx should be the line _before_ the first line you
-            # want data from.
-            i, tmp_data = 0, []
-            while i < num_items:
-                idx = i % 20
-                if idx == 0:
-                    line_idx += 1
-                tmp_data.append(lines[line_idx][idx*4:idx*4+4])
-                i += 1
-            # If we had no items, we need to jump a line:
-            if num_items == 0: line_idx += 1
-            return tmp_data, line_idx
+            return read_block(str_fmt, line_idx, lines, num_items)
 
         def read_float(line_idx, lines, num_items):
-            # line_idx should be the line _before_ the first line you
-            # want data from.
-            i, tmp_data = 0, []
-            while i < num_items:
-                idx = i % 5
-                if idx == 0:
-                    line_idx += 1
-                try:
-                    tmp_data.append(float(lines[line_idx][idx*16:idx*16+16]))
-                except ValueError:
-                    raise ValueError(
-                            'Error parsing line %d, token %d [%s]: Problem '
-                            'during floating point  read.' % (line_idx, idx,
-                            lines[line_idx][idx*16:idx*16+16])
-                    )
-                i += 1
-            # If we had no items, we need to jump a line:
-            if num_items == 0: line_idx += 1
-            return tmp_data, line_idx
+            return read_block(float_fmt, line_idx, lines, num_items)
 
         # First add a title
         self.addFlag('TITLE', '20a4', data=['| Converted old-style topology'])
@@ -548,22 +1172,28 @@ class AmberFormat(object):
     def writeParm(self, name):
         """
         Writes the current data in parm_data into a new topology file with
-        the given name
+        the given name. Names ending in .gz, .bz2, or .xz are compressed
         """
         # now that we know we will write the new prmtop file, open the new file
-        new_prm = open(name, 'w')
+        new_prm = genopen(name, 'w')
 
         # get current time to put into new prmtop file if we had a %VERSION
         self.set_version()
 
-        # convert charges back to amber charges...
-        if self.charge_flag in self.parm_data.keys():
-            for i in range(len(self.parm_data[self.charge_flag])):
-                self.parm_data[self.charge_flag][i] *= self.CHARGE_SCALE
+        # Sections that were never parsed are copied directly from the file
+        unread = set([flag for flag in self.flag_list
+                      if isinstance(self.parm_data, LazyParmData) and
+                      self.parm_data.is_unread(flag, self.formats[flag])])
 
         # write version to top of prmtop file
         new_prm.write('%s\n' % self.version)
 
+        # Reading shared sections through peek avoids copying them
+        if isinstance(self.parm_data, CopyOnWriteParmData):
+            section = self.parm_data.peek
+        else:
+            section = self.parm_data.__getitem__
+
         # write data to prmtop file, inserting blank line if it's an empty field
         for i in range(len(self.flag_list)):
             flag = self.flag_list[i]
@@ -572,18 +1202,20 @@ class AmberFormat(object):
             for comment in self.parm_comments[flag]:
                 new_prm.write('%%COMMENT %s\n' % comment)
             new_prm.write('%%FORMAT(%s)\n' % self.formats[flag])
-            if len(self.parm_data[flag]) == 0: # empty field...
+            if flag in unread:
+                new_prm.write(self.parm_data.raw_section(flag))
+                continue
+            data = section(flag)
+            if len(data) == 0: # empty field...
                 new_prm.write('\n')
                 continue
-            self.formats[flag].write(self.parm_data[flag], new_prm)
+            if flag == self.charge_flag:
+                # convert charges back to amber charges...
+                data = [chg * self.CHARGE_SCALE for chg in data]
+            self.formats[flag].write(data, new_prm)
 
         new_prm.close() # close new prmtop
 
-        if self.charge_flag in self.parm_data.keys():
-            # Convert charges back to electron-units
-            for i in range(len(self.parm_data[self.charge_flag])):
-                self.parm_data[self.charge_flag][i] /= self.CHARGE_SCALE
-
     #===================================================
 
     def addFlag(self, flag_name, flag_format, data=None, num_items=-1,
@@ -626,6 +1258,10 @@ class AmberFormat(object):
                 raise FlagError("If you do not supply prmtop data, num_items "
                                 "must be non-negative!")
             self.parm_data[flag_name.upper()] = [0 for i in range(num_items)]
+        if self.compact:
+            self.parm_data[flag_name.upper()] = compact_section(
+                    self.parm_data[flag_name.upper()],
+                    self.formats[flag_name.upper()])
         if comments:
             if isinstance(comments, str) or isinstance(comments, unicode):
                 comments = [comments]
@@ -9,6 +9,7 @@ instances where the prequisites may not be installed.
 from __future__ import division
 
 from chemistry.exceptions import ReadError
+from chemistry.genopen import genopen
 from compat24 import property
 from math import ceil
 import warnings as _warnings
@@ -16,16 +17,6 @@ import warnings as _warnings
 VELSCALE = 20.455
 ONEVELSCALE = 1 / VELSCALE
 
-try:
-    import bz2
-except ImportError:
-    bz2 = None
-
-try:
-    import gzip
-except ImportError:
-    gzip = None
-
 try:
     import numpy as np
 except ImportError:
@@ -52,9 +43,10 @@ class _AmberAsciiCoordinateFile(object):
             title (string): Title to write to a new trajectory (when mode='r')
 
         Notes:
-            This module automatically handles compressed files using either gzip
-            or bzip2, and compression is determined automatically by filename
-            extension (.gz for gzip and .bz2 for bzip2 files).
+            This module automatically handles compressed files using gzip,
+            bzip2, or xz. Compression of existing files is detected from their
+            contents, and new files are compressed based on their filename
+            extension (.gz for gzip, .bz2 for bzip2, and .xz for xz files).
         """
 
         if mode == 'r':
@@ -67,18 +59,7 @@ class _AmberAsciiCoordinateFile(object):
             self._writebox = False
         else:
             raise ValueError("%s mode must be 'r' or 'w'" % type(self).__name__)
-        if fname.endswith('.gz'):
-            if gzip is None:
-                raise ImportError('Python could not import the gzip library. '
-                                  'Cannot open compressed trajectory files')
-            self._file = gzip.open(fname, mode)
-        elif fname.endswith('.bz2'):
-            if bz2 is None:
-                raise ImportError('Python could not import the bz2 library. '
-                                  'Cannot open compressed trajectory files')
-            self._file = bz2.BZ2File(fname, mode)
-        else:
-            self._file = open(fname, mode)
+        self._file = genopen(fname, mode)
 
         self.natom = natom
         self.hasbox = hasbox
@@ -243,7 +224,7 @@ class AmberAsciiRestart(_AmberAsciiCoordinateFile):
         # Try to flatten the array if we got a 3-D numpy array. Don't worry if
         # it doesn't work, just go on
         try:
-            stuff = stuff.flatten()
+            stuff = stuff.ravel()
         except AttributeError:
             pass
         if self.natom > 0 and len(stuff) != 3 * self.natom:
@@ -283,7 +264,7 @@ class AmberAsciiRestart(_AmberAsciiCoordinateFile):
             raise RuntimeError('Cannot set velocities on an old restart')
         # Try to flatten the array if we got a 3-D numpy array
         try:
-            stuff = stuff.flatten()
+            stuff = stuff.ravel()
         except AttributeError:
             pass
         if not self._coords_written:
@@ -472,14 +453,14 @@ class AmberMdcrd(_AmberAsciiCoordinateFile):
     def add_coordinates(self, stuff):
         """
         Prints 'stuff' (which must be either an iterable of 3*natom or have an
-        attribute 'flatten' that converts it into an iterable of 3*natom) to the
+        method 'ravel' that converts it into an iterable of 3*natom) to the
         open file handler. Can only be called on a 'new' mdcrd
         """
         # Make sure we can write the coordinates right now
         if not self._status == 'new':
             raise RuntimeError('Cannot print frames to an old mdcrd')
         try:
-            stuff = stuff.flatten()
+            stuff = stuff.ravel()
         except AttributeError:
             pass
         if self._writebox:
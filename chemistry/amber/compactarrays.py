@@ -0,0 +1,233 @@
+"""
+Compact, typed containers for the sections of Amber format files. Integer and
+floating point sections are stored in array.array instances and string sections
+are stored in a StringArray, a single byte buffer of fixed-width entries. All of
+these support the list operations used on parm_data (indexing, slicing, append,
+extend, insert, pop, deletion, index, count, and iteration) while using a small
+fraction of the memory of a list of Python objects.
+"""
+from array import array
+import sys
+
+__all__ = ['StringArray', 'compact_section', 'INT_TYPECODE', 'FLOAT_TYPECODE']
+
+INT_TYPECODE = 'l'
+FLOAT_TYPECODE = 'd'
+
+if sys.version_info[0] >= 3:
+    def _encode(item):
+        if not isinstance(item, str):
+            item = str(item)
+        return item.encode('utf-8')
+    def _decode(raw):
+        return bytes(raw).rstrip(b'\x00').decode('utf-8')
+else:
+    def _encode(item):
+        if isinstance(item, unicode):
+            return item.encode('utf-8')
+        return str(item)
+    def _decode(raw):
+        return str(raw).rstrip('\x00')
+
+class StringArray(object):
+    """
+    A list-like array of strings stored in one contiguous byte buffer. Every
+    entry takes up the same number of bytes (padded with NUL bytes), and the
+    width grows automatically if a longer string is added.
+    """
+
+    #===================================================
+
+    def __init__(self, items=(), width=4):
+        """
+        Parameters:
+            items (iterable): The strings to store
+            width (int): The minimum number of bytes for each entry
+        """
+        self.width = max(width, 1)
+        self._buf = bytearray()
+        self.extend(items)
+
+    #===================================================
+
+    def _pack(self, items):
+        """ Encodes items into a byte string, widening the array if needed """
+        raw = [_encode(item) for item in items]
+        if raw:
+            longest = max([len(r) for r in raw])
+            if longest > self.width:
+                self._widen(longest)
+        w = self.width
+        return b''.join([r.ljust(w, b'\x00') for r in raw])
+
+    #===================================================
+
+    def _widen(self, width):
+        items = list(self)
+        self.width = width
+        self._buf = bytearray(self._pack(items))
+
+    #===================================================
+
+    def _index(self, idx):
+        n = len(self)
+        if idx < 0:
+            idx += n
+        if idx < 0 or idx >= n:
+            raise IndexError('StringArray index out of range')
+        return idx
+
+    #===================================================
+
+    def __len__(self):
+        return len(self._buf) // self.width
+
+    #===================================================
+
+    def __getitem__(self, idx):
+        w = self.width
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step == 1:
+                other = type(self)(width=w)
+                other._buf = self._buf[start*w:max(start, stop)*w]
+                return other
+            return type(self)([self[i] for i in range(start, stop, step)], w)
+        idx = self._index(idx)
+        return _decode(self._buf[idx*w:(idx+1)*w])
+
+    #===================================================
+
+    def __setitem__(self, idx, value):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step == 1:
+                packed = self._pack(value)
+                w = self.width # may have been widened
+                self._buf[start*w:max(start, stop)*w] = packed
+            else:
+                items = list(self)
+                items[idx] = list(value)
+                self._buf = bytearray(self._pack(items))
+            return
+        idx = self._index(idx)
+        packed = self._pack([value])
+        w = self.width
+        self._buf[idx*w:(idx+1)*w] = packed
+
+    #===================================================
+
+    def __delitem__(self, idx):
+        w = self.width
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step == 1:
+                del self._buf[start*w:max(start, stop)*w]
+            else:
+                items = list(self)
+                del items[idx]
+                self._buf = bytearray(self._pack(items))
+            return
+        idx = self._index(idx)
+        del self._buf[idx*w:(idx+1)*w]
+
+    #===================================================
+
+    def __iter__(self):
+        w = self.width
+        buf = self._buf
+        for i in range(0, len(buf), w):
+            yield _decode(buf[i:i+w])
+
+    #===================================================
+
+    def __contains__(self, item):
+        for thing in self:
+            if thing == item:
+                return True
+        return False
+
+    #===================================================
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and list(self) == list(other)
+        except TypeError:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    #===================================================
+
+    def __repr__(self):
+        return 'StringArray(%r, width=%d)' % (list(self), self.width)
+
+    #===================================================
+
+    def __copy__(self):
+        return self[:]
+
+    #===================================================
+
+    def append(self, item):
+        packed = self._pack([item]) # may widen (and replace) the buffer
+        self._buf.extend(packed)
+
+    def extend(self, items):
+        packed = self._pack(list(items)) # may widen (and replace) the buffer
+        self._buf.extend(packed)
+
+    def insert(self, idx, item):
+        n = len(self)
+        if idx < 0:
+            idx = max(idx + n, 0)
+        idx = min(idx, n)
+        packed = self._pack([item])
+        w = self.width
+        self._buf[idx*w:idx*w] = packed
+
+    def pop(self, idx=-1):
+        item = self[idx]
+        del self[idx]
+        return item
+
+    def index(self, item):
+        for i, thing in enumerate(self):
+            if thing == item:
+                return i
+        raise ValueError('%r is not in StringArray' % (item,))
+
+    def count(self, item):
+        return len([thing for thing in self if thing == item])
+
+    def remove(self, item):
+        del self[self.index(item)]
+
+    def tolist(self):
+        return list(self)
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def compact_section(data, fmt):
+    """
+    Converts the data of a section into a compact container
+
+    Parameters:
+        data (iterable): The section data
+        fmt (FortranFormat): The format of the section
+
+    Returns:
+        array.array for int and float sections, StringArray for string sections
+    """
+    if fmt.type is int:
+        if isinstance(data, array) and data.typecode == INT_TYPECODE:
+            return data
+        return array(INT_TYPECODE, data)
+    if fmt.type is float:
+        if isinstance(data, array) and data.typecode == FLOAT_TYPECODE:
+            return data
+        return array(FLOAT_TYPECODE, data)
+    if isinstance(data, StringArray):
+        return data
+    return StringArray(data, fmt.itemlen)
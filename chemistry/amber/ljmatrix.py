@@ -0,0 +1,234 @@
+"""
+The Lennard-Jones parameters of every pair of atom types of an AmberParm as
+ntypes x ntypes matrices.
+
+The A and B coefficients of the pairs are scattered over the
+LENNARD_JONES_ACOEF and LENNARD_JONES_BCOEF sections through the
+NONBONDED_PARM_INDEX section. An LJMatrix gathers them into square matrices
+once, derives the Rmin and epsilon of every pair and the radius and well depth
+of every type from them, and applies the combining rules of the topology to
+whole rows of the matrix at once. Changes made through its set_* methods are
+written straight back into the coefficient sections, so the matrix stays in
+sync with the topology. CHAMBER topologies have a second set of coefficients
+for the 1-4 pairs (LENNARD_JONES_14_ACOEF and LENNARD_JONES_14_BCOEF) that
+share NONBONDED_PARM_INDEX and have an LJMatrix of their own.
+
+AmberParm.lj_matrix caches the matrices of a topology until AmberParm.lj_changed
+is called, which must be done whenever NONBONDED_PARM_INDEX, the number of atom
+types, or the coefficient sections are changed other than through an LJMatrix.
+
+The matrices are numpy arrays if numpy is available and lists of lists
+otherwise. Both are indexed as matrix[i][j].
+"""
+from __future__ import division
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = ['LJMatrix']
+
+class LJMatrix(object):
+    """
+    The Lennard-Jones A and B coefficients of every pair of atom types
+
+    Parameters:
+        parm (AmberParm): The topology
+        prefix (str): LENNARD_JONES, or LENNARD_JONES_14 for the 1-4 pairs of a
+                      CHAMBER topology
+
+    Attributes:
+        index: Position of the coefficients of each pair in the coefficient
+               sections (-1 for pairs with 10-12 parameters instead)
+        acoef, bcoef: The coefficients of each pair (0 for 10-12 pairs)
+    """
+
+    #===================================================
+
+    def __init__(self, parm, prefix='LENNARD_JONES'):
+        self.parm = parm
+        self.prefix = prefix
+        self.ntypes = ntypes = parm.ptr('ntypes')
+        pd = parm.parm_data
+        nbidx = pd['NONBONDED_PARM_INDEX']
+        acoef = pd[prefix + '_ACOEF']
+        bcoef = pd[prefix + '_BCOEF']
+        if np is None:
+            self.index = [[max(nbidx[ntypes*i+j] - 1, -1)
+                           for j in range(ntypes)] for i in range(ntypes)]
+            self.acoef = [[k >= 0 and acoef[k] or 0.0 for k in row]
+                          for row in self.index]
+            self.bcoef = [[k >= 0 and bcoef[k] or 0.0 for k in row]
+                          for row in self.index]
+            return
+        index = np.asarray(nbidx[:ntypes*ntypes], dtype=np.int64) - 1
+        index = np.maximum(index, -1).reshape((ntypes, ntypes))
+        used = np.maximum(index, 0)
+        self.index = index
+        self.acoef = np.where(index >= 0,
+                              np.asarray(acoef, dtype=np.float64)[used], 0.0)
+        self.bcoef = np.where(index >= 0,
+                              np.asarray(bcoef, dtype=np.float64)[used], 0.0)
+
+    #===================================================
+
+    def pair_parameters(self):
+        """
+        Returns the Rmin and epsilon of every pair, obtained by undoing the
+        combining rules (both 0 if either coefficient is 0)
+
+        Returns:
+            (rmin, epsilon) matrices
+        """
+        if np is None:
+            rmin = [[0.0] * self.ntypes for i in range(self.ntypes)]
+            eps = [[0.0] * self.ntypes for i in range(self.ntypes)]
+            for i in range(self.ntypes):
+                for j in range(self.ntypes):
+                    acoef, bcoef = self.acoef[i][j], self.bcoef[i][j]
+                    if acoef == 0 or bcoef == 0: continue
+                    rmin[i][j] = (2 * acoef / bcoef) ** (1 / 6)
+                    eps[i][j] = bcoef * bcoef / (4 * acoef)
+            return rmin, eps
+        nonzero = (self.acoef != 0) & (self.bcoef != 0)
+        acoef = np.where(nonzero, self.acoef, 1.0)
+        bcoef = np.where(nonzero, self.bcoef, 1.0)
+        rmin = np.where(nonzero, (2 * acoef / bcoef) ** (1 / 6), 0.0)
+        eps = np.where(nonzero, bcoef * bcoef / (4 * acoef), 0.0)
+        return rmin, eps
+
+    #===================================================
+
+    def type_parameters(self, tiny):
+        """
+        Returns the radius and well depth of every atom type, obtained by
+        undoing the combining rules for the pair of the type with itself (both
+        0 if its A coefficient is below tiny)
+
+        Returns:
+            (radii, depths) as lists
+        """
+        if np is None:
+            radii, depths = [], []
+            for i in range(self.ntypes):
+                acoef, bcoef = self.acoef[i][i], self.bcoef[i][i]
+                if acoef < tiny:
+                    radii.append(0.0)
+                    depths.append(0.0)
+                else:
+                    factor = 2 * acoef / bcoef
+                    radii.append(pow(factor, 1 / 6) * 0.5)
+                    depths.append(bcoef / 2 / factor)
+            return radii, depths
+        acoef, bcoef = self.acoef.diagonal(), self.bcoef.diagonal()
+        zero = acoef < tiny
+        if (bcoef[~zero] == 0).any():
+            raise ZeroDivisionError('float division by zero')
+        factor = 2 * acoef / np.where(zero, 1.0, bcoef)
+        factor[zero] = 1.0
+        radii = np.where(zero, 0.0, factor ** (1 / 6) * 0.5)
+        depths = np.where(zero, 0.0, bcoef / 2 / factor)
+        return radii.tolist(), depths.tolist()
+
+    #===================================================
+
+    def combine(self, types, radii, depths):
+        """
+        Applies the combining rules of the topology to the pairs of each of the
+        given types (indexes from 0) with every type
+
+        Parameters:
+            types (list of int): The types of the rows to compute
+            radii, depths (list of float): Radius and well depth of every type
+
+        Returns:
+            (acoef, bcoef) with one row of coefficients for each type in types
+        """
+        parm = self.parm
+        if np is None:
+            acoef, bcoef = [], []
+            for i in types:
+                rij = [parm.combine_rmin(radii[i], r) for r in radii]
+                wdij = [parm.combine_epsilon(depths[i], d) for d in depths]
+                acoef.append([w * r**12 for r, w in zip(rij, wdij)])
+                bcoef.append([2 * w * r**6 for r, w in zip(rij, wdij)])
+            return acoef, bcoef
+        types = np.asarray(types, dtype=np.int64)
+        radii = np.asarray(radii, dtype=np.float64)
+        depths = np.asarray(depths, dtype=np.float64)
+        rij = parm.combine_rmin(radii[types][:,np.newaxis], radii)
+        wdij = parm.combine_epsilon(depths[types][:,np.newaxis], depths)
+        return wdij * rij**12, 2 * wdij * rij**6
+
+    #===================================================
+
+    def set_types(self, types, radii, depths):
+        """
+        Recomputes the coefficients of every pair that involves one of the given
+        types (indexes from 0) from the radius and well depth of every type with
+        the combining rules of the topology
+
+        Parameters:
+            types (list of int): The types whose pairs are recomputed
+            radii, depths (list of float): Radius and well depth of every type
+        """
+        acoef, bcoef = self.combine(types, radii, depths)
+        self._store(types, acoef, bcoef)
+
+    #===================================================
+
+    def set_all(self, radii, depths):
+        """
+        Recomputes the coefficients of every pair from the radius and well depth
+        of every type with the combining rules of the topology
+        """
+        self.set_types(range(self.ntypes), radii, depths)
+
+    #===================================================
+
+    def set_pair(self, type1, type2, rmin, epsilon):
+        """
+        Sets the coefficients of a single pair of types (indexes from 0) from
+        its (pre-combined) Rmin and epsilon
+        """
+        acoef, bcoef = epsilon * rmin**12, 2 * epsilon * rmin**6
+        for i, j in ((type1, type2), (type2, type1)):
+            self.acoef[i][j] = acoef
+            self.bcoef[i][j] = bcoef
+        k = self.index[type1][type2]
+        if k < 0: return
+        pd = self.parm.parm_data
+        pd[self.prefix + '_ACOEF'][k] = acoef
+        pd[self.prefix + '_BCOEF'][k] = bcoef
+
+    #===================================================
+
+    def _store(self, types, acoef, bcoef):
+        """
+        Stores rows of coefficients for the given types in the matrices (and
+        the matching columns) and in the coefficient sections of the topology
+        """
+        pd = self.parm.parm_data
+        asec = pd[self.prefix + '_ACOEF']
+        bsec = pd[self.prefix + '_BCOEF']
+        if np is None:
+            for i, arow, brow in zip(types, acoef, bcoef):
+                for j, k in enumerate(self.index[i]):
+                    self.acoef[i][j] = self.acoef[j][i] = arow[j]
+                    self.bcoef[i][j] = self.bcoef[j][i] = brow[j]
+                    if k < 0: continue
+                    asec[k] = arow[j]
+                    bsec[k] = brow[j]
+            return
+        types = np.asarray(types, dtype=np.int64)
+        for matrix, rows in ((self.acoef, acoef), (self.bcoef, bcoef)):
+            matrix[types,:] = rows
+            matrix[:,types] = rows.T
+        # NONBONDED_PARM_INDEX is symmetric, so the rows cover every pair
+        index = self.index[types]
+        lj = index >= 0
+        for k, a, b in zip(index[lj].tolist(), acoef[lj].tolist(),
+                           bcoef[lj].tolist()):
+            asec[k] = a
+            bsec[k] = b
@@ -1,8 +1,23 @@
 """
 Module for evaluating Amber Mask strings and translating them into lists in
 which a selected atom is 1 and one that's not is 0.
+
+A mask is parsed into an expression tree only once. If numpy is available, the
+tree is evaluated with boolean arrays: atom number ranges are slices, names are
+matched once against each distinct name in the topology, and the operators
+work on whole arrays.
+
+The selections are cached in the SelectionCache of the topology (see
+AmberParm.selection_cache) until the topology changes, so a mask that is
+evaluated again is not evaluated at all.
 """
+import compat24 # adds OrderedDict to collections in Py2.4 -- Py2.6
+from collections import OrderedDict
 from chemistry.exceptions import MaskError
+try:
+    import numpy as np
+except ImportError:
+    np = None
 #+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
 
 class AmberMask(object):
@@ -17,6 +32,10 @@ class AmberMask(object):
     def __init__(self, parm, mask):
         self.parm = parm
         self.mask = mask
+        # The mask string and its expression tree, once it has been parsed
+        self._compiled = None
+        # The _MaskData of the topology while the mask is being evaluated
+        self._data = None
       
     #======================================================
 
@@ -27,7 +46,12 @@ class AmberMask(object):
 
     def Selected(self, invert=False):
         """ Generator that returns the indexes of selected atoms """
-        for i, v in enumerate(self.Selection(invert=invert)):
+        selection = self.selection_array(invert=invert)
+        if np is not None:
+            for i in np.flatnonzero(selection).tolist():
+                yield i
+            return
+        for i, v in enumerate(selection):
             if v:
                 yield i
 
@@ -36,7 +60,19 @@ class AmberMask(object):
     def Selection(self, prnlev=0, invert=False):
         """
         Parses the mask and analyzes the result to return an atom
-        selection array
+        selection array (a list with 1 for selected atoms and 0 for the rest)
+        """
+        selection = self.selection_array(prnlev, invert)
+        if np is None:
+            return selection
+        return selection.astype(int).tolist()
+
+    #======================================================
+
+    def selection_array(self, prnlev=0, invert=False):
+        """
+        Same as Selection, but returns a numpy array of bools if numpy is
+        available (and the same list as Selection otherwise)
         """
         from sys import stderr, stdout
         if prnlev > 2: stderr.write('In AmberMask.Selection(), debug active!\n')
@@ -44,7 +80,31 @@ class AmberMask(object):
 
         # 0) See if we got the default "all" mask(*) and return accordingly
         if self.mask.strip() == '*':
-            return [1 for i in range(self.parm.ptr('natom'))]
+            if np is None:
+                return [1 for i in range(self.parm.ptr('natom'))]
+            return np.ones(self.parm.ptr('natom'), dtype=bool)
+
+        # 1) parse the mask into an expression tree (unless already done)
+        tree = self._compile(prnlev)
+
+        # 2) evaluate the expression tree (unless the selection is cached)
+        pmask = self._cached_evaluate(tree, prnlev)
+        if invert:
+            if np is None:
+                return [1-i for i in pmask]
+            return ~pmask
+        return pmask
+
+    #======================================================
+
+    def _compile(self, prnlev):
+        """
+        Returns the expression tree of the mask (see _parse), which is only
+        built the first time
+        """
+        from sys import stdout
+        if self._compiled is not None and self._compiled[0] == self.mask:
+            return self._compiled[1]
 
         # 1) preprocess input expression
         infix = AmberMask._tokenize(self, prnlev)
@@ -54,10 +114,10 @@ class AmberMask(object):
         postfix = AmberMask._torpn(self, infix, prnlev)
         if prnlev > 5: stdout.write('postfix mask: ==%s==\n' % postfix)
 
-        # 3) evaluate the postfix notation
-        if invert:
-            return [1-i for i in AmberMask._evaluate(self, postfix, prnlev)]
-        return AmberMask._evaluate(self, postfix, prnlev)
+        # 3) build the expression tree from the postfix notation
+        tree = AmberMask._parse(self, postfix)
+        self._compiled = (self.mask, tree)
+        return tree
 
     #======================================================
 
@@ -239,9 +299,13 @@ class AmberMask(object):
 
     #======================================================
 
-    def _evaluate(self, postfix, prnlev):
-        """ Evaluates a postfix in RPN format and returns a selection array """
-        from sys import stderr
+    def _parse(self, postfix):
+        """
+        Turns a postfix in RPN format into an expression tree. Each node is a
+        tuple: ('[', token) for an atom selection token, (op, operand) for !,
+        and (op, left, right) for &, |, <, and >. The tree is None if the mask
+        cannot select anything
+        """
         buffer = ''
         stack = []
 
@@ -250,58 +314,110 @@ class AmberMask(object):
             p = postfix[pos]
             if p == '[': buffer = ''
             elif p == ']': # end of the token
-                ptoken = buffer
-                pmask = self._selectElemMask(ptoken)
-                stack.append(pmask)
+                stack.append(('[', buffer))
             elif self._isOperand(p) or p in [':','@']:
                 buffer += p
             elif p in ['&','|']:
-                pmask1 = None
-                pmask2 = None
                 try:
-                    pmask1 = stack.pop()
-                    pmask2 = stack.pop()
-                    pmask = self._binop(p, pmask1, pmask2)
+                    right = stack.pop()
+                    left = stack.pop()
                 except IndexError:
                     raise MaskError('Illegal binary operation')
-                stack.append(pmask)
+                stack.append((p, left, right))
             elif p in ['<','>']:
                 if pos < len(postfix)-1 and postfix[pos+1] in [':','@']:
                     buffer += p
                 else:
                     try:
-                        pmask1 = stack.pop() # distance criteria
-                        pmask2 = stack.pop()
-                        pmask = self._selectDistd(pmask1, pmask2)
+                        right = stack.pop() # distance criteria
+                        left = stack.pop()
                     except IndexError:
-                        return [0 for i in range(self.parm.ptr('natom'))]
-                    stack.append(pmask)
+                        return None
+                    stack.append((p, left, right))
             elif p == '!':
                 try:
-                    pmask1 = stack.pop()
+                    operand = stack.pop()
                 except IndexError:
                     raise MaskError('Illegal ! operation')
-                pmask = self._neg(pmask1)
-                stack.append(pmask)
+                stack.append((p, operand))
             else:
                 raise MaskError('Unknown symbol evaluating RPN: %s' % p)
             pos += 1
         # end while i < len(postfix)
 
-        pmask = stack.pop()
+        tree = stack.pop()
 
         if stack:
             raise MaskError('There may be missing operands in the mask!')
 
+        return tree
+
+    #======================================================
+
+    def _evaluate(self, tree, prnlev):
+        """ Evaluates an expression tree and returns a selection array """
+        from sys import stderr
+        if tree is None:
+            return _empty_mask(self.parm.ptr('natom'))
+
+        pmask = self._evaluate_node(tree)
+
         if prnlev > 7:
             stderr.write('%d atoms selected by %s' % (sum(pmask), self.mask))
 
         return pmask
 
     #======================================================
+
+    def _cached_evaluate(self, tree, prnlev):
+        """
+        Returns a copy of the selection of the mask from the SelectionCache of
+        the topology, evaluating the expression tree and caching the selection
+        if it is not there
+        """
+        cache = getattr(self.parm, 'selection_cache', None)
+        if cache is None:
+            self._data = _MaskData(self.parm)
+            try:
+                return self._evaluate(tree, prnlev)
+            finally:
+                self._data = None
+        version = self.parm.topology_version
+        pmask = cache.lookup(self.mask, version)
+        if pmask is None:
+            self._data = cache.mask_data(self.parm, version)
+            try:
+                pmask = self._evaluate(tree, prnlev)
+            finally:
+                self._data = None
+            cache.store(self.mask, version, pmask)
+        if np is not None:
+            return pmask.copy()
+        selection = _mask(len(pmask))
+        selection[:] = pmask
+        return selection
+
+    #======================================================
+
+    def _evaluate_node(self, node):
+        """ Evaluates a node of an expression tree (see _parse) """
+        p = node[0]
+        if p == '[':
+            return self._selectElemMask(node[1])
+        if p == '!':
+            return self._neg(self._evaluate_node(node[1]))
+        pmask2 = self._evaluate_node(node[1])
+        pmask1 = self._evaluate_node(node[2])
+        if p in ['<','>']:
+            return self._selectDistd(pmask1, pmask2)
+        return self._binop(p, pmask1, pmask2)
+
+    #======================================================
    
     def _neg(self, pmask1):
         """ Negates a given mask """
+        if np is not None:
+            return ~pmask1
         return pmask1.Not()
 
     #======================================================
@@ -321,7 +437,7 @@ class AmberMask(object):
         TYPELIST = 3
         ELEMLIST = 4
         # define the mask object and empty buffer
-        pmask = _mask(self.parm.ptr('natom'))
+        pmask = _empty_mask(self.parm.ptr('natom'))
         buffer = ''
         buffer_p = 0
         # This is a residue NUMber LIST
@@ -344,7 +460,7 @@ class AmberMask(object):
                     buffer_p = 0
                 if len(buffer) != 0 and buffer_p == 0:
                     if reslist == ALL:
-                        pmask.select_all()
+                        _select_range(pmask, 0, len(pmask))
                     elif reslist == NUMLIST:
                         self._residue_numlist(buffer, pmask)
                     elif reslist == NAMELIST:
@@ -376,7 +492,7 @@ class AmberMask(object):
 
                 if len(buffer) != 0 and buffer_p == 0:
                     if atomlist == ALL:
-                        pmask.select_all()
+                        _select_range(pmask, 0, len(pmask))
                     elif atomlist == NUMLIST:
                         self._atom_numlist(buffer, pmask)
                     elif atomlist == NAMELIST:
@@ -387,9 +503,9 @@ class AmberMask(object):
                         self._atom_elemlist(buffer[1:], pmask)
                 pos += 1
         elif ptoken.strip() == '*':
-            pmask.select_all()
+            _select_range(pmask, 0, len(pmask))
         elif ptoken[0] in ['<','>']:
-            return _mask(self.parm.ptr('natom')) # empty mask; ignored anyway
+            return _empty_mask(self.parm.ptr('natom')) # ignored anyway
         else:
             raise MaskError('Mask is missing : and @')
         # end if ':' in ptoken:
@@ -514,12 +630,16 @@ class AmberMask(object):
    
     def _atnum_select(self, at1, at2, mask):
         """ Fills a _mask array between atom numbers at1 and at2 """
-        for i in range(at1-1, at2): mask[i] = 1
+        _select_range(mask, at1-1, at2)
 
     #======================================================
    
     def _resnum_select(self, res1, res2, mask):
         """ Fills a _mask array between residues res1 and res2 """
+        if np is not None:
+            resnum = self._data.residue_numbers()
+            mask |= (resnum >= res1) & (resnum <= res2)
+            return
         for i in range(self.parm.ptr('natom')):
             res = self.parm.atom_list[i].residue.idx
             if res >= res1 and res <= res2: mask[i] = 1
@@ -528,6 +648,16 @@ class AmberMask(object):
    
     def _atname_select(self, atname, mask, key='ATOM_NAME'):
         """ Fills a _mask array with all atom names of a given name """
+        if np is not None:
+            matches = self._data.name_matches(key, atname)
+            if not atname.isdigit():
+                mask |= matches
+                return
+            # A number also selects that atom, but unselects all other atoms
+            # that do not match
+            mask[:] = matches
+            if 0 < int(atname) <= len(mask): mask[int(atname)-1] = True
+            return
         for i in range(self.parm.ptr('natom')):
             if _nameMatch(atname, self.parm.parm_data[key][i]):
                 mask[i] = 1
@@ -538,6 +668,15 @@ class AmberMask(object):
    
     def _resname_select(self, resname, mask):
         """ Fills a _mask array with all residue names of a given name """
+        if np is not None:
+            matches = self._data.name_matches('RESIDUE_LABEL', resname)
+            if not resname.isdigit():
+                mask |= matches
+                return
+            # Like atom names, a number selects that residue and unselects all
+            # other atoms whose residue name does not match
+            mask[:] = matches | (self._data.residue_numbers() == int(resname))
+            return
         for i, atm in enumerate(self.parm.atom_list):
             if _nameMatch(resname, atm.residue.resname):
                 mask[i] = 1
@@ -548,6 +687,10 @@ class AmberMask(object):
    
     def _binop(self, op, pmask1, pmask2):
         """ Does a binary operation on a pair of masks """
+        if np is not None and op in ['&','|']:
+            if op == '&':
+                return pmask1 & pmask2
+            return pmask1 | pmask2
         if op == '&':
             return pmask1.And(pmask2)
         if op == '|':
@@ -651,3 +794,155 @@ class _mask(list):
             self[i] = 1
 
 #+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
+
+def _empty_mask(natom):
+    """
+    Returns a mask with no atom selected: a numpy array of bools, or a _mask if
+    numpy is not available
+    """
+    if np is None:
+        return _mask(natom)
+    return np.zeros(natom, dtype=bool)
+
+#+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
+
+def _select_range(mask, start, stop):
+    """
+    Selects mask[i] for every i in range(start, stop). Ranges that do not lie
+    inside the mask are selected one at a time, so negative indexes and indexes
+    past the end behave as they would in a loop
+    """
+    if np is None or start < 0 or stop > len(mask):
+        for i in range(start, stop): mask[i] = 1
+        return
+    mask[start:stop] = True
+
+#+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
+
+class _MaskData(object):
+    """
+    The per-atom data of a topology that masks select atoms by, gathered into
+    numpy arrays the first time each is needed. Names are stored as the list of
+    distinct names and the position of each atom's name in that list, so a
+    pattern is only matched once against each distinct name. Only used by
+    AmberMask (with numpy)
+    """
+
+    def __init__(self, parm):
+        self.parm = parm
+        self.natom = parm.ptr('natom')
+        self._names = dict()
+        self._residue_numbers = None
+
+    def residue_numbers(self):
+        """ Returns the number of the residue of every atom """
+        if self._residue_numbers is None:
+            self._residue_numbers = np.array([atm.residue.idx for atm in
+                                              self.parm.atom_list],
+                                             dtype=np.int64)
+        return self._residue_numbers
+
+    def name_matches(self, key, pattern):
+        """
+        Returns which atoms have a name that matches pattern (see _nameMatch).
+        key is the section with the names, or RESIDUE_LABEL for the names of
+        the residues of the atoms
+        """
+        if key not in self._names:
+            if key == 'RESIDUE_LABEL':
+                names = [atm.residue.resname for atm in self.parm.atom_list]
+            else:
+                names = self.parm.parm_data[key][:self.natom]
+            positions = dict()
+            index = np.array([positions.setdefault(name, len(positions))
+                              for name in names], dtype=np.int64)
+            self._names[key] = (sorted(positions, key=positions.get), index)
+        distinct, index = self._names[key]
+        matches = np.array([bool(_nameMatch(pattern, name))
+                            for name in distinct], dtype=bool)
+        return matches[index]
+
+#+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
+
+class SelectionCache(object):
+    """
+    The most recently used selections of the masks of a topology, keyed by the
+    mask string and the topology version (see AmberParm.data_changed). Only
+    the selections of the latest version are kept, along with the _MaskData
+    they were evaluated with
+
+    Parameters:
+        maxsize (int): The most selections that are kept
+
+    Attributes:
+        hits, misses: The number of lookups that found a selection and that
+                      did not, for profiling
+
+    Example:
+    >>> from chemistry.amber.readparm import AmberParm
+    >>> parm = AmberParm('../../examples/amber/ala5_gas.parm7')
+    >>> len(list(AmberMask(parm, ':QQQ').Selected()))
+    0
+    >>> parm.residue_list[1].resname = 'QQQ'
+    >>> len(list(AmberMask(parm, ':QQQ').Selected()))
+    10
+    >>> len(list(AmberMask(parm, ':2').Selected()))
+    10
+    >>> parm.residue_list[1].idx = 7
+    >>> len(list(AmberMask(parm, ':2').Selected()))
+    0
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self.clear()
+
+    def __len__(self):
+        return len(self._selections)
+
+    def clear(self):
+        """ Throws away every selection (but keeps the hit and miss counts) """
+        self._selections = OrderedDict()
+        self._version = None
+        self._data = None
+
+    def lookup(self, mask, version):
+        """ Returns the cached selection of a mask, or None if there is none """
+        key = (mask, version)
+        try:
+            selection = self._selections.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        # Put it back as the most recently used
+        self._selections[key] = selection
+        self.hits += 1
+        return selection
+
+    def store(self, mask, version, selection):
+        """
+        Caches the selection of a mask, throwing away the least recently used
+        selection if the cache is full
+        """
+        if version != self._version:
+            self.clear()
+            self._version = version
+        self._selections[(mask, version)] = selection
+        while len(self._selections) > self.maxsize:
+            self._selections.popitem(last=False)
+
+    def mask_data(self, parm, version):
+        """ Returns the _MaskData of a version of the topology """
+        if version != self._version:
+            self.clear()
+            self._version = version
+        if self._data is None:
+            self._data = _MaskData(parm)
+        return self._data
+
+#+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+-+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -10,6 +10,7 @@ from __future__ import division
 
 from chemistry.amber.constants import TINY
 from chemistry.amber.readparm import AmberParm, ChamberParm, Rst7
+from chemistry.amber.termarrays import term_rows
 from chemistry.exceptions import APIError, OpenMMError
 import chemistry.periodic_table as pt
 from math import asin, cos, sin, sqrt, pi
@@ -134,9 +135,9 @@ class OpenMMAmberParm(AmberParm):
 
         # Add bonds to the topology (both with and without hydrogen)
         atoms = list(self._topology.atoms())
-        for bnd in self.bonds_inc_h + self.bonds_without_h:
-            self._topology.addBond(atoms[bnd.atom1.starting_index],
-                                   atoms[bnd.atom2.starting_index])
+        for bonds in (self.bonds_inc_h, self.bonds_without_h):
+            for i, j, bond_type in term_rows(bonds):
+                self._topology.addBond(atoms[i], atoms[j])
       
         # Set the box dimensions
         if self.ptr('ifbox'):
@@ -310,40 +311,33 @@ class OpenMMAmberParm(AmberParm):
         # Set up the constraints
         if verbose and (constraints is not None and not rigidWater):
             print('Adding constraints...')
+        # The bonds, angles, and torsions are looped over with term_rows,
+        # which does not need to create the term objects
+        atoms = self.atom_list
         if constraints in (ff.HBonds, ff.AllBonds, ff.HAngles):
-            for bond in self.bonds_inc_h:
-                system.addConstraint(bond.atom1.starting_index,
-                                     bond.atom2.starting_index,
-                                     bond.bond_type.req*length_conv)
+            for i, j, bond_type in term_rows(self.bonds_inc_h):
+                system.addConstraint(i, j, bond_type.req*length_conv)
         if constraints in (ff.AllBonds, ff.HAngles):
-            for bond in self.bonds_without_h:
-                system.addConstraint(bond.atom1.starting_index,
-                                     bond.atom2.starting_index,
-                                     bond.bond_type.req*length_conv)
+            for i, j, bond_type in term_rows(self.bonds_without_h):
+                system.addConstraint(i, j, bond_type.req*length_conv)
         if rigidWater and constraints is None:
-            for bond in self.bonds_inc_h:
-                if (bond.atom1.residue.resname in WATNAMES and
-                    bond.atom2.residue.resname in WATNAMES):
-                    system.addConstraint(bond.atom1.starting_index,
-                                         bond.atom2.starting_index,
-                                         bond.bond_type.req*length_conv)
+            for i, j, bond_type in term_rows(self.bonds_inc_h):
+                if (atoms[i].residue.resname in WATNAMES and
+                    atoms[j].residue.resname in WATNAMES):
+                    system.addConstraint(i, j, bond_type.req*length_conv)
         # Add Bond forces
         if verbose: print('Adding bonds...')
         force = mm.HarmonicBondForce()
         force.setForceGroup(self.BOND_FORCE_GROUP)
         if flexibleConstraints or (constraints not in (ff.HBonds, ff.AllBonds,
                                                        ff.HAngles)):
-            for bond in self.bonds_inc_h:
-                force.addBond(bond.atom1.starting_index,
-                              bond.atom2.starting_index,
-                              bond.bond_type.req*length_conv,
-                              2*bond.bond_type.k*bond_frc_conv)
+            for i, j, bond_type in term_rows(self.bonds_inc_h):
+                force.addBond(i, j, bond_type.req*length_conv,
+                              2*bond_type.k*bond_frc_conv)
         if flexibleConstraints or (constraints not in (ff.AllBonds,ff.HAngles)):
-            for bond in self.bonds_without_h:
-                force.addBond(bond.atom1.starting_index,
-                              bond.atom2.starting_index,
-                              bond.bond_type.req*length_conv,
-                              2*bond.bond_type.k*bond_frc_conv)
+            for i, j, bond_type in term_rows(self.bonds_without_h):
+                force.addBond(i, j, bond_type.req*length_conv,
+                              2*bond_type.k*bond_frc_conv)
         system.addForce(force)
         # Add Angle forces
         if verbose: print('Adding angles...')
@@ -357,52 +351,42 @@ class OpenMMAmberParm(AmberParm):
                 dist = c[2].value_in_unit(u.nanometer)
                 atom_constraints[c[0]].append((c[1], dist))
                 atom_constraints[c[1]].append((c[0], dist))
-        for angle in self.angles_inc_h:
+        for i, j, k, angle_type in term_rows(self.angles_inc_h):
             if constraints is ff.HAngles:
-                a1 = angle.atom1.element
-                a2 = angle.atom2.element
-                a3 = angle.atom3.element
+                a1 = atoms[i].element
+                a2 = atoms[j].element
+                a3 = atoms[k].element
                 nh = int(a1==1) + int(a2==1) + int(a3==1)
                 constrained = (nh >= 2 or (nh == 1 and a2 == 8))
             else:
                 constrained = False # no constraints
             if constrained:
                 l1 = l2 = None
-                for bond in angle.atom2.bonds:
-                    if bond.atom1 is angle.atom1 or bond.atom2 is angle.atom1:
+                for bond in atoms[j].bonds:
+                    if bond.atom1 is atoms[i] or bond.atom2 is atoms[i]:
                         l1 = bond.bond_type.req * length_conv
-                    elif bond.atom1 is angle.atom3 or bond.atom2 is angle.atom3:
+                    elif bond.atom1 is atoms[k] or bond.atom2 is atoms[k]:
                         l2 = bond.bond_type.req * length_conv
                 # Compute the distance between the atoms and add a constraint
-                length = sqrt(l1*l1 + l2*l2 - 2*l1*l2*
-                              cos(angle.angle_type.theteq))
+                length = sqrt(l1*l1 + l2*l2 - 2*l1*l2*cos(angle_type.theteq))
                 system.addConstraint(bond.atom1.starting_index,
                                      bond.atom2.starting_index, length)
             if flexibleConstraints or not constrained:
-                force.addAngle(angle.atom1.starting_index,
-                               angle.atom2.starting_index,
-                               angle.atom3.starting_index,
-                               angle.angle_type.theteq,
-                               2*angle.angle_type.k*angle_frc_conv)
-        for angle in self.angles_without_h:
-            force.addAngle(angle.atom1.starting_index,
-                           angle.atom2.starting_index,
-                           angle.atom3.starting_index,
-                           angle.angle_type.theteq,
-                           2*angle.angle_type.k*angle_frc_conv)
+                force.addAngle(i, j, k, angle_type.theteq,
+                               2*angle_type.k*angle_frc_conv)
+        for i, j, k, angle_type in term_rows(self.angles_without_h):
+            force.addAngle(i, j, k, angle_type.theteq,
+                           2*angle_type.k*angle_frc_conv)
         system.addForce(force)
         # Add dihedral forces
         if verbose: print('Adding torsions...')
         force = mm.PeriodicTorsionForce()
         force.setForceGroup(self.DIHEDRAL_FORCE_GROUP)
-        for tor in self.dihedrals_inc_h + self.dihedrals_without_h:
-            force.addTorsion(tor.atom1.starting_index,
-                             tor.atom2.starting_index,
-                             tor.atom3.starting_index,
-                             tor.atom4.starting_index,
-                             int(tor.dihed_type.per),
-                             tor.dihed_type.phase,
-                             tor.dihed_type.phi_k*dihe_frc_conv)
+        torsions = (list(term_rows(self.dihedrals_inc_h)) +
+                    list(term_rows(self.dihedrals_without_h)))
+        for i, j, k, l, dihed_type, signs in torsions:
+            force.addTorsion(i, j, k, l, int(dihed_type.per), dihed_type.phase,
+                             dihed_type.phi_k*dihe_frc_conv)
         system.addForce(force)
 
         # Add nonbonded terms now
@@ -465,22 +449,17 @@ class OpenMMAmberParm(AmberParm):
         # Add 1-4 interactions
         excluded_atom_pairs = set() # save these pairs so we don't zero them out
         sigma_scale = 2**(-1/6)
-        for tor in self.dihedrals_inc_h + self.dihedrals_without_h:
-            if min(tor.signs) < 0: continue # multi-terms and impropers
-            charge_prod = (tor.atom1.charge * tor.atom4.charge /
-                           tor.dihed_type.scee)
-            epsilon = (sqrt(LJ_14_depth[tor.atom1.nb_idx-1] * ene_conv *
-                            LJ_14_depth[tor.atom4.nb_idx-1] * ene_conv) /
-                            tor.dihed_type.scnb)
-            sigma = (LJ_14_radius[tor.atom1.nb_idx-1] +
-                     LJ_14_radius[tor.atom4.nb_idx-1])*length_conv*sigma_scale
-            force.addException(tor.atom1.starting_index,
-                               tor.atom4.starting_index,
-                               charge_prod, sigma, epsilon)
-            excluded_atom_pairs.add(
-                    min( (tor.atom1.starting_index, tor.atom4.starting_index),
-                         (tor.atom4.starting_index, tor.atom1.starting_index) )
-            )
+        for i, j, k, l, dihed_type, signs in torsions:
+            if min(signs) < 0: continue # multi-terms and impropers
+            atom1, atom4 = atoms[i], atoms[l]
+            charge_prod = atom1.charge * atom4.charge / dihed_type.scee
+            epsilon = (sqrt(LJ_14_depth[atom1.nb_idx-1] * ene_conv *
+                            LJ_14_depth[atom4.nb_idx-1] * ene_conv) /
+                            dihed_type.scnb)
+            sigma = (LJ_14_radius[atom1.nb_idx-1] +
+                     LJ_14_radius[atom4.nb_idx-1])*length_conv*sigma_scale
+            force.addException(i, l, charge_prod, sigma, epsilon)
+            excluded_atom_pairs.add(min((i, l), (l, i)))
 
         # Add excluded atoms
         for atom in self.atom_list:
@@ -671,49 +650,27 @@ class OpenMMAmberParm(AmberParm):
     @property
     def positions(self):
         """
-        Return the cached positions or create new ones from the atoms
+        Return the coordinates with units. This wraps an (natom, 3) view of the
+        coordinate array shared with the atoms instead of copying it
         """
-        try:
-            if len(self._positions) == len(self.atom_list):
-                return self._positions
-        except AttributeError:
-            pass
-
-        self._positions = tuple([Vec3(a.xx, a.xy, a.xz)
-                               for a in self.atom_list]) * u.angstroms
-        return self._positions
+        return u.Quantity(self.coords.reshape((-1, 3)), u.angstroms)
 
     @positions.setter
     def positions(self, stuff):
         """
-        Update the cached positions and assign the coordinates to the atoms
+        Load the positions as the new coordinates of the atoms
         """
-        self._positions = stuff
-        for i, pos in enumerate(stuff.value_in_unit(u.angstroms)):
-            i3 = i * 3
-            atom = self.atom_list[i]
-            atom.xx, atom.xy, atom.xz = pos
-            self.coords[i3], self.coords[i3+1], self.coords[i3+2] = pos
+        self.load_coordinates(stuff.value_in_unit(u.angstroms))
 
     @property
     def velocities(self):
         """ Same as for positions, but for velocities """
-        try:
-            if len(self._velocities) == len(self.atom_list):
-                return self._velocities
-        except AttributeError:
-            pass
-
-        self._velocities = tuple([Vec3(a.vx, a.vy, a.vz)
-                    for a in self.atom_list]) * (u.angstroms/u.picosecond) 
-        return self._velocities
+        return u.Quantity(self.vels.reshape((-1, 3)),
+                          u.angstroms/u.picoseconds)
 
     @velocities.setter
     def velocities(self, stuff):
-        self._velocities = stuff
-        for atom, vel in zip(self.atom_list, stuff):
-            atom.vx, atom.vy, atom.vz = vel.value_in_unit(
-                    u.angstroms/u.picoseconds)
+        self.load_velocities(stuff.value_in_unit(u.angstroms/u.picoseconds))
 
     @property
     def box_vectors(self):
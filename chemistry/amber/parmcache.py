@@ -0,0 +1,253 @@
+"""
+An on-disk cache of parsed Amber format files. Each topology file gets an .npz
+entry in the cache directory for each charge scaling factor it is parsed with
+(see AmberFormat.rdparm), holding its parsed sections in binary form, so
+reloading an unchanged file skips parsing entirely. An entry is only used if the
+size, modification time, and content hash of the file all match what was stored
+with it. The total size of the cache directory is bounded, and the least
+recently used entries are evicted first.
+
+The cache is off by default. Turn it on with enable_cache() or by setting the
+PARMED_CACHE_DIR environment variable to the directory the cache should live in.
+It requires numpy.
+"""
+from __future__ import division
+
+from chemistry.exceptions import AmberFormatWarning
+import hashlib
+import json
+import os
+import tempfile
+from warnings import warn
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = ['ParmCache', 'enable_cache', 'disable_cache', 'get_cache']
+
+DEFAULT_CACHE_DIR = os.path.join(
+        os.environ.get('XDG_CACHE_HOME', os.path.join('~', '.cache')), 'parmed'
+)
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024 # bytes
+
+_CACHE_VERSION = 1
+_KINDS = {'int' : 'i', 'float' : 'f', 'str' : 'S'}
+
+class ParmCache(object):
+    """ Size-bounded LRU cache of parsed topology files stored as .npz files """
+
+    #===================================================
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        """
+        Parameters:
+            directory (str): Directory to keep the cache files in. It is created
+                if it does not exist. Default is $XDG_CACHE_HOME/parmed
+            max_size (int): Maximum total size of the cache files in bytes
+        """
+        if directory is None:
+            directory = DEFAULT_CACHE_DIR
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_size = max_size
+        self.hits = self.misses = 0
+
+    #===================================================
+
+    def _entry(self, fname, charge_scale):
+        """
+        Name of the cache file for a given topology file parsed with a given
+        charge scaling factor
+        """
+        key = '%s\n%r' % (os.path.abspath(fname), float(charge_scale))
+        key = hashlib.sha1(key.encode('utf-8'))
+        return os.path.join(self.directory, key.hexdigest() + '.npz')
+
+    #===================================================
+
+    @staticmethod
+    def _stamp(fname):
+        """ Returns the size, mtime, and content hash of a file """
+        stat = os.stat(fname)
+        sha = hashlib.sha1()
+        f = open(fname, 'rb')
+        try:
+            chunk = f.read(1048576)
+            while chunk:
+                sha.update(chunk)
+                chunk = f.read(1048576)
+        finally:
+            f.close()
+        return stat.st_size, stat.st_mtime, sha.hexdigest()
+
+    #===================================================
+
+    def get(self, fname, charge_scale):
+        """
+        Looks up the parsed data for a topology file
+
+        Parameters:
+            fname (str): Name of the topology file
+            charge_scale (float): Scaling factor the charges were divided by
+
+        Returns:
+            None if there is no valid entry for fname. Otherwise a dict with the
+            keys version, flag_list, formats (format strings), parm_comments,
+            and parm_data
+        """
+        entry = self._entry(fname, charge_scale)
+        if np is None or not os.path.exists(entry):
+            self.misses += 1
+            return None
+        try:
+            npz = np.load(entry)
+            try:
+                meta = json.loads(npz['__meta__'].tostring().decode('utf-8'))
+                if (meta['cache_version'] != _CACHE_VERSION or
+                        meta['charge_scale'] != charge_scale or
+                        [meta['size'], meta['mtime'], meta['sha1']] !=
+                        list(self._stamp(fname))):
+                    self.misses += 1
+                    return None
+                flag_list = [str(flag) for flag in meta['flag_list']]
+                parm_data = {}
+                for i, flag in enumerate(flag_list):
+                    parm_data[flag] = npz['s%d' % i].tolist()
+            finally:
+                npz.close()
+        except Exception:
+            # A corrupt or unreadable entry is just a miss
+            self.misses += 1
+            return None
+        # Mark this entry as most recently used
+        os.utime(entry, None)
+        self.hits += 1
+        return dict(
+                version=meta['version'] and str(meta['version']),
+                flag_list=flag_list,
+                formats=dict([(str(k), str(v))
+                              for k, v in meta['formats'].items()]),
+                parm_comments=dict([(str(k), [str(c) for c in v])
+                                    for k, v in meta['comments'].items()]),
+                parm_data=parm_data,
+        )
+
+    #===================================================
+
+    def put(self, fname, charge_scale, parm):
+        """
+        Stores the parsed data of a topology file in the cache
+
+        Parameters:
+            fname (str): Name of the topology file
+            charge_scale (float): Scaling factor the charges were divided by
+            parm (AmberFormat): The parsed topology file
+        """
+        if np is None:
+            return
+        arrays = {}
+        for i, flag in enumerate(parm.flag_list):
+            fmt = parm.formats[flag]
+            if not hasattr(fmt, 'type'):
+                return # section without a %FORMAT
+            arr = np.array(parm.parm_data[flag])
+            # Only cache data that come back out exactly as they went in
+            if len(arr) and (arr.ndim != 1 or
+                             arr.dtype.kind != _KINDS[fmt.type.__name__]):
+                return
+            arrays['s%d' % i] = arr
+        size, mtime, sha1 = self._stamp(fname)
+        meta = dict(cache_version=_CACHE_VERSION, charge_scale=charge_scale,
+                    size=size, mtime=mtime, sha1=sha1, version=parm.version,
+                    flag_list=parm.flag_list,
+                    formats=dict([(flag, str(parm.formats[flag]))
+                                  for flag in parm.flag_list]),
+                    comments=parm.parm_comments)
+        arrays['__meta__'] = np.frombuffer(json.dumps(meta).encode('utf-8'),
+                                           dtype=np.uint8)
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            # Write to a temporary file and move it into place so other
+            # processes never see a partially-written entry
+            fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+            f = os.fdopen(fd, 'wb')
+            try:
+                np.savez(f, **arrays)
+            finally:
+                f.close()
+            os.rename(tmp, self._entry(fname, charge_scale))
+        except (IOError, OSError), err:
+            warn('Could not write topology cache entry for %s: %s' %
+                 (fname, err), AmberFormatWarning)
+            return
+        self.evict()
+
+    #===================================================
+
+    def evict(self):
+        """ Deletes least recently used entries until the cache fits max_size """
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'): continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_size: break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+
+    #===================================================
+
+    def clear(self):
+        """ Deletes every entry in the cache """
+        if not os.path.isdir(self.directory): return
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                os.unlink(os.path.join(self.directory, name))
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+_cache = None
+
+def enable_cache(directory=None, max_size=DEFAULT_MAX_SIZE):
+    """
+    Turns on the topology file cache used by AmberFormat.rdparm (and therefore
+    LoadParm and every AmberParm class)
+
+    Parameters:
+        directory (str): Directory to keep the cache files in
+        max_size (int): Maximum total size of the cache files in bytes
+
+    Returns:
+        The ParmCache that is now in use
+    """
+    global _cache
+    if np is None:
+        warn('numpy is required for the topology file cache',
+             AmberFormatWarning)
+        return None
+    _cache = ParmCache(directory, max_size)
+    return _cache
+
+def disable_cache():
+    """ Turns off the topology file cache """
+    global _cache
+    _cache = None
+
+def get_cache():
+    """ Returns the active ParmCache, or None if caching is disabled """
+    return _cache
+
+if os.environ.get('PARMED_CACHE_DIR') and np is not None:
+    enable_cache(os.environ['PARMED_CACHE_DIR'])
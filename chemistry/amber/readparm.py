@@ -41,13 +41,21 @@ class rst7(Rst7):
    
 
 # Supply a function to load a topology file in the 'correct' format
-def LoadParm(parmname, rst7name=None):
+def LoadParm(parmname, rst7name=None, use_mmap=False, compact=False,
+             array_topology=False):
     """
     Loads a topology file using the correct class.
 
     Parameters:
         parmname (str): The name of the topology file to load
         rst7name (str): The (optional) name of the restart file to load
+        use_mmap (bool): If True, parse the topology file from a memory map of
+                         it rather than line-by-line
+        compact (bool): If True, store the topology data in compact typed
+                        arrays rather than lists
+        array_topology (bool): If True, store the bonds, angles, and dihedrals
+                        as arrays until their objects are first needed (see
+                        chemistry.amber.termarrays)
 
     Returns:
         AmberParm or ChamberParm instance, depending on whether it is an Amber
@@ -55,13 +63,14 @@ def LoadParm(parmname, rst7name=None):
         with chamber), respectively. If the restart file is not None, it will
         load the restart file into the parameter file
     """
-    parm = AmberFormat(parmname)
+    parm = AmberFormat(parmname, use_mmap=use_mmap, compact=compact)
     if 'CTITLE' in parm.flag_list:
-        parm = parm.view(ChamberParm)
+        cls = ChamberParm
     elif 'AMOEBA_FORCEFIELD' in parm.flag_list:
-        parm = parm.view(AmoebaParm)
+        cls = AmoebaParm
     else:
-        parm = parm.view(AmberParm)
+        cls = AmberParm
+    parm = cls.load_from_rawdata(parm, array_topology=array_topology)
 
     # Now load the restart file
     if rst7name is not None:
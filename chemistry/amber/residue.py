@@ -212,31 +212,22 @@ class Residue(object):
 
         return ret_string
 
+    @property
+    def key(self):
+        """
+        Hashable signature of the residue. Residues are equivalent if (and only
+        if) their keys are equal, so unique residues can be found with a dict
+        """
+        return (self.name, len(self.atoms), len(self.bonds), self.head != 0,
+                self.tail != 0, len(self.connects))
+
     def __eq__(self, other):
         """
         2 Residue classes are equivalent if they have the same number of atoms,
         bonds, same name, both head and tail are either both 0 or both non-zero,
         and the connects array is the same length
         """
-        if self.name != other.name:
-            return False
-      
-        if (len(self.atoms) != len(other.atoms) or
-            len(self.bonds) != len(other.bonds)):
-            return False
-
-        if ((self.head == 0 and other.head != 0) or
-            (self.head != 0 and other.head == 0)):
-            return False
-
-        if ((self.tail == 0 and other.tail != 0) or
-            (self.tail != 0 and other.tail == 0)):
-            return False
-
-        if len(self.connects) != len(other.connects):
-            return False
-
-        return True
+        return self.key == other.key
 
     def __ne__(self, other):
         """ 2 Residue classes are not equivalent if they are not equivalent """
@@ -0,0 +1,1049 @@
+"""
+Structure-of-arrays storage for the bonds, angles, and dihedrals of an
+AmberParm. Each list of terms is kept as an integer array of atom indexes (one
+row per term), an array of indexes into the matching type list, and (for
+dihedrals) an array with the signs of the third and fourth atoms. This takes a
+small fraction of the memory and time of creating a Bond, Angle, or Dihedral
+object for every term, and the most common whole-topology operations (loading
+the topology, finding the exclusions, and rewriting the term sections in
+remake_parm) are done on the arrays directly.
+
+The Bond, Angle, and Dihedral objects are only created the first time something
+needs them -- iterating over, indexing, or modifying any of the term lists, or
+asking an atom for its bonds, angles, or dihedrals. At that point the objects
+for every term list of the topology are created at once and from then on the
+topology behaves exactly as if it had been loaded with objects in the first
+place. Bonded, angled, and dihedral partners of the atoms are likewise filled
+in from the arrays the first time one of them is needed.
+
+Use term_rows to loop over a term list without creating the objects. This
+requires numpy.
+
+Topologies that store their terms as objects from the start are loaded with
+load_term_objects, which decodes the sections in bulk (decode_section) and
+creates the objects from the decoded columns. That works with or without numpy.
+With numpy, the partners of the atoms are again filled in the first time one of
+them is needed, from the pairs of atoms kept while loading.
+
+When atoms are deleted (AmberParm.delete_mask), strip_term_sections,
+strip_exclusions, and strip_molecules filter the topology file sections directly
+with the old-to-new index of every atom instead of going through any objects.
+"""
+from __future__ import division
+
+from chemistry.amber.topologyobjects import Bond, Angle, Dihedral, TrackedList
+from chemistry.exceptions import BondError
+from operator import eq
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = ['TermArray', 'BondArray', 'AngleArray', 'DihedralArray',
+           'term_rows', 'decode_section']
+
+# The term lists of an AmberParm, in the order their objects are created
+TERM_LISTS = ('bonds_inc_h', 'bonds_without_h', 'angles_inc_h',
+              'angles_without_h', 'dihedrals_inc_h', 'dihedrals_without_h')
+
+def _int_array(data):
+    """ Converts a section of integers into a numpy array """
+    return np.array(data, dtype=np.int64)
+
+def decode_section(data, nterm, width, amber=True, signed=False):
+    """
+    Decodes the first nterm terms of a topology file section that lists the
+    atoms of every term followed by the index of its type
+
+    Parameters:
+        data (list): The section
+        nterm (int): Number of terms in the section
+        width (int): Number of integers of each term
+        amber (bool): If True, the atoms are stored as 3 times their index and
+            may be negative (the bond, angle, and dihedral sections). If False,
+            they are stored as their index plus 1 (the CHAMBER and AMOEBA term
+            sections)
+        signed (bool): Also return the signs of the third and fourth atoms
+            (dihedral sections)
+
+    Returns:
+        (atoms, types, signs) -- atoms has a list with the index of the first,
+        second, etc. atom of every term, types is a list with the index of the
+        type of every term (both counting from 0), and signs has a list with
+        the signs (1 or -1) of the third and fourth atoms of every term (None
+        unless signed is True)
+    """
+    signs = None
+    if np is not None:
+        raw = _int_array(data[:width*nterm]).reshape((nterm, width))
+        atoms = raw[:,:-1]
+        if signed:
+            signs = np.where(atoms[:,2:4] < 0, -1, 1).T.tolist()
+        if amber:
+            atoms = np.abs(atoms) // 3
+        else:
+            atoms = atoms - 1
+        return atoms.T.tolist(), (raw[:,-1] - 1).tolist(), signs
+    end = width * nterm
+    columns = [data[i:end:width] for i in range(width)]
+    if signed:
+        signs = [[v < 0 and -1 or 1 for v in col] for col in columns[2:4]]
+    if amber:
+        atoms = [[abs(v) // 3 for v in col] for col in columns[:-1]]
+    else:
+        atoms = [[v - 1 for v in col] for col in columns[:-1]]
+    return atoms, [v - 1 for v in columns[-1]], signs
+
+def _check_distinct(atoms, message):
+    """ Raises BondError if an atom appears more than once in the same term """
+    for i in range(len(atoms)):
+        for j in range(i+1, len(atoms)):
+            if any(map(eq, atoms[i], atoms[j])):
+                raise BondError(message)
+
+# The term lists of the atoms are only created once needed (see
+# topologyobjects._lazy_list), so the builders below append to them directly
+
+def make_bonds(src, type_list, atoms, types, signs=None):
+    """
+    Creates Bond objects from decoded columns (see decode_section) and adds them
+    to the bonds of their atoms. Unlike the Bond constructor, this does not
+    register the atoms as partners of each other (see add_partners)
+
+    Parameters:
+        src (list): The atoms that the atom indexes refer to
+        type_list (_TypeList): The types that the type indexes refer to
+        atoms (list): List of the indexes of the first and second atoms
+        types (list): The type index of every bond
+        signs: Not used
+
+    Returns:
+        list of the new Bond objects
+    """
+    _check_distinct(atoms, 'Cannot bond atom to itself!')
+    new = Bond.__new__
+    terms = []
+    for i, j, t in zip(atoms[0], atoms[1], types):
+        term = new(Bond)
+        term.atom1 = a1 = src[i]
+        term.atom2 = a2 = src[j]
+        term.bond_type = type_list[t]
+        for atom in (a1, a2):
+            if atom._bonds is None:
+                atom._bonds = [term]
+            else:
+                atom._bonds.append(term)
+        terms.append(term)
+    return terms
+
+def make_angles(src, type_list, atoms, types, signs=None):
+    """ Creates Angle objects from decoded columns (see make_bonds) """
+    _check_distinct(atoms, 'Cannot angle atom to itself!')
+    new = Angle.__new__
+    terms = []
+    for i, j, k, t in zip(atoms[0], atoms[1], atoms[2], types):
+        term = new(Angle)
+        term.atom1 = a1 = src[i]
+        term.atom2 = a2 = src[j]
+        term.atom3 = a3 = src[k]
+        term.angle_type = type_list[t]
+        for atom in (a1, a2, a3):
+            if atom._angles is None:
+                atom._angles = [term]
+            else:
+                atom._angles.append(term)
+        terms.append(term)
+    return terms
+
+def make_dihedrals(src, type_list, atoms, types, signs):
+    """
+    Creates Dihedral objects from decoded columns (see make_bonds). signs has
+    the signs of the third and fourth atoms of every dihedral
+    """
+    _check_distinct(atoms, 'Cannot dihedral atom to itself!')
+    new = Dihedral.__new__
+    terms = []
+    for i, j, k, l, t, s3, s4 in zip(atoms[0], atoms[1], atoms[2], atoms[3],
+                                     types, signs[0], signs[1]):
+        term = new(Dihedral)
+        term.atom1 = a1 = src[i]
+        term.atom2 = a2 = src[j]
+        term.atom3 = a3 = src[k]
+        term.atom4 = a4 = src[l]
+        term.dihed_type = type_list[t]
+        term.signs = [s3, s4]
+        for atom in (a1, a2, a3, a4):
+            if atom._dihedrals is None:
+                atom._dihedrals = [term]
+            else:
+                atom._dihedrals.append(term)
+        terms.append(term)
+    return terms
+
+def _materializing(name):
+    """ Forwards a list method to the term objects, creating them first """
+    def fcn(self, *args):
+        return getattr(self._terms(), name)(*args)
+    fcn.__name__ = name
+    return fcn
+
+class TermArray(object):
+    """
+    A list of bonded terms stored as arrays. It supports the same operations as
+    the TrackedList it replaces, but all of them except len() create the term
+    objects first (see the module docstring).
+
+    Attributes:
+        atoms (numpy.ndarray): (nterm, natom_per_term) array with the index of
+            each atom of every term in atom_source
+        types (numpy.ndarray): Index of the type of every term in type_list
+        atom_source (list): The atoms that the indexes in atoms refer to (the
+            atom list as it was when the arrays were last set)
+        type_list (_TypeList): The type list that the indexes in types refer to
+    """
+
+    # Number of atoms in each term and the number of integers for each term in
+    # the topology file section
+    natom_per_term = 0
+    section_width = 0
+
+    #===================================================
+
+    def __init__(self, parm, atoms, types, atom_source, type_list):
+        self.parm = parm
+        self.atoms = atoms
+        self.types = types
+        self.atom_source = atom_source
+        self.type_list = type_list
+        self._list = None
+        self._changed = False
+
+    #===================================================
+
+    @classmethod
+    def from_section(cls, parm, section, nterm, atom_source, type_list):
+        """
+        Decodes the terms stored in a topology file section
+
+        Parameters:
+            parm (AmberParm): The topology the terms belong to
+            section (str): Name of the section holding the terms
+            nterm (int): Number of terms in the section
+            atom_source (list): The atoms the section refers to
+            type_list (_TypeList): The types the section refers to
+
+        Returns:
+            The decoded term array
+        """
+        width = cls.section_width
+        raw = _int_array(parm.parm_data[section][:width*nterm])
+        raw = raw.reshape((nterm, width))
+        return cls._from_raw(parm, raw, atom_source, type_list)
+
+    @classmethod
+    def _from_raw(cls, parm, raw, atom_source, type_list):
+        nat = cls.natom_per_term
+        return cls(parm, raw[:,:nat] // 3, raw[:,nat] - 1, atom_source,
+                   type_list)
+
+    #===================================================
+
+    @property
+    def materialized(self):
+        """ Whether the term objects have been created yet """
+        return self._list is not None
+
+    def _terms(self):
+        """ Returns the TrackedList of term objects, creating them if needed """
+        if self._list is None:
+            build_term_objects(self.parm)
+        return self._list
+
+    def _build(self):
+        """
+        Creates the term objects from the arrays. The atoms are not registered
+        as partners of each other (see build_term_objects)
+        """
+        self._list = TrackedList(self._make_terms(self.atom_source,
+                self.type_list, self.atoms.T.tolist(), self.types.tolist(),
+                self._signs()))
+        self._list.changed = self._changed
+
+    def _signs(self):
+        return None
+
+    #===================================================
+
+    @property
+    def changed(self):
+        if self._list is not None:
+            return self._list.changed
+        return self._changed
+
+    @changed.setter
+    def changed(self, value):
+        self._changed = value
+        if self._list is not None:
+            self._list.changed = value
+
+    #===================================================
+
+    def __len__(self):
+        if self._list is not None:
+            return len(self._list)
+        return len(self.types)
+
+    def __nonzero__(self):
+        return len(self) > 0
+
+    __bool__ = __nonzero__
+
+    def __iter__(self):
+        return iter(self._terms())
+
+    def __add__(self, other):
+        return list(self._terms()) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self._terms())
+
+    def __eq__(self, other):
+        return self._terms() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        if self._list is None:
+            return '<%s of %d terms>' % (type(self).__name__, len(self))
+        return repr(self._list)
+
+    __getitem__ = _materializing('__getitem__')
+    __setitem__ = _materializing('__setitem__')
+    __delitem__ = _materializing('__delitem__')
+    __getslice__ = _materializing('__getslice__')
+    __delslice__ = _materializing('__delslice__')
+    __contains__ = _materializing('__contains__')
+    __iadd__ = _materializing('__iadd__')
+    append = _materializing('append')
+    extend = _materializing('extend')
+    insert = _materializing('insert')
+    remove = _materializing('remove')
+    pop = _materializing('pop')
+    index = _materializing('index')
+    count = _materializing('count')
+    sort = _materializing('sort')
+    reverse = _materializing('reverse')
+
+    #===================================================
+
+    def pairs(self):
+        """
+        Returns an (npair, 2) array with every pair of atoms in the same term
+        """
+        nat = self.natom_per_term
+        return np.concatenate([self.atoms[:,[i,j]] for i in range(nat)
+                               for j in range(i+1, nat)])
+
+    #===================================================
+
+    def rows(self, selection=None):
+        """
+        Iterates over the terms without creating their objects
+
+        Parameters:
+            selection (list): If given, only terms with at least one atom for
+                which this per-atom list is nonzero are included
+
+        Yields:
+            Tuple of the atom indexes and the type of each term (and the signs,
+            for dihedrals)
+        """
+        atoms, types = self.atoms, self.types
+        if selection is not None:
+            sel = np.asarray(selection, dtype=bool)
+            keep = sel[atoms].any(axis=1)
+            atoms, types = atoms[keep], types[keep]
+        tl = self.type_list
+        columns = [atoms[:,i].tolist() for i in range(self.natom_per_term)]
+        columns.append([tl[t] for t in types.tolist()])
+        return zip(*columns)
+
+    #===================================================
+
+    def write_section(self, parm, section, new_index, type_index):
+        """
+        Writes the terms to a topology file section
+
+        Parameters:
+            parm (AmberParm): The topology to write to
+            section (str): The name of the section
+            new_index (numpy.ndarray): New index of every atom in atom_source
+                (-1 for deleted atoms). Terms with deleted atoms are dropped
+            type_index (numpy.ndarray): New index of every type in type_list
+
+        Returns:
+            The number of terms written
+        """
+        atoms = new_index[self.atoms]
+        keep = (atoms >= 0).all(axis=1)
+        self._keep(keep)
+        self.atoms = atoms[keep]
+        parm.parm_data[section] = self._encode(type_index).ravel().tolist()
+        return len(self.types)
+
+    def _keep(self, keep):
+        self.types = self.types[keep]
+
+    def _encode(self, type_index):
+        return np.column_stack((3 * self.atoms, type_index[self.types] + 1))
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+class BondArray(TermArray):
+    """ Bonds stored as arrays """
+    natom_per_term = 2
+    section_width = 3
+
+    _make_terms = staticmethod(make_bonds)
+
+class AngleArray(TermArray):
+    """ Angles stored as arrays """
+    natom_per_term = 3
+    section_width = 4
+
+    _make_terms = staticmethod(make_angles)
+
+class DihedralArray(TermArray):
+    """
+    Dihedrals stored as arrays. The signs attribute is an (nterm, 2) array with
+    the signs of the third and fourth atoms (-1 marks a multi-term dihedral
+    without 1-4 interactions and an improper, respectively)
+    """
+    natom_per_term = 4
+    section_width = 5
+
+    def __init__(self, parm, atoms, types, atom_source, type_list, signs):
+        TermArray.__init__(self, parm, atoms, types, atom_source, type_list)
+        self.signs = signs
+
+    @classmethod
+    def _from_raw(cls, parm, raw, atom_source, type_list):
+        signs = np.where(raw[:,2:4] < 0, -1, 1)
+        return cls(parm, np.abs(raw[:,:4]) // 3, raw[:,4] - 1, atom_source,
+                   type_list, signs)
+
+    _make_terms = staticmethod(make_dihedrals)
+
+    def _signs(self):
+        return self.signs.T.tolist()
+
+    def rows(self, selection=None):
+        atoms, types, signs = self.atoms, self.types, self.signs
+        if selection is not None:
+            keep = np.asarray(selection, dtype=bool)[atoms].any(axis=1)
+            atoms, types, signs = atoms[keep], types[keep], signs[keep]
+        tl = self.type_list
+        columns = [atoms[:,i].tolist() for i in range(4)]
+        columns.append([tl[t] for t in types.tolist()])
+        columns.append([tuple(s) for s in signs.tolist()])
+        return zip(*columns)
+
+    def _keep(self, keep):
+        self.types = self.types[keep]
+        self.signs = self.signs[keep]
+
+    def _encode(self, type_index):
+        # Atom index 0 cannot carry a negative sign in the third or fourth
+        # position, so those dihedrals are written in reverse order (see
+        # Dihedral.write_info)
+        atoms, signs = self.atoms, self.signs
+        swap = (((atoms[:,2] == 0) & (signs[:,0] == -1)) |
+                ((atoms[:,3] == 0) & (signs[:,1] == -1)))
+        ordered = np.where(swap[:,np.newaxis], atoms[:,::-1], atoms)
+        return np.column_stack((3 * ordered[:,:2],
+                                3 * ordered[:,2:] * signs,
+                                type_index[self.types] + 1))
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def term_rows(terms, selection=None):
+    """
+    Iterates over a list of bonds, angles, or dihedrals (either a TermArray or
+    a list of term objects) without creating any new objects
+
+    Parameters:
+        terms (TermArray or list): The terms to loop over
+        selection (list): If given, only terms with at least one atom for which
+            this per-atom list (indexed by starting_index) is nonzero are
+            included
+
+    Yields:
+        Tuple of the starting_index of each atom in the term followed by the
+        term type (and the signs, for dihedrals)
+    """
+    if isinstance(terms, TermArray) and not terms.materialized:
+        for row in terms.rows(selection):
+            yield row
+        return
+    for term in terms:
+        if isinstance(term, Dihedral):
+            row = (term.atom1.starting_index, term.atom2.starting_index,
+                   term.atom3.starting_index, term.atom4.starting_index,
+                   term.dihed_type, tuple(term.signs))
+        elif isinstance(term, Angle):
+            row = (term.atom1.starting_index, term.atom2.starting_index,
+                   term.atom3.starting_index, term.angle_type)
+        else:
+            row = (term.atom1.starting_index, term.atom2.starting_index,
+                   term.bond_type)
+        if selection is not None:
+            natom = len(row) - (2 if isinstance(term, Dihedral) else 1)
+            if not any([selection[i] for i in row[:natom]]):
+                continue
+        yield row
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def load_term_arrays(parm):
+    """
+    Sets up the bond, angle, and dihedral lists of a topology as TermArrays
+    from its topology file sections. The type lists must already be set up
+    """
+    src = list(parm.atom_list)
+    parm.bonds_inc_h = BondArray.from_section(parm, 'BONDS_INC_HYDROGEN',
+                            parm.ptr('nbonh'), src, parm.bond_type_list)
+    parm.bonds_without_h = BondArray.from_section(parm,
+                            'BONDS_WITHOUT_HYDROGEN', parm.ptr('mbona'), src,
+                            parm.bond_type_list)
+    parm.angles_inc_h = AngleArray.from_section(parm, 'ANGLES_INC_HYDROGEN',
+                            parm.ptr('ntheth'), src, parm.angle_type_list)
+    parm.angles_without_h = AngleArray.from_section(parm,
+                            'ANGLES_WITHOUT_HYDROGEN', parm.ptr('mtheta'), src,
+                            parm.angle_type_list)
+    parm.dihedrals_inc_h = DihedralArray.from_section(parm,
+                            'DIHEDRALS_INC_HYDROGEN', parm.ptr('nphih'), src,
+                            parm.dihedral_type_list)
+    parm.dihedrals_without_h = DihedralArray.from_section(parm,
+                            'DIHEDRALS_WITHOUT_HYDROGEN', parm.ptr('mphia'),
+                            src, parm.dihedral_type_list)
+    parm._terms_pending = parm._partners_pending = True
+    parm._partner_pairs = None
+
+#===================================================
+
+def load_term_objects(parm):
+    """
+    Sets up the bond, angle, and dihedral lists of a topology as TrackedLists of
+    term objects from its topology file sections. The sections are decoded in
+    bulk, and the partners of the atoms are registered once for every kind of
+    term rather than once per term. With numpy, only the pairs of partners are
+    kept, and the partner sets of the atoms are filled in from them the first
+    time any of them is needed (see register_partners). The type lists must
+    already be set up
+    """
+    src = parm.atom_list
+    pd = parm.parm_data
+    pending = dict()
+    kinds = ((make_bonds, 3, parm.bond_type_list, '_bond_set',
+              (('bonds_inc_h', 'BONDS_INC_HYDROGEN', 'nbonh'),
+               ('bonds_without_h', 'BONDS_WITHOUT_HYDROGEN', 'mbona'))),
+             (make_angles, 4, parm.angle_type_list, '_angle_set',
+              (('angles_inc_h', 'ANGLES_INC_HYDROGEN', 'ntheth'),
+               ('angles_without_h', 'ANGLES_WITHOUT_HYDROGEN', 'mtheta'))),
+             (make_dihedrals, 5, parm.dihedral_type_list, '_dihedral_set',
+              (('dihedrals_inc_h', 'DIHEDRALS_INC_HYDROGEN', 'nphih'),
+               ('dihedrals_without_h', 'DIHEDRALS_WITHOUT_HYDROGEN',
+                'mphia'))))
+    for make, width, type_list, slot, lists in kinds:
+        columns = [[] for i in range(width-1)]
+        for name, section, ptr in lists:
+            atoms, types, signs = decode_section(pd[section], parm.ptr(ptr),
+                                                 width, signed=width == 5)
+            setattr(parm, name,
+                    TrackedList(make(src, type_list, atoms, types, signs)))
+            for col, new in zip(columns, atoms):
+                col.extend(new)
+        if np is None:
+            add_partners(src, slot, columns)
+        else:
+            pending[slot] = _column_pairs(columns)
+    if np is not None:
+        parm._partner_pairs = (list(src), pending)
+        parm._partners_pending = True
+
+#===================================================
+
+def build_term_objects(parm):
+    """
+    Creates the Bond, Angle, and Dihedral objects of every term list. This also
+    registers all of the bonded, angled, and dihedral partners of the atoms
+    """
+    parm._terms_pending = False
+    for name in TERM_LISTS:
+        getattr(parm, name)._build()
+    # The new objects do not register their atoms as partners, so fill those
+    # in from the arrays unless that has been done already
+    if parm._partners_pending:
+        register_partners(parm)
+
+#===================================================
+
+def _neighbors(pairs, natom):
+    """
+    Returns the sorted unique directed pairs (both directions) of a set of atom
+    pairs as (first atoms, second atoms)
+    """
+    if not len(pairs):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    keys = np.concatenate((pairs[:,0] * natom + pairs[:,1],
+                           pairs[:,1] * natom + pairs[:,0]))
+    keys = np.unique(keys)
+    return keys // natom, keys % natom
+
+def bond_graph(parm):
+    """
+    Returns the bonded partners of every atom from the bond arrays in
+    compressed sparse row form, as (offsets, neighbors) lists: the atoms bonded
+    to atom i are neighbors[offsets[i]:offsets[i+1]]
+    """
+    src, pairs = partner_pairs(parm, '_bond_set')
+    natom = len(src)
+    first, second = _neighbors(pairs, natom)
+    offsets = np.searchsorted(first, np.arange(natom + 1))
+    return offsets.tolist(), second.tolist()
+
+def bond_lists(parm):
+    """
+    Returns the sorted list of the atoms bonded to every atom, straight from the
+    bond sections of the topology file (the bond array of a Molecule). A bond
+    that is listed twice appears twice
+    """
+    pd = parm.parm_data
+    natom = parm.ptr('natom')
+    pairs = np.concatenate([
+            _int_array(pd[flag][:3*nbond]).reshape((nbond, 3))[:,:2] // 3
+            for flag, nbond in (('BONDS_INC_HYDROGEN', parm.ptr('nbonh')),
+                                ('BONDS_WITHOUT_HYDROGEN', parm.ptr('mbona')))])
+    keys = np.sort(np.concatenate((pairs[:,0] * natom + pairs[:,1],
+                                   pairs[:,1] * natom + pairs[:,0])))
+    offsets = np.searchsorted(keys // natom, np.arange(natom + 1)).tolist()
+    partners = (keys % natom).tolist()
+    return [partners[offsets[i]:offsets[i+1]] for i in xrange(natom)]
+
+# The slot of each kind of partner set and the term lists that define them
+_PARTNER_KINDS = (('_bond_set', ('bonds_inc_h', 'bonds_without_h')),
+                  ('_angle_set', ('angles_inc_h', 'angles_without_h')),
+                  ('_dihedral_set', ('dihedrals_inc_h', 'dihedrals_without_h')))
+
+def partner_pairs(parm, slot):
+    """
+    Returns the atoms that the atom indexes refer to and an (npair, 2) array of
+    the atoms that are partners of the kind stored in slot, while the partners
+    of the topology have not been filled in yet. The pairs come from the term
+    arrays, or from the pairs load_term_objects kept
+    """
+    if parm._partner_pairs is not None:
+        src, pairs = parm._partner_pairs
+        return src, pairs[slot]
+    names = dict(_PARTNER_KINDS)[slot]
+    return parm.bonds_inc_h.atom_source, np.concatenate(
+            [getattr(parm, name).pairs() for name in names])
+
+def register_partners(parm):
+    """
+    Fills in the bonded, angled, and dihedral partner sets of every atom from
+    the term arrays (or the pairs kept by load_term_objects)
+    """
+    for slot, names in _PARTNER_KINDS:
+        src, pairs = partner_pairs(parm, slot)
+        _add_partner_pairs(src, slot, pairs)
+    parm._partners_pending = False
+    parm._partner_pairs = None
+
+def _add_partner_pairs(src, slot, pairs):
+    """
+    Adds each atom of every pair in an (npair, 2) array to the partner set of
+    the other atom stored in the given slot
+    """
+    first, second = _neighbors(pairs, len(src))
+    if not len(first): return
+    bounds = np.flatnonzero(np.diff(first)) + 1
+    starts = [0] + bounds.tolist()
+    ends = bounds.tolist() + [len(first)]
+    second = second.tolist()
+    for owner, start, end in zip(first[starts].tolist(), starts, ends):
+        atom = src[owner]
+        partners = set(map(src.__getitem__, second[start:end]))
+        current = getattr(atom, slot)
+        if current is None:
+            setattr(atom, slot, partners)
+        else:
+            current.update(partners)
+
+def add_partners(src, slot, atoms):
+    """
+    Registers every two atoms that are in the same term as partners of each
+    other
+
+    Parameters:
+        src (list): The atoms that the atom indexes refer to
+        slot (str): The slot of the partner sets (_bond_set, _angle_set, or
+            _dihedral_set)
+        atoms (list): List of the indexes of the first, second, etc. atom of
+            every term (see decode_section)
+    """
+    if np is not None:
+        _add_partner_pairs(src, slot, _column_pairs(atoms))
+        return
+    members = set()
+    for row in zip(*atoms):
+        term = [src[i] for i in row]
+        for atom in term:
+            partners = getattr(atom, slot)
+            if partners is None:
+                partners = set()
+                setattr(atom, slot, partners)
+            partners.update(term)
+        members.update(term)
+    # Every atom was added to its own partners above
+    for atom in members:
+        getattr(atom, slot).discard(atom)
+
+def _column_pairs(atoms):
+    """
+    Returns an (npair, 2) array of every two atoms that are in the same term,
+    from the atom index columns of the terms (see decode_section)
+    """
+    nat = len(atoms)
+    rows = np.array(atoms, dtype=np.int64).reshape((nat, -1)).T
+    return np.concatenate([rows[:,[i,j]] for i in range(nat)
+                           for j in range(i+1, nat)])
+
+#===================================================
+
+def _term_pairs(parm):
+    """ Every pair of atoms that share a bond, angle, or dihedral """
+    return np.concatenate([partner_pairs(parm, slot)[1]
+                           for slot, names in _PARTNER_KINDS])
+
+def _pair_keys(pairs, natom):
+    """ Unique keys of the unordered atom pairs """
+    lo = pairs.min(axis=1)
+    hi = pairs.max(axis=1)
+    return np.unique(lo * natom + hi)
+
+def _listed_exclusions(parm, natom):
+    """
+    Returns an (npair, 2) array with the two atoms of every entry in the
+    EXCLUDED_ATOMS_LIST section
+    """
+    numex = _int_array(parm.parm_data['NUMBER_EXCLUDED_ATOMS'][:natom])
+    exclist = _int_array(parm.parm_data['EXCLUDED_ATOMS_LIST'])
+    owners = np.repeat(np.arange(len(numex)), numex)[:len(exclist)]
+    excluded = exclist[:len(owners)] - 1
+    # Skip over placeholders (0 entries)
+    listed = excluded >= 0
+    return np.column_stack((owners[listed], excluded[listed]))
+
+def load_extra_exclusions(parm):
+    """
+    Finds the exclusions in the topology file that do not come from a bond,
+    angle, or dihedral and adds them to the atoms' exclusion partners. This is
+    the array equivalent of AtomList.find_extra_exclusions, for topologies
+    whose partners have not been filled in yet
+    """
+    src = partner_pairs(parm, '_bond_set')[0]
+    natom = len(src)
+    pairs = _listed_exclusions(parm, natom)
+    pairs = pairs[pairs[:,0] != pairs[:,1]]
+    if not len(pairs): return
+    extra = np.setdiff1d(_pair_keys(pairs, natom),
+                         _pair_keys(_term_pairs(parm), natom))
+    for lo, hi in zip((extra // natom).tolist(), (extra % natom).tolist()):
+        src[lo].exclude(src[hi])
+
+#===================================================
+
+def atom_index_map(parm):
+    """
+    Returns the index each atom of the term arrays' atom_source will have once
+    the atom list is re-indexed (-1 for atoms that have been deleted)
+    """
+    new_index = np.empty(len(parm.bonds_inc_h.atom_source), dtype=np.int64)
+    new_index.fill(-1)
+    for i, atom in enumerate(parm.atom_list):
+        new_index[atom.starting_index] = i
+    return new_index
+
+def _expand(keys, values, queries):
+    """
+    For sorted keys with matching values, returns (positions in queries, values)
+    for every value whose key matches each query
+    """
+    starts = np.searchsorted(keys, queries, 'left')
+    counts = np.searchsorted(keys, queries, 'right') - starts
+    total = counts.sum()
+    which = np.repeat(np.arange(len(queries)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return which, values[np.repeat(starts, counts) + offsets]
+
+def exclusion_lists(parm, new_index):
+    """
+    Determines the NUMBER_EXCLUDED_ATOMS and EXCLUDED_ATOMS_LIST sections from
+    the term arrays and the arbitrary exclusions of the atoms, including the
+    exclusions of extra points (see AtomList._determine_exclusions)
+
+    Parameters:
+        parm (AmberParm): The topology
+        new_index (numpy.ndarray): Result of atom_index_map
+
+    Returns:
+        (NUMBER_EXCLUDED_ATOMS, EXCLUDED_ATOMS_LIST) as lists
+    """
+    src = parm.bonds_inc_h.atom_source
+    natom = len(src)
+    pairs = [_term_pairs(parm)]
+    for atom in src:
+        if not atom._exclusion_set: continue
+        pairs.append(np.array([(atom.starting_index, other.starting_index)
+                               for other in atom._exclusion_set],
+                              dtype=np.int64))
+    keys = _pair_keys(np.concatenate(pairs), natom)
+    first, second = _neighbors(np.column_stack((keys // natom, keys % natom)),
+                               natom)
+    # Extra points are excluded from every atom the atom they are bonded to
+    # (the one with the lowest index) is excluded from, and from the other
+    # extra points whose parent atoms are excluded from their own parent atom
+    eps = np.array([atom.starting_index for atom in parm.atom_list
+                    if atom.attype[:2] in ('EP', 'LP')], dtype=np.int64)
+    if len(eps):
+        bond_first, bond_second = _neighbors(np.concatenate(
+                [parm.bonds_inc_h.pairs(), parm.bonds_without_h.pairs()]),
+                natom)
+        has_parent = np.in1d(eps, bond_first)
+        eps = eps[has_parent]
+        parents = bond_second[np.searchsorted(bond_first, eps)]
+        which, partners = _expand(first, second, parents)
+        ep_pairs = [np.column_stack((eps[which], partners))]
+        order = np.argsort(parents, kind='mergesort')
+        which2, others = _expand(parents[order], eps[order], partners)
+        ep_pairs.append(np.column_stack((eps[which][which2], others)))
+        ep_pairs = np.concatenate(ep_pairs)
+        ep_pairs = ep_pairs[ep_pairs[:,0] != ep_pairs[:,1]]
+        keys = np.union1d(keys, _pair_keys(ep_pairs, natom))
+    # Translate to the new atom indexes and drop any deleted atoms
+    pairs = new_index[np.column_stack((keys // natom, keys % natom))]
+    pairs = pairs[(pairs >= 0).all(axis=1)]
+    return _exclusion_sections(pairs, len(parm.atom_list))
+
+def _exclusion_sections(pairs, natom):
+    """
+    Returns the NUMBER_EXCLUDED_ATOMS and EXCLUDED_ATOMS_LIST sections (as
+    lists) for the given (npair, 2) array of excluded atom pairs
+    """
+    keys = _pair_keys(pairs, natom)
+    lo, hi = keys // natom, keys % natom
+    counts = np.bincount(lo, minlength=natom)
+    # Atoms without any exclusions get a single 0 placeholder
+    numex = np.maximum(counts, 1)
+    offsets = np.cumsum(numex) - numex
+    exclist = np.zeros(numex.sum(), dtype=np.int64)
+    rank = np.arange(len(lo)) - (np.cumsum(counts) - counts)[lo]
+    exclist[offsets[lo] + rank] = hi + 1
+    return numex.tolist(), exclist.tolist()
+
+#===================================================
+
+def _canonical_types(keys):
+    """
+    Returns the position of the first type with the same key for each of the
+    given type keys, so equal types are written as a single type
+    """
+    first = dict()
+    return np.array([first.setdefault(key, i) for i, key in enumerate(keys)],
+                    dtype=np.int64)
+
+def _number_types(canonical, arrays):
+    """
+    Numbers the canonical types used by the given term arrays in the order they
+    are first used
+
+    Returns:
+        (type_index, used) -- array with the new index of every type (-1 if
+        unused) and the positions of the used canonical types in index order
+    """
+    used = _first_used(arrays, canonical)
+    number = np.empty(len(canonical), dtype=np.int64)
+    number.fill(-1)
+    number[used] = np.arange(len(used))
+    return number[canonical], used
+
+def _type_index(type_list, arrays):
+    """
+    Numbers the types used by the given term arrays in the order they are first
+    used, giving equal types the same index, and sets the idx of each of those
+    types
+
+    Returns:
+        (type_index, ntypes) -- array with the new index of every type in
+        type_list (-1 if unused) and the number of distinct types used
+    """
+    canonical = _canonical_types([typ.key for typ in type_list])
+    type_index, used = _number_types(canonical, arrays)
+    for typ, i in zip(type_list, type_index.tolist()):
+        if i >= 0: typ.idx = i
+    return type_index, len(used)
+
+def _first_used(arrays, canonical):
+    """
+    The canonical types used by the given term arrays in the order of first use
+    """
+    used = np.concatenate([arr.types for arr in arrays])
+    if not len(used):
+        return used
+    unique, first = np.unique(canonical[used], return_index=True)
+    return unique[np.argsort(first)]
+
+def write_term_sections(parm, new_index):
+    """
+    Writes the bond, angle, and dihedral sections (and their type sections) of
+    a topology from its term arrays. Terms with deleted atoms are dropped from
+    the arrays, whose atom indexes then refer to the re-indexed atom list.
+
+    Returns:
+        dict with the number of terms of each list and of each type list, keyed
+        by pointer name
+    """
+    src = list(parm.atom_list)
+    counts = {}
+    groups = ((parm.bond_type_list, 'NUMBND',
+               (('bonds_inc_h', 'BONDS_INC_HYDROGEN', 'NBONH'),
+                ('bonds_without_h', 'BONDS_WITHOUT_HYDROGEN', 'MBONA'))),
+              (parm.angle_type_list, 'NUMANG',
+               (('angles_inc_h', 'ANGLES_INC_HYDROGEN', 'NTHETH'),
+                ('angles_without_h', 'ANGLES_WITHOUT_HYDROGEN', 'MTHETA'))),
+              (parm.dihedral_type_list, 'NPTRA',
+               (('dihedrals_inc_h', 'DIHEDRALS_INC_HYDROGEN', 'NPHIH'),
+                ('dihedrals_without_h', 'DIHEDRALS_WITHOUT_HYDROGEN',
+                 'MPHIA'))))
+    for type_list, type_ptr, lists in groups:
+        arrays = [getattr(parm, name) for name, section, ptr in lists]
+        # Only the types of terms whose atoms all still exist are written
+        for arr in arrays:
+            keep = (new_index[arr.atoms] >= 0).all(axis=1)
+            if not keep.all():
+                arr._keep(keep)
+                arr.atoms = arr.atoms[keep]
+        type_index, ntypes = _type_index(type_list, arrays)
+        for arr, (name, section, ptr) in zip(arrays, lists):
+            counts[ptr] = arr.write_section(parm, section, new_index,
+                                            type_index)
+            arr.atom_source = src
+        counts[type_ptr] = ntypes
+    return counts
+
+#===================================================
+
+# The sections of each kind of term in an Amber topology file (with the pointers
+# counting their terms), the sections with the parameters of their types, and
+# the pointer counting the types
+TERM_SECTIONS = ((BondArray, (('BONDS_INC_HYDROGEN', 'NBONH'),
+                               ('BONDS_WITHOUT_HYDROGEN', 'MBONA')),
+                  ('BOND_FORCE_CONSTANT', 'BOND_EQUIL_VALUE'), 'NUMBND'),
+                 (AngleArray, (('ANGLES_INC_HYDROGEN', 'NTHETH'),
+                               ('ANGLES_WITHOUT_HYDROGEN', 'MTHETA')),
+                  ('ANGLE_FORCE_CONSTANT', 'ANGLE_EQUIL_VALUE'), 'NUMANG'),
+                 (DihedralArray, (('DIHEDRALS_INC_HYDROGEN', 'NPHIH'),
+                                  ('DIHEDRALS_WITHOUT_HYDROGEN', 'MPHIA')),
+                  ('DIHEDRAL_FORCE_CONSTANT', 'DIHEDRAL_PERIODICITY',
+                   'DIHEDRAL_PHASE', 'SCEE_SCALE_FACTOR', 'SCNB_SCALE_FACTOR'),
+                  'NPTRA'))
+
+def strip_index_map(keep):
+    """
+    Returns the new index of every atom once the atoms for which keep is False
+    are deleted (-1 for those atoms)
+    """
+    new_index = np.cumsum(keep) - 1
+    new_index[np.logical_not(keep)] = -1
+    return new_index
+
+def strip_term_sections(parm, new_index):
+    """
+    Removes every term with a deleted atom from the bond, angle, and dihedral
+    sections of a topology and re-indexes the atoms of the others. Only the
+    parameters of the types that are still used are kept (once for equal
+    types), numbered in the order they are first used (the same order
+    remake_parm writes them in)
+
+    Parameters:
+        parm (AmberParm): The topology, whose sections are modified
+        new_index (numpy.ndarray): Result of strip_index_map
+
+    Returns:
+        dict with the number of terms of each section and of each kind of type,
+        keyed by pointer name
+    """
+    counts = {}
+    pd = parm.parm_data
+    for cls, lists, type_sections, type_ptr in TERM_SECTIONS:
+        arrays = [cls.from_section(parm, section, parm.ptr(ptr), None, None)
+                  for section, ptr in lists]
+        for arr in arrays:
+            keep = (new_index[arr.atoms] >= 0).all(axis=1)
+            arr._keep(keep)
+            arr.atoms = arr.atoms[keep]
+        # Types are equal if all of their parameters are (as for their keys)
+        keys = zip(*[pd[section] for section in type_sections
+                     if section in pd])
+        type_index, used = _number_types(_canonical_types(keys), arrays)
+        for arr, (section, ptr) in zip(arrays, lists):
+            counts[ptr] = arr.write_section(parm, section, new_index,
+                                            type_index)
+        used = used.tolist()
+        for section in type_sections:
+            if not section in pd: continue
+            values = pd[section]
+            pd[section] = [values[i] for i in used]
+        counts[type_ptr] = len(used)
+    return counts
+
+def strip_exclusions(parm, new_index):
+    """
+    Removes the deleted atoms from the NUMBER_EXCLUDED_ATOMS and
+    EXCLUDED_ATOMS_LIST sections and re-indexes the remaining atoms
+
+    Returns:
+        (NUMBER_EXCLUDED_ATOMS, EXCLUDED_ATOMS_LIST) as lists
+    """
+    pairs = new_index[_listed_exclusions(parm, len(new_index))]
+    pairs = pairs[(pairs >= 0).all(axis=1) & (pairs[:,0] != pairs[:,1])]
+    return _exclusion_sections(pairs, int((new_index >= 0).sum()))
+
+def strip_molecules(parm, keep):
+    """
+    Determines the ATOMS_PER_MOLECULE section once the atoms for which keep is
+    False are deleted, as long as that can be done from the current section: it
+    must cover every atom, every bond must be within a single molecule, and
+    every molecule must either be deleted entirely or not at all. Call this
+    before the bond sections are stripped
+
+    Returns:
+        numpy.ndarray with the number of atoms in each remaining molecule, or
+        None if the molecules have to be determined from the bonds again
+    """
+    sizes = _int_array(parm.parm_data['ATOMS_PER_MOLECULE'])
+    if sizes.sum() != len(keep) or (sizes <= 0).any():
+        return None
+    molecule = np.repeat(np.arange(len(sizes)), sizes)
+    for section, ptr in (('BONDS_INC_HYDROGEN', 'nbonh'),
+                         ('BONDS_WITHOUT_HYDROGEN', 'mbona')):
+        bonds = BondArray.from_section(parm, section, parm.ptr(ptr), None, None)
+        if (molecule[bonds.atoms[:,0]] != molecule[bonds.atoms[:,1]]).any():
+            return None
+    remaining = np.bincount(molecule[keep], minlength=len(sizes))
+    if ((remaining > 0) & (remaining < sizes)).any():
+        return None
+    return remaining[remaining > 0]
@@ -22,7 +22,7 @@ from chemistry.amber.topologyobjects import (_TypeList, TrackedList,
             Angle as _Angle,
             UreyBradleyType as _UreyBradleyType,
             AngleType as _AngleType,
-            Cmap as _Cmap)
+            Cmap as _Cmap, _vector_component)
 
 def _protector(func):
     """
@@ -81,17 +81,24 @@ class Atom(object):
         self.multipoles = parm_data['AMOEBA_LOCAL_FRAME_MULTIPOLES_LIST'] \
                                                 [10*si:10*si+10]
         self.polar = parm_data['AMOEBA_POLARIZABILITY_LIST'][si]
-        if hasattr(self.parm, 'coords'):
-            self.xx = self.parm.coords[si*3  ]
-            self.xy = self.parm.coords[si*3+1]
-            self.xz = self.parm.coords[si*3+2]
-            if self.parm.hasvels:
-                self.vx = self.parm.vels[si*3  ]
-                self.vy = self.parm.vels[si*3+1]
-                self.vz = self.parm.vels[si*3+2]
+        if self.parm._coordinate_array is not None:
+            self._xyz = self.parm._coordinate_array[si]
+        if self.parm._velocity_array is not None:
+            self._vxyz = self.parm._velocity_array[si]
    
     #===================================================
 
+    # Positions and velocities, stored in the arrays of the parm
+
+    xx = _vector_component('_xyz', 0)
+    xy = _vector_component('_xyz', 1)
+    xz = _vector_component('_xyz', 2)
+    vx = _vector_component('_vxyz', 0)
+    vy = _vector_component('_vxyz', 1)
+    vz = _vector_component('_vxyz', 2)
+
+    #===================================================
+
     # Make 'element' an alias for 'atomic_number'
 
     @property
@@ -325,6 +332,23 @@ class AtomList(list):
         self.changed = True
 
     #===================================================
+
+    def delete_atoms(self, selection):
+        """
+        Deletes every atom for which selection is nonzero at once, which is much
+        faster than deleting them one at a time
+        """
+        remaining = []
+        for atm, sel in zip(self, selection):
+            if sel:
+                atm.idx = -1
+            else:
+                remaining.append(atm)
+        if len(remaining) == len(self): return
+        list.__setitem__(self, slice(None), remaining)
+        self.changed = True
+
+    #===================================================
    
     def unmark(self):
         """ Unmark all atoms in this list """
@@ -411,6 +435,7 @@ class AtomList(list):
         """
         for atm in self:
             atm.load_from_parm()
+        self.parm.data_changed()
 
     #===================================================
 
@@ -18,85 +18,215 @@ from chemistry.exceptions import (BondError, DihedralError, AmberParmError,
 from chemistry.amber.constants import NATOM, TINY
 from chemistry.periodic_table import AtomicNum, Mass, Element as _Element
 from compat24 import all, property
+from itertools import count, izip
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 __all__ = ['Atom', 'Bond', 'BondType', 'Angle', 'AngleType', 'Dihedral',
            'DihedralType', 'Residue', 'ResidueList', 'AtomList', 'BondTypeList',
-           'AngleTypeList', 'DihedralTypeList', 'TrackedList']
+           'AngleTypeList', 'DihedralTypeList', 'TrackedList', 'PartnerIndex']
+
+# Shared by every atom that has no partners of a given kind
+_NO_PARTNERS = frozenset()
+
+def _lazy_list(slot, from_arrays=False):
+    """
+    Returns a property for a list of terms stored in the given slot. The list is
+    only created the first time it is needed, so atoms that are not in any term
+    of that kind do not each carry an empty list. If from_arrays is True and the
+    terms of the topology are still only stored as arrays (see termarrays), the
+    term objects are created first
+    """
+    def fget(self):
+        terms = getattr(self, slot)
+        if terms is None:
+            if from_arrays and getattr(self.parm, '_terms_pending', False):
+                self.parm._build_term_objects()
+                terms = getattr(self, slot)
+            if terms is None:
+                terms = []
+                setattr(self, slot, terms)
+        return terms
+    def fset(self, value):
+        setattr(self, slot, value)
+    return property(fget, fset)
+
+def _partner_set(slot):
+    """
+    Returns a read-only property for the set of partners stored in the given
+    slot. Atoms without any partners of that kind share a single empty
+    frozenset. If the partners of the topology have not been filled in from its
+    term arrays yet (see termarrays), that is done first
+    """
+    def fget(self):
+        partners = getattr(self, slot)
+        if partners is None:
+            self._fill_partners()
+            partners = getattr(self, slot)
+        return partners or _NO_PARTNERS
+    return property(fget)
+
+def _vector_component(slot, k):
+    """
+    Returns a property for component k of the vector stored in the given slot,
+    which is the atom's row of the coordinate or velocity array of the topology
+    (so the atoms and the topology share a single copy of the data). An atom
+    whose parm has no such array gets a vector of its own once it is set
+    """
+    def fget(self):
+        return getattr(self, slot)[k]
+    def fset(self, value):
+        try:
+            getattr(self, slot)[k] = value
+        except AttributeError:
+            vector = [0.0, 0.0, 0.0]
+            vector[k] = value
+            setattr(self, slot, vector)
+    return property(fget, fset)
+
 
 class Atom(object):
     """ 
     An atom. Only use these as elements in AtomList instances, since AtomList
     will keep track of when indexes and other stuff needs to be updated
+
+    The partner sets and term lists are only created once the atom is actually
+    involved in something of that kind (use bonds, angles, etc. and
+    _bond_partners, _angle_partners, etc. rather than the slots they are stored
+    in)
     """
+    __slots__ = ('atomic_number', '_bond_set', '_angle_set', '_dihedral_set',
+                 '_exclusion_set', 'parm', 'idx', 'starting_index', 'residue',
+                 'marked', '_bonds', '_angles', '_dihedrals', '_urey_bradleys',
+                 '_impropers', '_cmaps', 'deleted', '_has_loaded_exclusions',
+                 'atname', 'charge', 'mass', 'nb_idx', 'attype', 'tree',
+                 'radii', 'screen', '_xyz', '_vxyz')
+
     #===================================================
 
     def __init__(self, parm, starting_index):
         self.atomic_number = 0
-        self._bond_partners = set()
-        self._angle_partners = set()
-        self._dihedral_partners = set()
-        self._exclusion_partners = set() # For arbitrary exclusions
+        self._bond_set = None
+        self._angle_set = None
+        self._dihedral_set = None
+        self._exclusion_set = None # For arbitrary exclusions
         self.parm = parm
         self.idx = -1
         self.starting_index = starting_index
         self.load_from_parm()
         self.residue = None
         self.marked = 0 # For setting molecules
-        self.bonds, self.angles, self.dihedrals = [], [], []
+        self._bonds = self._angles = self._dihedrals = None
         # Chamber properties
-        self.urey_bradleys, self.impropers, self.cmaps = [], [], []
+        self._urey_bradleys = self._impropers = self._cmaps = None
         self.deleted = False
         self._has_loaded_exclusions = False
    
     #===================================================
 
+    bonds = _lazy_list('_bonds', True)
+    angles = _lazy_list('_angles', True)
+    dihedrals = _lazy_list('_dihedrals', True)
+    urey_bradleys = _lazy_list('_urey_bradleys')
+    impropers = _lazy_list('_impropers')
+    cmaps = _lazy_list('_cmaps')
+
+    #===================================================
+
+    # Positions and velocities, stored in the arrays of the parm
+
+    xx = _vector_component('_xyz', 0)
+    xy = _vector_component('_xyz', 1)
+    xz = _vector_component('_xyz', 2)
+    vx = _vector_component('_vxyz', 0)
+    vy = _vector_component('_vxyz', 1)
+    vz = _vector_component('_vxyz', 2)
+
+    #===================================================
+
+    # Read-only views of the partner sets
+
+    _bond_partners = _partner_set('_bond_set')
+    _angle_partners = _partner_set('_angle_set')
+    _dihedral_partners = _partner_set('_dihedral_set')
+
+    @property
+    def _exclusion_partners(self):
+        return self._exclusion_set or _NO_PARTNERS
+
+    def _fill_partners(self):
+        """
+        Fills in the partners of every atom from the term arrays of the topology
+        if that has not been done yet
+        """
+        if getattr(self.parm, '_partners_pending', False):
+            self.parm._register_partners()
+
+    #===================================================
+
+    # The sorted partner lists are read from the partner index of the topology
+    # (see PartnerIndex), so they are only worked out once for every atom
+
     @property
     def bond_partners(self):
         """ Go through all bonded partners """
-        return sorted(list(self._bond_partners))
+        return self._partner_list(PartnerIndex.BOND)
 
     @property
     def angle_partners(self):
         """ List of all angle partners that are NOT bond partners """
-        return sorted(list(self._angle_partners - self._bond_partners))
+        return self._partner_list(PartnerIndex.ANGLE)
 
     @property
     def dihedral_partners(self):
         " List of all dihedral partners that are NOT angle or bond partners "
-        return sorted(list(self._dihedral_partners - self._angle_partners -
-                           self._bond_partners))
+        return self._partner_list(PartnerIndex.DIHEDRAL)
 
     @property
     def exclusion_partners(self):
         """
         List of all exclusions not otherwise excluded by bonds/angles/torsions
         """
-        return sorted(list(self._exclusion_partners - self._dihedral_partners -
-                           self._angle_partners - self._bond_partners))
+        return self._partner_list(PartnerIndex.EXCLUSION)
+
+    def _partner_list(self, kind):
+        """ Sorted list of the partners of the given kind """
+        partners = self.parm.atom_list.partner_index().partners(self, kind)
+        if partners is None:
+            # Atoms that are not in the atom list (e.g., deleted ones) are not
+            # in the index either
+            partners = sorted(PartnerIndex.partner_sets(self)[kind])
+        return partners
+
+    def _partners_changed(self):
+        """ Throws away the partner index of the topology """
+        self.parm._partner_index = None
 
     #===================================================
 
-    def add_data(self):
+    def add_data(self, numex=None):
         """ 
         Writes this atom's data to the AmberParm object. Don't pitch a fit if
         we're missing some useless (unused) flags.
+
+        Parameters:
+            numex (int): The number of entries this atom has in
+                EXCLUDED_ATOMS_LIST. If None, it is determined from the atoms
+                this one is excluded from
         """
-        # Determine how many excluded atoms we have. The only ones that count
-        # are those with a smaller index (to avoid double-counting)
-        numex = 0
-        for atm in self.bond_partners:
-            if atm.idx > self.idx: numex += 1
-        for atm in self.angle_partners:
-            if atm.idx > self.idx: numex += 1
-        for atm in self.dihedral_partners:
-            if atm.idx > self.idx: numex += 1
-        for atm in self.exclusion_partners:
-            if atm.idx > self.idx: numex += 1
-        # For some reason, existing topology files follow the convention that
-        # atoms with no exclusions (because all bonded partners have atom #s
-        # lower than theirs) have num_excluded = 1, with a 0 placeholder in
-        # EXCLUDED_ATOMS_LIST... Weird.
-        if numex == 0: numex = 1
+        if numex is None:
+            # Determine how many excluded atoms we have. The only ones that
+            # count are those with a smaller index (to avoid double-counting)
+            numex = 0
+            for atm in self.excluded_atoms():
+                if atm.idx > self.idx: numex += 1
+            # For some reason, existing topology files follow the convention
+            # that atoms with no exclusions (because all bonded partners have
+            # atom #s lower than theirs) have num_excluded = 1, with a 0
+            # placeholder in EXCLUDED_ATOMS_LIST... Weird.
+            if numex == 0: numex = 1
         # Make sure we're indexing from 0
         parm_data = self.parm.parm_data
         parm_data['ATOM_NAME'][self.idx] = self.atname[:4]
@@ -154,38 +284,40 @@ class Atom(object):
             if self.atomic_number <= 0:
                 self.atomic_number = AtomicNum[Element(self.mass)]
 
-        # Load the positions and velocities if the amberParm object them
-        if hasattr(self.parm, 'coords'):
-            self.xx = self.parm.coords[si*3  ]
-            self.xy = self.parm.coords[si*3+1]
-            self.xz = self.parm.coords[si*3+2]
-            if self.parm.hasvels:
-                self.vx = self.parm.vels[si*3  ]
-                self.vy = self.parm.vels[si*3+1]
-                self.vz = self.parm.vels[si*3+2]
+        # Share the positions and velocities if the amberParm object has them
+        if self.parm._coordinate_array is not None:
+            self._xyz = self.parm._coordinate_array[si]
+        if self.parm._velocity_array is not None:
+            self._vxyz = self.parm._velocity_array[si]
 
     #===================================================
       
-    def load_exclusions(self):
+    def load_exclusions(self, first_excl=None):
         """
         Looks at the NUMBER_EXCLUDED_ATOMS and EXCLUDED_ATOMS_LIST to determine
         if the topology file defines more atom exclusions than what is defined
         simply by the bonds, angles, and dihedrals. It then adds these atoms to
         the exclusion_partners array. Only allow this to occur once, though,
         since exclusions are remembered for the life of the object
+
+        Parameters:
+            first_excl (int): Index of this atom's first entry in
+                EXCLUDED_ATOMS_LIST. If None, it is computed by adding up
+                NUMBER_EXCLUDED_ATOMS for every preceding atom. Use
+                AtomList.find_extra_exclusions to load the exclusions of every
+                atom at once
         """
         if self._has_loaded_exclusions:
             return
-        excset = set()
         exclat = self.parm.parm_data['NUMBER_EXCLUDED_ATOMS']
         exclist = self.parm.parm_data['EXCLUDED_ATOMS_LIST']
-        first_excl = sum(exclat[:self.starting_index])
+        if first_excl is None:
+            first_excl = sum(exclat[:self.starting_index])
         nexcl = exclat[self.starting_index]
-        for i in range(nexcl):
-            idx = exclist[first_excl+i] - 1
-            # Skip over placeholders
-            if idx < 0: continue
-            excset.add(self.parm.atom_list[idx])
+        atom_list = self.parm.atom_list
+        # Skip over placeholders (0 entries)
+        excset = set([atom_list[idx-1] for idx in
+                      exclist[first_excl:first_excl+nexcl] if idx > 0])
         # Now subtract off all of the bonds, angles, and dihedrals
         excset = (excset - self._bond_partners - self._angle_partners -
                   self._dihedral_partners)
@@ -199,7 +331,12 @@ class Atom(object):
         """ Log this atom as bonded to another atom.  """
         if self is other:
             raise BondError("Cannot bond atom to itself!")
-        self._bond_partners.add(other)
+        if self._bond_set is None:
+            self._fill_partners()
+            if self._bond_set is None:
+                self._bond_set = set()
+        self._bond_set.add(other)
+        self._partners_changed()
 
     #===================================================
       
@@ -207,7 +344,12 @@ class Atom(object):
         """ Log this atom as angled to another atom.  """
         if self is other:
             raise BondError("Cannot angle an atom with itself!")
-        self._angle_partners.add(other)
+        if self._angle_set is None:
+            self._fill_partners()
+            if self._angle_set is None:
+                self._angle_set = set()
+        self._angle_set.add(other)
+        self._partners_changed()
    
     #===================================================
 
@@ -215,7 +357,12 @@ class Atom(object):
         """ Log this atom as dihedral-ed to another atom.  """
         if self is other:
             raise BondError("Cannot dihedral an atom with itself!")
-        self._dihedral_partners.add(other)
+        if self._dihedral_set is None:
+            self._fill_partners()
+            if self._dihedral_set is None:
+                self._dihedral_set = set()
+        self._dihedral_set.add(other)
+        self._partners_changed()
       
     #===================================================
 
@@ -223,20 +370,37 @@ class Atom(object):
         """ Add one atom to my arbitrary exclusion list """
         if self is other:
             raise BondError("Cannot exclude an atom from itself")
-        self._exclusion_partners.add(other)
+        if self._exclusion_set is None:
+            self._exclusion_set = set()
+        self._exclusion_set.add(other)
         # If he is excluded from me, then I am excluded from him
-        other._exclusion_partners.add(self)
+        if other._exclusion_set is None:
+            other._exclusion_set = set()
+        other._exclusion_set.add(self)
+        self._partners_changed()
 
     #===================================================
 
-    def reset_topology(self):
+    def excluded_atoms(self):
+        """
+        Set of every atom excluded from this one by a bond, angle, dihedral, or
+        arbitrary exclusion
+        """
+        return set().union(self._bond_partners, self._angle_partners,
+                           self._dihedral_partners, self._exclusion_partners)
+
+    #===================================================
+
+    def reset_topology(self, bonds=True, angles=True, dihedrals=True):
         """
         Deletes all of the bond, angle, and dihedral partners so they can be set
-        up again with updated data. Keep the arbitrary exclusions, though
+        up again with updated data. Keep the arbitrary exclusions, though. Pass
+        False for a kind of partner to keep those as well
         """
-        self._bond_partners = set()
-        self._angle_partners = set()
-        self._dihedral_partners = set()
+        if bonds: self._bond_set = None
+        if angles: self._angle_set = None
+        if dihedrals: self._dihedral_set = None
+        self._partners_changed()
 
     #===================================================
 
@@ -264,6 +428,7 @@ class Atom(object):
 
 class Bond(object):
     """ Bond class. Stores 2 atoms involved and force constant/equil value """
+    __slots__ = ('atom1', 'atom2', 'bond_type')
 
     #===================================================
 
@@ -307,6 +472,7 @@ class Bond(object):
 
 class BondType(object):
     """ A bond type """
+    __slots__ = ('idx', 'k', 'req')
 
     #===================================================
 
@@ -330,10 +496,16 @@ class BondType(object):
     def __eq__(self, other):
         return self.k == other.k and self.req == other.req
 
+    @property
+    def key(self):
+        """ Hashable key that is the same for all equal bond types """
+        return (self.k, self.req)
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 class Angle(object):
     """ Angle class. Stores 3 atoms involved and force constant/equil value """
+    __slots__ = ('atom1', 'atom2', 'atom3', 'angle_type')
       
     #===================================================
 
@@ -387,6 +559,7 @@ class Angle(object):
 
 class AngleType(object):
     """ An angle type """
+    __slots__ = ('k', 'theteq', 'idx')
     #===================================================
 
     def __init__(self, k, theteq, idx):
@@ -409,12 +582,18 @@ class AngleType(object):
     def __eq__(self, other):
         return self.k == other.k and self.theteq == other.theteq
 
+    @property
+    def key(self):
+        """ Hashable key that is the same for all equal angle types """
+        return (self.k, self.theteq)
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 class Dihedral(object):
     """
     Dihedral class with 4 atoms involved and force constant/periodicity/phase
     """
+    __slots__ = ('atom1', 'atom2', 'atom3', 'atom4', 'dihed_type', 'signs')
       
     #===================================================
 
@@ -537,6 +716,7 @@ class Dihedral(object):
 
 class DihedralType(object):
     """ A type of dihedral """
+    __slots__ = ('phi_k', 'per', 'phase', 'scee', 'scnb', 'idx')
 
     #===================================================
    
@@ -574,10 +754,16 @@ class DihedralType(object):
                 self.phase == other.phase and self.scee == other.scee and
                 self.scnb == other.scnb)
 
+    @property
+    def key(self):
+        """ Hashable key that is the same for all equal dihedral types """
+        return (self.phi_k, self.per, self.phase, self.scee, self.scnb)
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 class UreyBradley(object):
     " Urey-Bradley class. Stores 2 atoms involved, force constant/equil value "
+    __slots__ = ('atom1', 'atom2', 'ub_type')
 
    #===================================================
 
@@ -627,7 +813,7 @@ class UreyBradley(object):
             # If we are here, end1 and cent are set. Look through the bond
             # partners of cent(er) and see if any of them is in this
             # Urey-Bradley (but ONLY if that atom is not the original end1)
-            for atm in cent.bonds():
+            for atm in cent.bond_partners:
                 if atm is end1: continue
                 if atm in self:
                 # If we got here, we found both atoms in this Urey-Bradley
@@ -644,6 +830,7 @@ class UreyBradley(object):
 
 class UreyBradleyType(object):
     """ A Urey-Bradley type """
+    __slots__ = ('idx', 'k', 'req')
 
     #===================================================
 
@@ -667,10 +854,16 @@ class UreyBradleyType(object):
     def __eq__(self, other):
         return self.k == other.k and self.req == other.req
 
+    @property
+    def key(self):
+        """ Hashable key that is the same for all equal Urey-Bradley types """
+        return (self.k, self.req)
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 class Improper(object):
     """ Improper class with 4 atoms involved and force constant/phase """
+    __slots__ = ('atom1', 'atom2', 'atom3', 'atom4', 'improp_type')
       
     #===================================================
 
@@ -764,6 +957,7 @@ class Improper(object):
 
 class ImproperType(object):
     """ A type of improper torsion """
+    __slots__ = ('psi_k', 'psi_eq', 'idx')
 
     #===================================================
    
@@ -787,10 +981,16 @@ class ImproperType(object):
     def __eq__(self, other):
         return self.psi_k == other.psi_k and self.psi_eq == other.psi_eq
 
+    @property
+    def key(self):
+        """ Hashable key that is the same for all equal improper types """
+        return (self.psi_k, self.psi_eq)
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 class Cmap(object):
     """ A coupled-torsion correction map term """
+    __slots__ = ('atom1', 'atom2', 'atom3', 'atom4', 'atom5', 'cmap_type')
 
     #===================================================
 
@@ -887,6 +1087,7 @@ class Cmap(object):
 
 class CmapType(object):
     """ Contains a correction map interpolation grid """
+    __slots__ = ('resolution', 'grid', 'comments', 'idx')
 
     #===================================================
 
@@ -1027,15 +1228,34 @@ class _CmapGrid(object):
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
+def _residue_attribute(slot):
+    """
+    Returns a property for a residue attribute that AmberMask selects atoms by.
+    Setting it on a residue that has atoms calls data_changed of their topology,
+    so no selection cached before the change is used afterwards
+    """
+    def fget(self):
+        return getattr(self, slot)
+    def fset(self, value):
+        setattr(self, slot, value)
+        if self.atoms: self.atoms[0].parm.data_changed()
+    return property(fget, fset)
+
 class Residue(object):
     """ Residue class """
 
     def __init__(self, resname, idx):
+        self.atoms = []
         self.resname = resname
         self.idx = idx
-        self.atoms = []
+
+    resname = _residue_attribute('_resname')
+    idx = _residue_attribute('_idx')
 
     def add_atom(self, atom):
+        # Moving an atom into another residue changes the masks it matches
+        if getattr(atom, 'residue', None) is not None:
+            atom.parm.data_changed()
         atom.residue = self
         self.atoms.append(atom)
 
@@ -1073,7 +1293,215 @@ class ResidueList(list):
             for j in range(start, end):
                 self[i].add_atom(parm.atom_list[j])
         self.parm = parm
-   
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+class PartnerIndex(object):
+    """
+    The bonded, angled (1-3), dihedral (1-4), and arbitrarily excluded partners
+    of every atom of an AtomList in compressed sparse row form. For each kind of
+    partner (BOND, ANGLE, DIHEDRAL, or EXCLUSION), the partners of the atom at
+    position i of the atom list are neighbors[kind][offsets[kind][i]:
+    offsets[kind][i+1]] (positions in the atom list, or -1 for partners that are
+    not in it). Like Atom.bond_partners, Atom.angle_partners, etc., the partners
+    are sorted and each one is only listed under the closest kind.
+
+    Use AtomList.partner_index to get the index of a topology. It is built the
+    first time it is needed and thrown away whenever the partners of any atom or
+    the atom list change
+    """
+
+    BOND, ANGLE, DIHEDRAL, EXCLUSION = range(4)
+
+    #===================================================
+
+    def __init__(self, atom_list):
+        self.atom_list = atom_list
+        self.position = position = dict(izip(atom_list, count()))
+        # The atom each neighbor belongs to and the neighbors as numpy arrays,
+        # created for the whole-selection queries when first needed
+        self._arrays = [None for kind in range(4)]
+        if atom_list:
+            # Fill in the partners from the term arrays first if need be, so
+            # the partner sets can be read directly below
+            atom_list[0]._fill_partners()
+        # Only the flat lists are kept, since holding on to a list or set for
+        # every atom makes the garbage collector a lot slower
+        self.offsets = offsets = [[0], [0], [0], [0]]
+        self._partners = partners = [[], [], [], []]
+        for atom in atom_list:
+            bonds = atom._bond_set or _NO_PARTNERS
+            angles = atom._angle_set or _NO_PARTNERS
+            dihedrals = atom._dihedral_set or _NO_PARTNERS
+            others = atom._exclusion_set
+            sets = (bonds, angles - bonds, dihedrals - angles - bonds,
+                    others and others - dihedrals - angles - bonds)
+            for kind in range(4):
+                if sets[kind]: partners[kind].extend(sorted(sets[kind]))
+                offsets[kind].append(len(partners[kind]))
+        get = position.get
+        self.neighbors = [[get(p, -1) for p in kind] for kind in partners]
+
+    #===================================================
+
+    @staticmethod
+    def partner_sets(atom):
+        """
+        The sets of partners of each kind of an atom, with each partner only in
+        the set of the closest kind
+        """
+        bonds = atom._bond_partners
+        angles = atom._angle_partners - bonds
+        dihedrals = atom._dihedral_partners - atom._angle_partners - bonds
+        exclusions = (atom._exclusion_partners - atom._dihedral_partners -
+                      atom._angle_partners - bonds)
+        return bonds, angles, dihedrals, exclusions
+
+    #===================================================
+
+    def partners(self, atom, kind):
+        """
+        Sorted list of the partners of the given kind of an atom, or None if the
+        atom is not in the atom list
+        """
+        i = self.position.get(atom)
+        if i is None: return None
+        offsets = self.offsets[kind]
+        return self._partners[kind][offsets[i]:offsets[i+1]]
+
+    #===================================================
+
+    def pairs(self, selection, kind):
+        """
+        Finds the partners of the given kind of every selected atom at once
+
+        Parameters:
+            selection (list): 1 for every selected atom of the atom list and 0
+                for every other one (like AmberMask.Selection)
+            kind (int): The kind of partners (BOND, ANGLE, DIHEDRAL, or
+                EXCLUSION)
+
+        Returns:
+            (atoms, partners): two lists with the positions in the atom list of
+            each selected atom and one of its partners, in the order of the
+            atom list and then of the sorted partners. Partners that are not in
+            the atom list are left out
+        """
+        offsets, neighbors = self.offsets[kind], self.neighbors[kind]
+        if np is not None:
+            if self._arrays[kind] is None:
+                self._arrays[kind] = (np.repeat(np.arange(len(self.atom_list)),
+                                                np.diff(offsets)),
+                                      np.array(neighbors, dtype=int))
+            owners, found = self._arrays[kind]
+            keep = np.array(selection, dtype=bool)[owners] & (found >= 0)
+            return owners[keep].tolist(), found[keep].tolist()
+        atoms, partners = [], []
+        for i, sel in enumerate(selection):
+            if not sel: continue
+            for j in neighbors[offsets[i]:offsets[i+1]]:
+                if j < 0: continue
+                atoms.append(i)
+                partners.append(j)
+        return atoms, partners
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+class TermIndex(object):
+    """
+    Index of the terms (bonds, angles, dihedrals, etc.) of one or more term lists
+    by the atoms in them, so the terms containing a given group of atoms can be
+    found without going through every term. The term lists are numbered in the
+    order they are passed to the constructor.
+
+    The index is not updated when the term lists change, so use add to record
+    every term appended to one of the lists while the index is in use
+    """
+
+    # The attributes holding the atoms of each kind of term
+    _atom_attrs = ('atom1', 'atom2', 'atom3', 'atom4', 'atom5')
+
+    #===================================================
+
+    def __init__(self, *term_lists):
+        self.term_lists = term_lists
+        self._terms = {}
+        for which, term_list in enumerate(term_lists):
+            for i, term in enumerate(term_list):
+                self._add(term, which, i)
+
+    #===================================================
+
+    def _add(self, term, which, i):
+        """ Indexes a term found at position i of term list number which """
+        entry = (which, i, term)
+        atoms = []
+        for attr in self._atom_attrs:
+            atom = getattr(term, attr, None)
+            if atom is None: break
+            if atom in atoms: continue
+            atoms.append(atom)
+            try:
+                self._terms[atom].append(entry)
+            except KeyError:
+                self._terms[atom] = [entry]
+
+    #===================================================
+
+    def add(self, term, which):
+        """ Records a term that was just appended to term list number which """
+        self._add(term, which, len(self.term_lists[which]) - 1)
+
+    #===================================================
+
+    def find(self, *atoms):
+        """
+        Finds the terms that contain all of the given atoms, in any order and
+        along with any other atoms. Use find_term to find the terms made up of
+        exactly the given atoms
+
+        Returns:
+            list of (term list number, position in that list, term) tuples for
+            every matching term, in the order the terms appear in the lists
+        """
+        found = []
+        for entry in self._terms.get(atoms[0], ()):
+            term = entry[2]
+            for atom in atoms[1:]:
+                if not atom in term: break
+            else:
+                found.append(entry)
+        found.sort(key=lambda entry: entry[:2])
+        return found
+
+    #===================================================
+
+    def find_term(self, *atoms):
+        """
+        Finds the terms whose atoms are exactly the given atoms in the given
+        order or in reverse order (so an angle is only found with its central
+        atom in the middle)
+
+        Returns:
+            list of entries like find
+        """
+        natom = len(atoms)
+        attrs = self._atom_attrs[:natom]
+        found = []
+        for entry in self.find(*atoms):
+            term = entry[2]
+            if (natom < len(self._atom_attrs) and
+                    getattr(term, self._atom_attrs[natom], None) is not None):
+                continue
+            term_atoms = [getattr(term, attr) for attr in attrs]
+            for order in (atoms, atoms[::-1]):
+                for atom, other in zip(order, term_atoms):
+                    if atom is not other: break
+                else:
+                    found.append(entry)
+                    break
+        return found
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 class AtomList(list):
@@ -1099,6 +1527,30 @@ class AtomList(list):
         self[idx].residue.delete_atom(self[idx])
         list.__delitem__(self, idx)
         self.changed = True
+        self.parm._partner_index = None
+
+    #===================================================
+
+    def delete_atoms(self, selection):
+        """
+        Deletes every atom for which selection is nonzero at once, which is much
+        faster than deleting them one at a time
+        """
+        residues = set()
+        remaining = []
+        for atm, sel in zip(self, selection):
+            if sel:
+                atm.idx = -1
+                atm.deleted = True
+                residues.add(atm.residue)
+            else:
+                remaining.append(atm)
+        if len(remaining) == len(self): return
+        for res in residues:
+            res.atoms = [a for a in res.atoms if not a.deleted]
+        list.__setitem__(self, slice(None), remaining)
+        self.changed = True
+        self.parm._partner_index = None
 
     #===================================================
    
@@ -1111,6 +1563,20 @@ class AtomList(list):
     def _index_us(self):
         """ We have deleted an atom, so now we have to re-index everybody """
         for i, atom in enumerate(self): atom.idx = atom.starting_index = i
+        # The partners are sorted by starting_index
+        self.parm._partner_index = None
+
+    #===================================================
+
+    def partner_index(self):
+        """
+        Returns the PartnerIndex of these atoms, which is only built again once
+        the partners of any atom or the atoms in this list changed
+        """
+        index = self.parm._partner_index
+        if index is None or index.atom_list is not self:
+            index = self.parm._partner_index = PartnerIndex(self)
+        return index
 
     #===================================================
 
@@ -1120,14 +1586,37 @@ class AtomList(list):
 
     #===================================================
 
+    def exclusion_offsets(self):
+        """
+        Returns the index of the first entry in EXCLUDED_ATOMS_LIST of each atom
+        (by starting_index), followed by the total length of the list
+        """
+        offsets = [0]
+        total = 0
+        for nexcl in self.parm.parm_data['NUMBER_EXCLUDED_ATOMS']:
+            total += nexcl
+            offsets.append(total)
+        return offsets
+
+    #===================================================
+
     def find_extra_exclusions(self):
         " Load all extra exclusions that may be stored in the topology file "
-        for atom in self: atom.load_exclusions()
+        offsets = self.exclusion_offsets()
+        for atom in self: atom.load_exclusions(offsets[atom.starting_index])
 
     #===================================================
 
-    def write_to_parm(self):
-        """ Writes all of the atom data to the topology file """
+    def write_to_parm(self, exclusions=None):
+        """
+        Writes all of the atom data to the topology file
+
+        Parameters:
+            exclusions (tuple): The NUMBER_EXCLUDED_ATOMS and
+                EXCLUDED_ATOMS_LIST sections (in terms of the new atom indexes)
+                if they have already been determined. If None, they are
+                determined from the partners of each atom
+        """
         # Write all of the arrays here
         self.parm.parm_data['POINTERS'][NATOM] = len(self)
         # Array slices are faster than copy() and creating new arrays
@@ -1144,18 +1633,36 @@ class AtomList(list):
         self.parm.parm_data['IROTAT'] = zeros[:]
         self.parm.parm_data['RADII'] = zeros[:]
         self.parm.parm_data['SCREEN'] = zeros[:]
+        if 'ATOMIC_NUMBER' in self.parm.parm_data:
+            self.parm.parm_data['ATOMIC_NUMBER'] = zeros[:]
         self._index_us()
-        self._determine_exclusions()
-        for atm in self: 
-            atm.add_data()
+        if exclusions is None:
+            numex = self._determine_exclusions()
+        else:
+            numex, self.parm.parm_data['EXCLUDED_ATOMS_LIST'] = exclusions
+        for atm in self:
+            atm.add_data(numex[atm.idx])
             atm.starting_index = atm.idx # arrays are updated...
 
     #===================================================
 
+    def write_exclusions_to_parm(self):
+        """
+        Writes only the NUMBER_EXCLUDED_ATOMS and EXCLUDED_ATOMS_LIST sections.
+        Only use this if no atoms have been deleted since the rest of the atom
+        data was written
+        """
+        self._index_us()
+        self.parm.parm_data['NUMBER_EXCLUDED_ATOMS'] = \
+                                                self._determine_exclusions()
+
+    #===================================================
+
     def _determine_exclusions(self):
         """
         Figures out the EXCLUDED_ATOMS_LIST. Only do this right before you write
-        the topology file, since it's expensive
+        the topology file, since it's expensive. Returns the number of entries
+        of each atom in that list
         """
         self.parm.parm_data['EXCLUDED_ATOMS_LIST'] = []
         # We have to do something different for extra points. See the top of
@@ -1165,36 +1672,28 @@ class AtomList(list):
         # other atom my bonded pair is excluded from:
         for atm in self:
             if not atm.attype[:2] in ['EP', 'LP']: continue
-            partner = atm.bond_partners[0]
-            # Now add all bond partners
-            for patm in partner.bond_partners:
+            # Use the partner sets directly, since every exclusion we add throws
+            # away the partner index
+            partner = min(atm._bond_partners)
+            # Add all bond, angle, dihedral, and other arbitrary exclusions
+            for patm in partner.excluded_atoms():
                 # Don't add myself
                 if patm is atm: continue
                 atm.exclude(patm)
-            # Now add all angle partners
-            for patm in partner.angle_partners: atm.exclude(patm)
-            # Now add all dihedral partners
-            for patm in partner.dihedral_partners: atm.exclude(patm)
-            # Now add all other arbitrary exclusions
-            for patm in partner.exclusion_partners:
-                if patm is atm: continue
-                atm.exclude(patm)
 
+        exclist = self.parm.parm_data['EXCLUDED_ATOMS_LIST']
+        numex = []
         for atm in self:
-            vals_to_add = []
-            for member in atm.bond_partners:
-                if member.idx > atm.idx: vals_to_add.append(member.idx+1)
-            for member in atm.angle_partners:
-                if member.idx > atm.idx: vals_to_add.append(member.idx+1)
-            for member in atm.dihedral_partners:
-                if member.idx > atm.idx: vals_to_add.append(member.idx+1)
-            # Enable additional (arbitrary) exclusions
-            for member in atm.exclusion_partners:
-                if member.idx > atm.idx: vals_to_add.append(member.idx+1)
+            # Bonds, angles, dihedrals, and arbitrary exclusions
+            idx = atm.idx
+            vals_to_add = [member.idx+1 for member in atm.excluded_atoms()
+                           if member.idx > idx]
             vals_to_add.sort()
             # See comment above about numex = 0 --> numex = 1
             if not vals_to_add: vals_to_add = [0]
-            self.parm.parm_data['EXCLUDED_ATOMS_LIST'].extend(vals_to_add)
+            exclist.extend(vals_to_add)
+            numex.append(len(vals_to_add))
+        return numex
 
     #===================================================
 
@@ -1205,6 +1704,7 @@ class AtomList(list):
         """
         for atm in self:
             atm.load_from_parm()
+        self.parm.data_changed()
 
     #===================================================
 
@@ -1213,6 +1713,7 @@ class AtomList(list):
         This means we changed things...
         """
         self.changed = True
+        self.parm._partner_index = None
         list.__setitem__(self, idx, thing)
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
@@ -1253,6 +1754,7 @@ class _TypeList(TrackedList):
         self.parm = parm
         self._make_array()
         self.changed = False
+        self._indexes = dict()
 
     #===================================================
 
@@ -1274,6 +1776,26 @@ class _TypeList(TrackedList):
     def reset(self):
         """ Reset indexes to -1 to allow multiple remake_parm calls """
         for thing in self: thing.idx = -1
+        # Maps the key of each type numbered since the reset to its index
+        self._indexes = dict()
+
+    #===================================================
+
+    def number(self, thing):
+        """
+        Gives a type the index of an equal type (one with the same key) that was
+        already numbered since the last reset, or the next free index if there
+        is none. This way equal types that are separate objects (e.g., after
+        setbond or change) are only written once
+        """
+        thing.idx = self._indexes.setdefault(thing.key, len(self._indexes))
+
+    #===================================================
+
+    @property
+    def num_indexes(self):
+        """ The number of indexes given out by number since the last reset """
+        return len(self._indexes)
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -13,8 +13,9 @@ from chemistry.charmm._charmmfile import CharmmFile
 from chemistry.charmm.topologyobjects import (ResidueList, AtomList,
                 TrackedList, Bond, Angle, Dihedral, Improper, AcceptorDonor,
                 Group, Cmap, UreyBradley, NoUreyBradley)
-from chemistry.exceptions import (CharmmPSFError, MoleculeError,
-                CharmmPSFWarning, MissingParameter)
+from chemistry.exceptions import (CharmmPSFError, CharmmPSFWarning,
+                MissingParameter)
+from chemistry.molecule import find_molecules
 import os
 import warnings
 
@@ -716,55 +717,24 @@ def set_molecules(atom_list):
     """
     Correctly sets the molecularity of the system based on connectivity.
     """
-    from sys import setrecursionlimit, getrecursionlimit
-    # Since we use a recursive function here, we make sure that the recursion
-    # limit is large enough to handle the maximum possible recursion depth we'll
-    # need (NATOM). We don't want to shrink it, though, since we use list
-    # comprehensions in list constructors in some places that have an implicit
-    # (shallow) recursion, therefore, reducing the recursion limit too much here
-    # could raise a recursion depth exceeded exception during a _Type/Atom/XList
-    # creation. Therefore, set the recursion limit to the greater of the current
-    # limit or the number of atoms
-    setrecursionlimit(max(len(atom_list), getrecursionlimit()))
-
     # Unmark all atoms so we can track which molecule each goes into
     atom_list.unmark()
 
-    # The molecule "ownership" list
-    owner = []
-    # The way I do this is via a recursive algorithm, in which
-    # the "set_owner" method is called for each bonded partner an atom
-    # has, which in turn calls set_owner for each of its partners and 
-    # so on until everything has been assigned.
-    molecule_number = 1 # which molecule number we are on
-    for i in range(len(atom_list)):
-        # If this atom has not yet been "owned", make it the next molecule
-        # However, we only increment which molecule number we're on if 
-        # we actually assigned a new molecule (obviously)
-        if not atom_list[i].marked:
-            tmp = [i]
-            _set_owner(atom_list, tmp, i, molecule_number)
-            # Make sure the atom indexes are sorted
-            tmp.sort()
-            owner.append(tmp)
-            molecule_number += 1
+    # The bonded partners of every atom in compressed sparse row form: the
+    # atoms bonded to atom i are neighbors[offsets[i]:offsets[i+1]]
+    offsets = [0]
+    neighbors = []
+    for atom in atom_list:
+        neighbors.extend([partner.idx for partner in atom._bond_partners])
+        offsets.append(len(neighbors))
+
+    owner, marked = find_molecules(offsets, neighbors)
+    for atom, molecule_number in zip(atom_list, marked):
+        atom.marked = molecule_number
     return owner
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def _set_owner(atom_list, owner_array, atm, mol_id):
-    """ Recursively sets ownership of given atom and all bonded partners """
-    atom_list[atm].marked = mol_id
-    for partner in atom_list[atm].bond_partners:
-        if not partner.marked:
-            owner_array.append(partner.idx)
-            _set_owner(atom_list, owner_array, partner.idx, mol_id)
-        elif partner.marked != mol_id:
-            raise MoleculeError('Atom %d in multiple molecules' % 
-                                partner.idx)
-
-# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
@@ -6,6 +6,7 @@ Author: Jason M. Swails
 Contributors:
 Date: May 12, 2014
 """
+from chemistry.amber.topologyobjects import _NO_PARTNERS, _lazy_list
 from chemistry.exceptions import (SplitResidueWarning, BondError, ResidueError,
                 CmapError, MissingParameter)
 import warnings
@@ -73,6 +74,8 @@ class AtomType(object):
     >>> print at2 == WildCard
     True
     """
+    __slots__ = ('name', 'number', 'mass', 'atomic_number', 'epsilon', 'rmin',
+                 'epsilon_14', 'rmin_14', '_member_number')
 
     def __init__(self, name, number, mass, atomic_number):
         if number is None and name is not None:
@@ -150,6 +153,7 @@ class WildCard(AtomType):
 
         - It is greater than nothing
     """
+    __slots__ = ()
 
     def __init__(self):
         self._member_number = -1
@@ -199,7 +203,16 @@ class Atom(object):
         - dihedrals (list of Dihedral's) : All dihedrals to which I belong
         - impropers (list of Improper's) : All impropers to which I belong
         - cmaps (list of Cmap's) : All correction maps to which I belong
+
+    The partner sets and term lists are only created once the atom is actually
+    involved in something of that kind
     """
+    __slots__ = ('name', 'attype', 'type', 'charge', 'mass', 'idx', 'props',
+                 'system', 'marked', '_bond_set', '_angle_set', '_dihedral_set',
+                 '_bonds', '_angles', '_urey_bradleys', '_dihedrals',
+                 '_impropers', '_cmaps', 'residue', 'ljidx', 'xx', 'xy', 'xz',
+                 'vx', 'vy', 'vz')
+
     def __init__(self, system, name, attype, charge, mass, props=None):
         self.name = name
         self.attype = attype
@@ -210,15 +223,34 @@ class Atom(object):
         self.props = props
         self.system = system
         self.marked = 0 # For recursive molecule determination
-        self._bond_partners = set()
-        self._angle_partners = set()
-        self._dihedral_partners = set()
-        self.bonds = []
-        self.angles = []
-        self.urey_bradleys = []
-        self.dihedrals = []
-        self.impropers = []
-        self.cmaps = []
+        self._bond_set = None
+        self._angle_set = None
+        self._dihedral_set = None
+        self._bonds = None
+        self._angles = None
+        self._urey_bradleys = None
+        self._dihedrals = None
+        self._impropers = None
+        self._cmaps = None
+
+    bonds = _lazy_list('_bonds')
+    angles = _lazy_list('_angles')
+    urey_bradleys = _lazy_list('_urey_bradleys')
+    dihedrals = _lazy_list('_dihedrals')
+    impropers = _lazy_list('_impropers')
+    cmaps = _lazy_list('_cmaps')
+
+    @property
+    def _bond_partners(self):
+        return self._bond_set or _NO_PARTNERS
+
+    @property
+    def _angle_partners(self):
+        return self._angle_set or _NO_PARTNERS
+
+    @property
+    def _dihedral_partners(self):
+        return self._dihedral_set or _NO_PARTNERS
 
     def bond_to(self, other):
         """
@@ -227,8 +259,12 @@ class Atom(object):
         """
         if self is other:
             raise BondError('Cannot bond atom to itself')
-        self._bond_partners.add(other)
-        other._bond_partners.add(self)
+        if self._bond_set is None:
+            self._bond_set = set()
+        if other._bond_set is None:
+            other._bond_set = set()
+        self._bond_set.add(other)
+        other._bond_set.add(self)
 
     def angle_to(self, other):
         """
@@ -237,8 +273,12 @@ class Atom(object):
         """
         if self is other:
             raise BondError('Cannot angle atom to itself')
-        self._angle_partners.add(other)
-        other._angle_partners.add(self)
+        if self._angle_set is None:
+            self._angle_set = set()
+        if other._angle_set is None:
+            other._angle_set = set()
+        self._angle_set.add(other)
+        other._angle_set.add(self)
 
     def dihedral_to(self, other):
         """
@@ -247,8 +287,12 @@ class Atom(object):
         """
         if self is other:
             raise BondError('Cannot dihedral atom to itself')
-        self._dihedral_partners.add(other)
-        other._dihedral_partners.add(self)
+        if self._dihedral_set is None:
+            self._dihedral_set = set()
+        if other._dihedral_set is None:
+            other._dihedral_set = set()
+        self._dihedral_set.add(other)
+        other._dihedral_set.add(self)
 
     @property
     def bond_partners(self):
@@ -449,6 +493,8 @@ class Bond(object):
         - atom2 (Atom) : Second atom included in the bond
         - bond_type (BondType) : Type for the bond (None if unknown)
     """
+    __slots__ = ('atom1', 'atom2', 'bond_type')
+
     def __init__(self, atom1, atom2, bond_type=None):
         self.atom1 = atom1
         self.atom2 = atom2
@@ -478,6 +524,8 @@ class Angle(object):
         - atom3 (Atom) : Third atom in the valence angle
         - angle_type (AngleType) : Type for the angle (None if unknown)
     """
+    __slots__ = ('atom1', 'atom2', 'atom3', 'angle_type')
+
     def __init__(self, atom1, atom2, atom3, angle_type=None):
         self.atom1 = atom1
         self.atom2 = atom2
@@ -514,6 +562,8 @@ class UreyBradley(object):
         - ub_type (UreyBradleyType) : The type for the Urey-Bradley term (None
                                       if unknown)
     """
+    __slots__ = ('atom1', 'atom2', 'ub_type')
+
     def __init__(self, atom1, atom2, ub_type=None):
         self.atom1 = atom1
         self.atom2 = atom2
@@ -559,6 +609,9 @@ class Dihedral(object):
         - atom4 (Atom) : Fourth atom included in the torsion
         - dihedral_type (DihedralType) : Type for the torsion (None if unknown)
     """
+    __slots__ = ('atom1', 'atom2', 'atom3', 'atom4', 'dihedral_type',
+                 'end_groups_active')
+
     def __init__(self, atom1, atom2, atom3, atom4, dihedral_type=None):
         self.atom1 = atom1
         self.atom2 = atom2
@@ -608,6 +661,8 @@ class Improper(object):
         - atom4 (Atom) : Fourth atom included in the torsion
         - improper_type (ImproperType) : Type for the improper (None if unknown)
     """
+    __slots__ = ('atom1', 'atom2', 'atom3', 'atom4', 'improper_type')
+
     def __init__(self, atom1, atom2, atom3, atom4, improper_type=None):
         self.atom1 = atom1
         self.atom2 = atom2
@@ -730,6 +785,9 @@ class Cmap(object):
         - atom7 (Atom) : 3rd atom of second dihedral
         - atom8 (Atom) : 4th atom of second dihedral
     """
+    __slots__ = ('consecutive', 'atom1', 'atom2', 'atom3', 'atom4', 'atom5',
+                 'atom6', 'atom7', 'atom8', 'cmap_type')
+
     def __init__(self, atom1, atom2, atom3, atom4, atom5, atom6, atom7,
                  atom8, cmap_type=None):
         self.consecutive = False
@@ -820,6 +878,8 @@ class BondType(object):
         - k (float) : Force constant (kcal/mol/A^2)
         - req (float) : Equilibrium distance
     """
+    __slots__ = ('k', 'req', 'idx')
+
     def __init__(self, k, req):
         self.k = k
         self.req = req
@@ -838,6 +898,8 @@ class AngleType(object):
         - k (float) : Force constant (kcal/mol/radians^2)
         - theteq (float) : Equilibrium angle value (degrees)
     """
+    __slots__ = ('k', 'theteq', 'idx')
+
     def __init__(self, k, theteq):
         self.k = k
         self.theteq = theteq
@@ -853,6 +915,7 @@ class UreyBradleyType(BondType):
     valence angle). It is functionally equivalent to a Bond and is actually
     implemented as a (unaltered) Bond subclass. See BondType documentation.
     """
+    __slots__ = ()
 
 # Not all angles have Urey-Bradley terms attached to them. This is a singleton
 # that indicates that there is NO U-B term for this particular type
@@ -870,6 +933,8 @@ class DihedralType(object):
         - per (int) : Periodicity
         - phase (float): Phase of the torsion
     """
+    __slots__ = ('phi_k', 'per', 'phase', 'idx')
+
     def __init__(self, phi_k, per, phase):
         self.phi_k = float(phi_k)
         self.per = int(per)
@@ -890,6 +955,8 @@ class ImproperType(object):
         - k (float) : Force constant (kcal/mol)
         - phieq (int) : Equilibrium angle (degrees)
     """
+    __slots__ = ('k', 'phieq', 'idx')
+
     def __init__(self, k, phieq):
         self.k = k
         self.phieq = phieq
@@ -918,6 +985,7 @@ class CmapType(object):
     defines CMAP tables from -180 -- 180 whereas OpenMM expects them from
     0 -- 360 (with the 1st angle changing fastest!!)
     """
+    __slots__ = ('resolution', 'grid', 'idx')
 
     def __init__(self, resolution, grid):
         self.resolution = resolution
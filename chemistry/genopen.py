@@ -0,0 +1,97 @@
+"""
+Opens plain, gzip, bzip2, and xz-compressed files through a single interface.
+Compressed files are read and written as streams, so a decompressed copy of the
+file never needs to exist on disk or in memory.
+
+When reading, the compression is detected from the first few bytes of the file.
+When writing, it is chosen from the file name extension (.gz, .bz2, or .xz).
+"""
+
+import sys
+try:
+    import bz2
+except ImportError:
+    bz2 = None
+try:
+    import gzip
+except ImportError:
+    gzip = None
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+__all__ = ['genopen', 'compression']
+
+# Magic bytes at the start of each kind of compressed file
+_MAGIC = ((b'\x1f\x8b', 'gzip'), (b'BZh', 'bzip2'), (b'\xfd7zXZ\x00', 'xz'))
+_EXTENSIONS = {'.gz' : 'gzip', '.bz2' : 'bzip2', '.xz' : 'xz'}
+
+def compression(fname, mode='r'):
+    """
+    Determines how a file is compressed
+
+    Parameters:
+        fname (str): Name of the file
+        mode (str): 'r' to detect compression from the file contents, or 'w' to
+            pick the compression from the file name extension
+
+    Returns:
+        'gzip', 'bzip2', 'xz', or None if the file is not compressed
+    """
+    if mode.startswith('r'):
+        f = open(fname, 'rb')
+        try:
+            header = f.read(6)
+        finally:
+            f.close()
+        for magic, kind in _MAGIC:
+            if header.startswith(magic):
+                return kind
+        return None
+    for ext, kind in _EXTENSIONS.items():
+        if fname.endswith(ext):
+            return kind
+    return None
+
+def genopen(fname, mode='r'):
+    """
+    Opens a file for reading or writing, compressing or decompressing it on the
+    fly if necessary
+
+    Parameters:
+        fname (str): Name of the file to open
+        mode (str): 'r' to read or 'w' to write
+
+    Returns:
+        An open file-like object that reads or writes text
+    """
+    if not mode in ('r', 'w'):
+        raise ValueError("genopen mode must be 'r' or 'w'")
+    kind = compression(fname, mode)
+    if kind is None:
+        return open(fname, mode)
+    # Compressed file objects are binary. In Python 3 we want them as text
+    if sys.version_info[0] >= 3:
+        mode += 't'
+    elif kind != 'bzip2':
+        mode += 'b'
+    if kind == 'gzip':
+        if gzip is None:
+            raise ImportError('Python could not import the gzip library. '
+                              'Cannot open gzip-compressed file %s' % fname)
+        return gzip.open(fname, mode)
+    if kind == 'bzip2':
+        if bz2 is None:
+            raise ImportError('Python could not import the bz2 library. '
+                              'Cannot open bzip2-compressed file %s' % fname)
+        if sys.version_info[0] >= 3:
+            return bz2.open(fname, mode)
+        return bz2.BZ2File(fname, mode)
+    if lzma is None:
+        raise ImportError('Python could not import the lzma library. Cannot '
+                          'open xz-compressed file %s' % fname)
+    return lzma.open(fname, mode)
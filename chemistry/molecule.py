@@ -123,3 +123,43 @@ class Molecule:
                        len(self.atoms)):
             self.residue_container.append(len(self.residues)-1)
 
+
+def find_molecules(offsets, neighbors):
+    """
+    Divides the atoms of a bond network into molecules
+
+    Parameters:
+        offsets, neighbors: The bonded partners of every atom in compressed
+                            sparse row form: the atoms bonded to atom i are
+                            neighbors[offsets[i]:offsets[i+1]]
+
+    Returns:
+        (owner, marked): the (sorted) atom indexes of each molecule, and the
+        number of the molecule (starting from 1) each atom is in
+    """
+    # The molecule "ownership" list
+    owner = []
+    # Walk the bond network from every atom that has not been "owned" yet,
+    # keeping the atoms whose partners still have to be visited on a stack (so
+    # huge molecules do not need a deep recursion). Each walk is the next
+    # molecule, so molecules are numbered in order of their first atom
+    marked = [0 for i in xrange(len(offsets) - 1)]
+    for i in xrange(len(marked)):
+        if marked[i]: continue
+        molecule_number = len(owner) + 1
+        marked[i] = molecule_number
+        owner.append([])
+        stack = [i]
+        while stack:
+            current = stack.pop()
+            for partner in neighbors[offsets[current]:offsets[current+1]]:
+                if not marked[partner]:
+                    marked[partner] = molecule_number
+                    stack.append(partner)
+                elif marked[partner] != molecule_number:
+                    raise MoleculeError('Atom %d in multiple molecules' %
+                                        partner)
+    # Collect the atoms of each molecule (in sorted order)
+    for i, molecule_number in enumerate(marked):
+        owner[molecule_number-1].append(i)
+    return owner, marked
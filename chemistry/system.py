@@ -7,16 +7,9 @@ Contributors:
 Date: May 27, 2014
 """
 
-try:
-    import bz2
-except ImportError:
-    bz2 = None
+from chemistry.genopen import genopen
 from chemistry.periodic_table import Element as _Element
 from chemistry.periodic_table import AtomicNum as _AtomicNum
-try:
-    import gzip
-except ImportError:
-    gzip = None
 import re
 
 __all__ = ['Atom', 'Residue']
@@ -181,10 +174,9 @@ class ChemicalSystem(list):
     @classmethod
     def load_from_pdb(cls, pdb):
         """
-        Load a chemical system from a PDB file (filename provided). gzip or
-        bzip2 compression are detected based on filename extension (.gz implies
-        gzip and .bz2 implies bzip2). If either gzip or bz2 are unavailable,
-        ImportError is raised.
+        Load a chemical system from a PDB file (filename provided). gzip,
+        bzip2, or xz compression is detected from the file contents. If the
+        needed compression library is unavailable, ImportError is raised.
 
         Parameters
         ----------
@@ -195,15 +187,7 @@ class ChemicalSystem(list):
         -------
         ChemicalSystem instance loaded from the PDB file
         """
-        if pdb.endswith('.gz'):
-            if gzip is None:
-                raise ImportError('gzip not available for compressed PDB')
-            return cls.load_from_open_pdb(gzip.open(pdb, 'r'))
-        if pdb.endswith('.bz2'):
-            if bz2 is None:
-                raise ImportError('bzip is not available for compressed PDB')
-            return cls.load_from_open_pdb(bz2.BZ2File(pdb, 'r'))
-        return cls.load_from_open_pdb(open(pdb, 'r'))
+        return cls.load_from_open_pdb(genopen(pdb, 'r'))
 
     @classmethod
     def load_from_open_pdb(cls, pdb):
@@ -8,6 +8,7 @@ import sys
 import warnings
 
 # Load custom modules
+from chemistry.amber import parmcache
 from ParmedTools.logos import Logo
 from ParmedTools.exceptions import (ParmError, SeriousParmWarning,
                                     InterpreterError)
@@ -83,6 +84,20 @@ group.add_argument('-r', '--relaxed', dest='strict', action='store_false',
          help='''Scripts ignore unrecognized input and simply skip over failed
          actions, executing the rest of the script. Unrecognized input in the
          interactive interpreter emits a non-fatal warning.''')
+group = parser.add_argument_group('Topology Cache', '''Parsed topology files
+         can be kept in an on-disk cache so that reloading an unchanged file is
+         fast. The cache is used if --cache-dir is given or the PARMED_CACHE_DIR
+         environment variable is set. It requires numpy.''')
+group.add_argument('--cache-dir', dest='cache_dir', metavar='DIRECTORY',
+         default=None, help='''Directory in which to cache parsed topology
+         files.''')
+group.add_argument('--cache-size', dest='cache_size', metavar='MB', type=int,
+         default=None, help='''Maximum size of the topology cache in MB. The
+         least recently used entries are removed to stay below this size.
+         Default is 1024 MB. Has no effect unless the cache is used.''')
+group.add_argument('--no-cache', dest='use_cache', action='store_false',
+         default=True, help='''Do not use the topology cache, even if
+         PARMED_CACHE_DIR is set.''')
 parser.add_argument('prmtop_cl', nargs='?', metavar='<prmtop>', default=None,
          help='Topology file to analyze.')
 parser.add_argument('script_cl', nargs='?', metavar='<script>', default=None,
@@ -110,6 +125,16 @@ if opt.strict:
 # Set our overwrite preferences
 Action.overwrite = opt.overwrite
 
+# Set up the topology cache. It is only used if we know its directory
+cache_dir = opt.cache_dir or os.environ.get('PARMED_CACHE_DIR')
+if not opt.use_cache:
+    parmcache.disable_cache()
+elif cache_dir and (opt.cache_dir is not None or opt.cache_size is not None):
+    if opt.cache_size is None:
+        parmcache.enable_cache(cache_dir)
+    else:
+        parmcache.enable_cache(cache_dir, opt.cache_size * 1024 * 1024)
+
 amber_prmtop = ParmList()
 for i, parm in enumerate(opt.prmtop):
     if i < len(opt.inpcrd):